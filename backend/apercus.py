@@ -0,0 +1,272 @@
+"""Aperçus des documents : miniature (cartes) et aperçu (page de détail).
+
+Les rendus sont générés par le worker (tâche `generer_apercus`) pour les
+images et la première page des PDF, puis rangés sur disque sous
+`PREVIEW_FOLDER` (par défaut `UPLOAD_FOLDER/.apercus`), nommés d'après le
+contenu du fichier : deux documents identiques partagent leurs aperçus, et
+un aperçu ne change jamais (cache HTTP `immutable`).
+
+Le dossier est un cache borné à `PREVIEW_CACHE_MAX_BYTES` : les aperçus les
+moins récemment servis (date de modification, rafraîchie à la lecture) sont
+supprimés au-delà. Un aperçu évincé est régénéré à la demande suivante.
+
+Pillow (images) et pypdfium2 (PDF) sont optionnels : sans eux, les formats
+correspondants n'ont pas d'aperçu.
+
+    flask apercus generer [--tous]     # corpus existant
+    flask apercus purger               # éviction immédiate
+"""
+import os
+import threading
+import time
+import uuid
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+
+import stockage
+from models import db, Document, Tache
+from taches import A_FAIRE, TacheAbandonnee, gestionnaire, planifier, planifier_si_absente
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = None
+
+try:
+    import pypdfium2
+except ImportError:
+    pypdfium2 = None
+
+# Rendu -> (largeur, hauteur) maximales
+RENDUS = {"miniature": (320, 320), "apercu": (1200, 1600)}
+FORMATS_IMAGE = ("jpg", "jpeg", "png")
+FORMATS = FORMATS_IMAGE + ("pdf",)
+QUALITE_JPEG = 80
+# Délai avant de rafraîchir la date d'accès d'un aperçu servi (LRU approché)
+INTERVALLE_ACCES = 3600
+# Délai min entre deux évictions automatiques, par processus
+INTERVALLE_EVICTION = 60
+# L'éviction descend sous cette fraction de la limite (évite de la relancer
+# à chaque nouvel aperçu)
+MARGE_EVICTION = 0.9
+
+
+class ErreurApercu(Exception):
+    """Fichier impossible à rendre (image ou PDF invalide)."""
+
+
+def disponible(format):
+    """Le format a-t-il un aperçu avec les bibliothèques installées ?"""
+    if format in FORMATS_IMAGE:
+        return Image is not None
+    return format == "pdf" and Image is not None and pypdfium2 is not None
+
+
+def dossier():
+    config = current_app.config
+    return config["PREVIEW_FOLDER"] or os.path.join(config["UPLOAD_FOLDER"], ".apercus")
+
+
+def _cle(doc):
+    # Fichiers antérieurs au stockage par contenu : clé propre au document
+    return doc.fichier_sha256 or f"document-{doc.id}"
+
+
+def chemin(doc, rendu):
+    cle = _cle(doc)
+    return os.path.join(dossier(), cle[:2], f"{cle}-{rendu}.jpg")
+
+
+# ──────────────────────────────────────────────
+#  RENDU
+# ──────────────────────────────────────────────
+def _ouvrir(chemin_fichier, format):
+    """Première page (PDF) ou image, réduite à la taille du plus grand rendu."""
+    largeur, hauteur = max(RENDUS.values())
+    if format == "pdf":
+        pdf = pypdfium2.PdfDocument(chemin_fichier)
+        try:
+            page = pdf[0]
+            echelle = min(largeur / page.get_width(), hauteur / page.get_height())
+            return page.render(scale=echelle).to_pil()
+        finally:
+            pdf.close()
+    image = Image.open(chemin_fichier)
+    image.draft("RGB", (largeur, hauteur))  # JPEG : décodage directement réduit
+    return ImageOps.exif_transpose(image)
+
+
+def _ecrire(image, destination):
+    os.makedirs(os.path.dirname(destination), exist_ok=True)
+    temporaire = f"{destination}.{uuid.uuid4().hex}.tmp"
+    image.save(temporaire, "JPEG", quality=QUALITE_JPEG, optimize=True)
+    os.replace(temporaire, destination)
+
+
+def generer(doc):
+    """Écrire les rendus du document sur disque ; renvoie leur taille totale."""
+    source = stockage.chemin_absolu(doc.fichier_stockage)
+    try:
+        image = _ouvrir(source, doc.format)
+        if image.mode not in ("RGB", "L"):
+            fond = Image.new("RGB", image.size, "white")  # transparence -> blanc
+            image = image.convert("RGBA")
+            fond.paste(image, mask=image.getchannel("A"))
+            image = fond
+        taille = 0
+        # Du plus grand au plus petit : chaque rendu part du précédent
+        for rendu, dimensions in sorted(RENDUS.items(), key=lambda r: r[1], reverse=True):
+            image.thumbnail(dimensions)
+            destination = chemin(doc, rendu)
+            _ecrire(image, destination)
+            taille += os.path.getsize(destination)
+        return taille
+    except (OSError, ValueError, Image.DecompressionBombError) as exc:
+        raise ErreurApercu(str(exc)) from exc
+    except Exception as exc:  # erreurs propres à pypdfium2
+        if doc.format != "pdf":
+            raise
+        raise ErreurApercu(str(exc)) from exc
+
+
+@gestionnaire("generer_apercus", max_tentatives=3)
+def generer_apercus(document_id):
+    """Générer les aperçus d'un document, puis borner le cache."""
+    doc = db.session.get(Document, document_id)
+    if doc is None or not disponible(doc.format):
+        return
+    if not os.path.exists(stockage.chemin_absolu(doc.fichier_stockage)):
+        raise TacheAbandonnee(f"Fichier absent : {doc.fichier_stockage}")
+    try:
+        generer(doc)
+    except ErreurApercu as exc:
+        raise TacheAbandonnee(f"Aperçu impossible : {exc}") from exc
+    eviction.si_necessaire()
+
+
+def planifier_generation(doc):
+    """Planifier la génération des aperçus d'un nouveau document (sans commit)."""
+    if disponible(doc.format):
+        planifier("generer_apercus", document=doc)
+
+
+# ──────────────────────────────────────────────
+#  LECTURE
+# ──────────────────────────────────────────────
+def lire(doc, rendu):
+    """Chemin de l'aperçu s'il existe (et marque son accès), sinon None."""
+    destination = chemin(doc, rendu)
+    try:
+        modifie = os.stat(destination).st_mtime
+    except FileNotFoundError:
+        return None
+    maintenant = time.time()
+    if maintenant - modifie > INTERVALLE_ACCES:
+        try:
+            os.utime(destination, (maintenant, maintenant))
+        except FileNotFoundError:  # évincé entre-temps
+            return None
+    return destination
+
+
+def en_preparation(doc):
+    """Aperçu absent : planifier sa (re)génération si besoin ; commite.
+
+    Renvoie False si le format n'a pas d'aperçu ou si la génération a échoué.
+    """
+    if not disponible(doc.format):
+        return False
+    etats = set(db.session.scalars(
+        db.select(Tache.etat)
+        .where(Tache.document_id == doc.id, Tache.type == "generer_apercus")
+        .distinct()
+    ))
+    if etats & set(A_FAIRE):
+        return True
+    if "echouee" in etats:
+        return False
+    # Jamais générés, ou évincés du cache ; sans doublon si plusieurs
+    # affichages simultanés arrivent ici
+    planifier_si_absente("generer_apercus", doc.id)
+    db.session.commit()
+    return True
+
+
+# ──────────────────────────────────────────────
+#  ÉVICTION
+# ──────────────────────────────────────────────
+def evincer(racine, limite):
+    """Supprimer les aperçus les moins récemment servis au-delà de `limite`
+    octets. Renvoie (fichiers supprimés, octets restants)."""
+    fichiers, total = [], 0
+    for sous_dossier in os.scandir(racine) if os.path.isdir(racine) else ():
+        if not sous_dossier.is_dir():
+            continue
+        for entree in os.scandir(sous_dossier.path):
+            if entree.name.endswith(".jpg"):
+                info = entree.stat()
+                fichiers.append((info.st_mtime, info.st_size, entree.path))
+                total += info.st_size
+    if total <= limite:
+        return 0, total
+    supprimes = 0
+    cible = limite * MARGE_EVICTION
+    for _, taille, chemin_apercu in sorted(fichiers):
+        if total <= cible:
+            break
+        try:
+            os.remove(chemin_apercu)
+        except FileNotFoundError:
+            pass
+        total -= taille
+        supprimes += 1
+    return supprimes, total
+
+
+class Eviction:
+    """Éviction automatique après génération, au plus une fois par intervalle."""
+
+    def __init__(self):
+        self._verrou = threading.Lock()
+        self._derniere = 0.0
+
+    def si_necessaire(self):
+        with self._verrou:
+            if time.monotonic() - self._derniere < INTERVALLE_EVICTION:
+                return
+            self._derniere = time.monotonic()
+        evincer(dossier(), current_app.config["PREVIEW_CACHE_MAX_BYTES"])
+
+
+eviction = Eviction()
+
+
+# ──────────────────────────────────────────────
+#  COMMANDES
+# ──────────────────────────────────────────────
+apercus_cli = AppGroup("apercus", help="Aperçus des documents.")
+
+
+@apercus_cli.command("generer")
+@click.option("--tous", is_flag=True, help="Régénérer aussi les aperçus présents sur disque.")
+def generer_commande(tous):
+    """Planifier les aperçus des documents existants."""
+    formats = [f for f in FORMATS if disponible(f)]
+    n = 0
+    for doc in Document.query.filter(Document.format.in_(formats)).yield_per(500):
+        if (tous or lire(doc, "miniature") is None) and planifier_si_absente(
+            "generer_apercus", doc.id
+        ):
+            doc.statut_traitement = "en_attente"
+            n += 1
+    db.session.commit()
+    click.echo(f"{n} génération(s) d'aperçus planifiée(s)")
+
+
+@apercus_cli.command("purger")
+def purger_commande():
+    """Ramener le cache des aperçus sous PREVIEW_CACHE_MAX_BYTES."""
+    supprimes, restant = evincer(dossier(), current_app.config["PREVIEW_CACHE_MAX_BYTES"])
+    click.echo(f"{supprimes} aperçu(s) supprimé(s), {restant} octets restants")
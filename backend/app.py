@@ -3,7 +3,17 @@ from flask import Flask, jsonify
 from flask_cors import CORS
 from flask_migrate import Migrate
 
+import auth
+import catalogue
+import connexions
+import demarrage
+import replicas
+import reponses
+import statistiques
+import taxonomie
+from compteurs import compteur_telechargements
 from config import config_by_name
+from hachage import pool_hachage
 from models import db
 
 
@@ -17,24 +27,51 @@ def create_app(config_overrides=None):
     if config_overrides:
         app.config.update(config_overrides)
 
-    # Extensions
+    # Extensions (compression enregistrée en premier : appliquée en dernier)
+    reponses.init_app(app)
+    connexions.configurer(app)
     db.init_app(app)
-    Migrate(app, db)
-    CORS(app)
+    connexions.init_app(app)
+    replicas.init_app(app)
+    Migrate(app, db, directory=os.path.join(os.path.dirname(__file__), "migrations"))
+    CORS(app, expose_headers=["Retry-After"])  # aperçus en préparation (202)
+    compteur_telechargements.init_app(app)
+    auth.init_app(app)
+    pool_hachage.init_app(app)
+    taxonomie.init_app(app)
+    catalogue.init_app(app)
+    statistiques.init_app(app)
+    demarrage.init_app(app)
 
     # Blueprints (import tardif pour éviter les imports circulaires)
+    from apercus import apercus_cli
+    from classements import classements_cli
+    from extraction import texte_cli
+    from importation import importer_cli
     from routes import api
+    from stockage import stockage_cli
+    from taches import taches_cli
+    from uploads import uploads_cli
     app.register_blueprint(api)
+    app.cli.add_command(apercus_cli)
+    app.cli.add_command(classements_cli)
+    app.cli.add_command(importer_cli)
+    app.cli.add_command(stockage_cli)
+    app.cli.add_command(taches_cli)
+    app.cli.add_command(texte_cli)
+    app.cli.add_command(uploads_cli)
 
     # Route santé
     @app.route("/health")
     def health():
         return jsonify({"status": "ok"}), 200
 
-    # Créer les tables et le dossier uploads au démarrage (dev)
-    with app.app_context():
-        db.create_all()
-        os.makedirs(app.config.get("UPLOAD_FOLDER", "uploads"), exist_ok=True)
+    # Schéma créé au démarrage en dev et en tests seulement ; en production,
+    # `flask db upgrade` est lancé une fois avant les workers
+    if app.config["AUTO_CREATE_SCHEMA"]:
+        with app.app_context():
+            db.create_all()
+    os.makedirs(app.config.get("UPLOAD_FOLDER", "uploads"), exist_ok=True)
 
     return app
 
@@ -1,8 +1,11 @@
 """Utilitaires d'authentification JWT."""
 import jwt
 import datetime
+import threading
+import time
+from collections import OrderedDict
 from functools import wraps
-from flask import request, jsonify, current_app
+from flask import request, jsonify, current_app, abort, make_response
 
 
 def generate_token(user):
@@ -17,9 +20,106 @@ def generate_token(user):
     return jwt.encode(payload, current_app.config["SECRET_KEY"], algorithm="HS256")
 
 
+# ──────────────────────────────────────────────
+#  CACHE DES PRINCIPAUX
+# ──────────────────────────────────────────────
+class CachePrincipaux:
+    """Cache LRU borné, avec durée de vie, des rôles des utilisateurs authentifiés.
+
+    Clé : (user_id, iat du token). Une entrée évite la lecture de
+    l'utilisateur en base pour chaque requête authentifiée ; elle porte la
+    version de la table `utilisateur` (`version_donnees`) lue à l'écriture
+    et n'est plus servie dès que cette version change, quel que soit le
+    processus à l'origine de la modification. Elle expire après `ttl`
+    secondes.
+    """
+
+    def __init__(self, taille_max=10000, ttl=60):
+        self.taille_max = taille_max
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entrees = OrderedDict()  # (user_id, iat) -> (role, version, expire_a)
+        self._verrou = threading.Lock()
+
+    def lire(self, user_id, iat, version):
+        cle = (user_id, iat)
+        with self._verrou:
+            entree = self._entrees.get(cle)
+            if entree is None or entree[1] != version or entree[2] < time.monotonic():
+                if entree is not None:
+                    del self._entrees[cle]
+                self.misses += 1
+                return None
+            self._entrees.move_to_end(cle)
+            self.hits += 1
+            return entree[0]
+
+    def ecrire(self, user_id, iat, role, version):
+        with self._verrou:
+            self._entrees[(user_id, iat)] = (role, version, time.monotonic() + self.ttl)
+            self._entrees.move_to_end((user_id, iat))
+            while len(self._entrees) > self.taille_max:
+                self._entrees.popitem(last=False)
+
+    def statistiques(self):
+        with self._verrou:
+            total = self.hits + self.misses
+            return {
+                "entrees": len(self._entrees),
+                "hits": self.hits,
+                "misses": self.misses,
+                "taux_hits": round(self.hits / total, 3) if total else None,
+            }
+
+
+def init_app(app):
+    """Installer le cache des principaux de l'application."""
+    app.extensions["cache_principaux"] = CachePrincipaux(
+        taille_max=app.config["AUTH_CACHE_SIZE"], ttl=app.config["AUTH_CACHE_TTL"]
+    )
+
+
+class Principal:
+    """Utilisateur authentifié : `id` et `role` sans accès base.
+
+    Les autres attributs (`to_dict`, `email`…) sont lus sur l'entité
+    `Utilisateur`, chargée à la première utilisation ; 401 si elle a été
+    supprimée entre-temps.
+    """
+
+    def __init__(self, id, role):
+        self.id = id
+        self.role = role
+        self._utilisateur = None
+
+    @property
+    def utilisateur(self):
+        from models import db, Utilisateur
+
+        if self._utilisateur is None:
+            self._utilisateur = db.session.get(Utilisateur, self.id)
+            if self._utilisateur is None:
+                abort(make_response(jsonify({"error": "Utilisateur introuvable"}), 401))
+        return self._utilisateur
+
+    def __getattr__(self, nom):
+        if nom.startswith("_"):
+            raise AttributeError(nom)
+        return getattr(self.utilisateur, nom)
+
+    def __repr__(self):
+        return f"<Principal {self.id} {self.role}>"
+
+
 def _get_current_user_from_token():
-    """Extraire et valider l'utilisateur courant à partir du header Authorization."""
-    from models import Utilisateur
+    """Extraire et valider l'utilisateur courant à partir du header Authorization.
+
+    Renvoie un `Principal` ; seule la version de la table `utilisateur` est
+    lue si le (user_id, iat) est dans le cache.
+    """
+    from models import db, Utilisateur
+    from versions import lire_versions
 
     auth_header = request.headers.get("Authorization", "")
     if not auth_header.startswith("Bearer "):
@@ -31,15 +131,26 @@ def _get_current_user_from_token():
         payload = jwt.decode(
             token, current_app.config["SECRET_KEY"], algorithms=["HS256"]
         )
-        user = Utilisateur.query.get(payload["user_id"])
-        if not user:
-            return None, (jsonify({"error": "Utilisateur introuvable"}), 401)
-        return user, None
     except jwt.ExpiredSignatureError:
         return None, (jsonify({"error": "Token expiré"}), 401)
     except jwt.InvalidTokenError:
         return None, (jsonify({"error": "Token invalide"}), 401)
 
+    user_id, iat = payload["user_id"], payload.get("iat")
+    cache = current_app.extensions["cache_principaux"]
+    version = lire_versions(("utilisateur",))["utilisateur"][0]
+    role = cache.lire(user_id, iat, version)
+    if role is not None:
+        return Principal(user_id, role), None
+
+    user = db.session.get(Utilisateur, user_id)
+    if not user:
+        return None, (jsonify({"error": "Utilisateur introuvable"}), 401)
+    cache.ecrire(user_id, iat, user.role, version)
+    principal = Principal(user.id, user.role)
+    principal._utilisateur = user
+    return principal, None
+
 
 def token_required(f):
     """Décorateur : route protégée par JWT."""
@@ -0,0 +1,77 @@
+"""Benchmark du démarrage à froid : `import app` + `create_app()` + préchauffage.
+
+Chaque mesure tourne dans un interpréteur neuf (comme un worker sans
+preload). Compare `AUTO_CREATE_SCHEMA=1` (create_all à chaque démarrage) et
+`AUTO_CREATE_SCHEMA=0` (schéma géré par les migrations).
+
+    python benchmarks/demarrage.py                 # SQLite temporaire
+    DB_HOST=localhost python benchmarks/demarrage.py --postgres -n 20
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+RACINE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MESURE = """
+import json, time
+t0 = time.perf_counter()
+from app import create_app
+t1 = time.perf_counter()
+app = create_app(OVERRIDES)
+t2 = time.perf_counter()
+import demarrage
+assert demarrage.prechauffer(app)
+t3 = time.perf_counter()
+print(json.dumps({"import": t1 - t0, "create_app": t2 - t1, "prechauffage": t3 - t2}))
+"""
+
+
+def mesurer(env, overrides):
+    code = MESURE.replace("OVERRIDES", repr(overrides))
+    sortie = subprocess.run(
+        [sys.executable, "-c", code], cwd=RACINE, env=env,
+        capture_output=True, text=True, check=True,
+    )
+    return json.loads(sortie.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-n", type=int, default=10, help="démarrages par scénario")
+    parser.add_argument(
+        "--postgres", action="store_true",
+        help="base PostgreSQL de la configuration (DB_HOST, …) au lieu de SQLite",
+    )
+    args = parser.parse_args()
+
+    overrides = {"PASSWORD_HASH_WORKERS": 0}
+    with tempfile.TemporaryDirectory() as dossier:
+        if not args.postgres:
+            overrides["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{dossier}/bench.db"
+        overrides["UPLOAD_FOLDER"] = os.path.join(dossier, "uploads")
+        env = dict(os.environ, FLASK_ENV="development")
+        # Schéma créé une fois, comme après `flask db upgrade`
+        mesurer(env, {**overrides, "AUTO_CREATE_SCHEMA": True})
+
+        print(f"{'scénario':<22}{'import':>10}{'create_app':>12}{'préchauff.':>12}{'total':>10}  (ms, médiane)")
+        for auto in ("1", "0"):
+            mesures = [mesurer(env, {**overrides, "AUTO_CREATE_SCHEMA": auto == "1"})
+                       for _ in range(args.n)]
+            medianes = {
+                cle: statistics.median(m[cle] for m in mesures) * 1000
+                for cle in ("import", "create_app", "prechauffage")
+            }
+            total = statistics.median(sum(m.values()) for m in mesures) * 1000
+            print(
+                f"{'AUTO_CREATE_SCHEMA=' + auto:<22}{medianes['import']:>10.1f}"
+                f"{medianes['create_app']:>12.1f}{medianes['prechauffage']:>12.1f}{total:>10.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
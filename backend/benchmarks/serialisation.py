@@ -0,0 +1,120 @@
+"""Benchmark de la sérialisation d'une page de documents : dicts, JSON, compression.
+
+Pour chaque taille de page : `documents_to_dict`, puis l'encodage JSON par le
+fournisseur par défaut de Flask, par `FournisseurJSON` sans orjson et avec
+orjson, puis la compression gzip / brotli du document obtenu (temps et
+taille). Base SQLite temporaire, descriptions de longueur réaliste.
+
+    python benchmarks/serialisation.py [-n 2000] [--repetitions 50]
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask.json.provider import DefaultJSONProvider  # noqa: E402
+
+import reponses  # noqa: E402
+from app import create_app  # noqa: E402
+from models import db, Document, Filiere, Matiere, Universite, Utilisateur  # noqa: E402
+from serializers import avec_relations, documents_to_dict  # noqa: E402
+
+DESCRIPTION = (
+    "Support de cours complet : définitions, théorèmes démontrés, exemples "
+    "corrigés et exercices d'application pour préparer l'examen final. "
+) * 4
+TAILLES_PAGE = (20, 100)
+
+
+def peupler(n):
+    uni = Universite(nom="Université de bench", sigle="UB", ville="Dakar")
+    db.session.add(uni)
+    db.session.flush()
+    filiere = Filiere(nom="Informatique", universite_id=uni.id)
+    db.session.add(filiere)
+    db.session.flush()
+    matiere = Matiere(nom="Algorithmique", filiere_id=filiere.id, niveau="L1")
+    auteur = Utilisateur(nom="Diop", prenom="Awa", email="bench@example.com")
+    auteur.mot_de_passe = "x"
+    db.session.add_all([matiere, auteur])
+    db.session.flush()
+    db.session.execute(db.insert(Document), [
+        {
+            "titre": f"Cours d'algorithmique n°{i}", "description": DESCRIPTION,
+            "type": "cours", "fichier_nom": f"cours{i}.pdf", "fichier_stockage": f"{i}.pdf",
+            "taille": 1_500_000 + i, "format": "pdf", "annee_academique": "2023-2024",
+            "matiere_id": matiere.id, "auteur_id": auteur.id, "statut": "approuve",
+            "nb_telechargements": i % 97, "vote_count": i % 7, "vote_sum": (i % 7) * 4,
+        }
+        for i in range(n)
+    ])
+    db.session.commit()
+
+
+def mediane_ms(fonction, repetitions):
+    mesures = []
+    for _ in range(repetitions):
+        debut = time.perf_counter()
+        resultat = fonction()
+        mesures.append(time.perf_counter() - debut)
+    return statistics.median(mesures) * 1000, resultat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-n", type=int, default=2000, help="documents en base")
+    parser.add_argument("--repetitions", type=int, default=50)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as dossier:
+        app = create_app({
+            "SQLALCHEMY_DATABASE_URI": f"sqlite:///{dossier}/bench.db",
+            "UPLOAD_FOLDER": os.path.join(dossier, "uploads"),
+            "PASSWORD_HASH_WORKERS": 0,
+            "DEBUG": False,
+        })
+        with app.app_context():
+            peupler(args.n)
+            flask_defaut = DefaultJSONProvider(app)
+            rapide = reponses.FournisseurJSON(app)
+            orjson = reponses.orjson
+
+            for taille in TAILLES_PAGE:
+                documents = avec_relations(Document.query).limit(taille).all()
+                lignes = []
+                duree, page = mediane_ms(lambda: documents_to_dict(documents), args.repetitions)
+                lignes.append(("documents_to_dict", duree, None))
+                corps = {"documents": page, "total": args.n, "page": 1}
+
+                duree, _ = mediane_ms(lambda: flask_defaut.dumps(corps), args.repetitions)
+                lignes.append(("json Flask (défaut)", duree, None))
+                reponses.orjson = None
+                duree, _ = mediane_ms(lambda: rapide._encoder(corps), args.repetitions)
+                lignes.append(("json (FournisseurJSON)", duree, None))
+                reponses.orjson = orjson
+                if orjson is not None:
+                    duree, _ = mediane_ms(lambda: rapide._encoder(corps), args.repetitions)
+                    lignes.append(("orjson (FournisseurJSON)", duree, None))
+
+                donnees = rapide._encoder(corps)
+                lignes.append(("non compressé", None, len(donnees)))
+                encodages = ["gzip"] + (["br"] if reponses.brotli is not None else [])
+                for encodage in encodages:
+                    duree, compresse = mediane_ms(
+                        lambda: reponses._compresser(donnees, encodage), args.repetitions
+                    )
+                    lignes.append((encodage, duree, len(compresse)))
+
+                print(f"\nPage de {taille} documents (ms, médiane sur {args.repetitions})")
+                for nom, duree, octets in lignes:
+                    taille_txt = f"{octets / 1024:>9.1f} Kio" if octets is not None else ""
+                    duree_txt = f"{duree:>8.3f}" if duree is not None else " " * 8
+                    print(f"  {nom:<26}{duree_txt}{taille_txt}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""Catalogue hiérarchique d'une université (filières → matières) avec comptes.
+
+L'arbre vient de l'instantané du référentiel ; les comptes de documents
+approuvés et la date du dernier ajout viennent d'une seule requête
+d'agrégation (GROUP BY matiere_id), remontés ensuite aux filières et à
+l'université. Le résultat est mémorisé par processus tant que les versions
+du référentiel et de `document` ne changent pas.
+"""
+import threading
+
+from flask import current_app, g
+
+from models import db, Document, DOCUMENT_APPROUVE
+from taxonomie import TABLES_TAXONOMIE
+
+TABLES_CATALOGUE = TABLES_TAXONOMIE + ("document",)
+
+
+def statistiques_matieres(ids_matieres):
+    """{matiere_id: (nombre de documents approuvés, date du dernier ajout)}."""
+    if not ids_matieres:
+        return {}
+    lignes = db.session.execute(
+        db.select(
+            Document.matiere_id,
+            db.func.count(Document.id),
+            db.func.max(Document.created_at),
+        )
+        .where(DOCUMENT_APPROUVE, Document.matiere_id.in_(ids_matieres))
+        .group_by(Document.matiere_id)
+    )
+    return {mid: (n, dernier) for mid, n, dernier in lignes}
+
+
+def _cumuler(noeud, enfants):
+    noeud["nb_documents"] = sum(e["nb_documents"] for e in enfants)
+    dates = [e["dernier_ajout"] for e in enfants if e["dernier_ajout"]]
+    noeud["dernier_ajout"] = max(dates) if dates else None
+
+
+def construire(referentiel, uid, niveau=None):
+    """Arbre du catalogue de l'université `uid` (None si elle n'existe pas).
+
+    Avec `niveau`, seules les matières de ce niveau (et les filières qui en
+    ont) sont conservées.
+    """
+    universite = referentiel.universite(uid)
+    if universite is None:
+        return None
+
+    filieres = referentiel.filieres(universite_id=uid)
+    matieres = {
+        f["id"]: referentiel.matieres(filiere_id=f["id"], niveau=niveau)
+        for f in filieres
+    }
+    stats = statistiques_matieres([m["id"] for ms in matieres.values() for m in ms])
+
+    universite["filieres"] = []
+    for filiere in filieres:
+        if niveau and not matieres[filiere["id"]]:
+            continue
+        for matiere in matieres[filiere["id"]]:
+            n, dernier = stats.get(matiere["id"], (0, None))
+            matiere["nb_documents"] = n
+            matiere["dernier_ajout"] = dernier
+        filiere["matieres"] = matieres[filiere["id"]]
+        _cumuler(filiere, filiere["matieres"])
+        universite["filieres"].append(filiere)
+    _cumuler(universite, universite["filieres"])
+    return universite
+
+
+class CacheCatalogue:
+    """Catalogues déjà construits, valides pour une version des données."""
+
+    TAILLE_MAX = 512
+
+    def __init__(self):
+        self._entrees = {}  # (uid, niveau) -> (versions, catalogue)
+        self._verrou = threading.Lock()
+
+    def lire(self, cle, versions):
+        entree = self._entrees.get(cle)
+        return entree[1] if entree is not None and entree[0] == versions else None
+
+    def ecrire(self, cle, versions, catalogue):
+        with self._verrou:
+            if len(self._entrees) >= self.TAILLE_MAX:
+                self._entrees.clear()
+            self._entrees[cle] = (versions, catalogue)
+
+
+def init_app(app):
+    app.extensions["catalogue"] = CacheCatalogue()
+
+
+def catalogue(referentiel, uid, niveau=None):
+    """Catalogue mémorisé ; les versions sont celles lues par `reponse_versionnee`."""
+    cache = current_app.extensions["catalogue"]
+    versions = tuple(g.versions_donnees[t][0] for t in TABLES_CATALOGUE)
+    resultat = cache.lire((uid, niveau), versions)
+    if resultat is None:
+        resultat = construire(referentiel, uid, niveau)
+        cache.ecrire((uid, niveau), versions, resultat)
+    return resultat
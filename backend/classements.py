@@ -0,0 +1,276 @@
+"""Classements des documents : tendances et mieux notés, précalculés.
+
+Les téléchargements (cf. compteurs) et les votes ajoutent une ligne au journal
+`activite`. La tâche périodique `actualiser_classements` (toutes les
+`RANKINGS_REFRESH_INTERVAL` secondes) consomme ce journal et ne réécrit dans
+`classement` que les documents touchés :
+
+- tendance : activité pondérée (un vote compte comme `POIDS["vote"]`
+  téléchargements) qui décroît avec une demi-vie de
+  `TRENDING_HALF_LIFE_HOURS`. Le score est stocké en espace logarithmique,
+  rapporté à une époque fixe : s = log Σ poids · e^(λ·(t − époque)). Le
+  facteur de décroissance e^(−λ·(maintenant − époque)) est commun à tous les
+  documents et ne change pas l'ordre : un score n'est jamais réécrit pour
+  vieillir, une nouvelle activité s'y ajoute par log-somme-exp.
+- mieux notés : moyenne bayésienne (C·m + Σ notes) / (C + n), avec
+  C = `RATING_PRIOR_VOTES` et m la moyenne globale des notes ; un document
+  noté une seule fois ne passe pas devant un document bien noté par beaucoup.
+  Quand m s'écarte de plus de `DERIVE_MOYENNE` de la valeur utilisée, toutes
+  les lignes sont recalculées en un UPDATE.
+
+Les routes lisent `classement` dans l'ordre de ses index et joignent le
+document par clé primaire : le coût ne dépend pas de la taille du catalogue.
+
+    flask classements actualiser      # hors worker (cron…)
+    flask classements reconstruire    # amorçage depuis les totaux existants
+"""
+import datetime
+import math
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+
+from models import (
+    db, Activite, Classement, ClassementEtat, Document, insert_upsert, maintenant_utc
+)
+from taches import gestionnaire, periodique
+
+EPOQUE = datetime.datetime(2024, 1, 1)
+POIDS = {"telechargement": 1.0, "vote": 3.0}
+DERIVE_MOYENNE = 0.01
+TAILLE_LOT = 5000
+
+
+def decroissance(config):
+    """λ (par seconde) d'après la demi-vie configurée."""
+    return math.log(2) / (config["TRENDING_HALF_LIFE_HOURS"] * 3600)
+
+
+def _log_somme(a, b):
+    """log(e^a + e^b) sans débordement (None : somme vide)."""
+    if a is None:
+        return b
+    if b is None:
+        return a
+    return max(a, b) + math.log1p(math.exp(-abs(a - b)))
+
+
+def _log_activite(poids, date, lam):
+    return math.log(poids) + lam * (date - EPOQUE).total_seconds()
+
+
+def tendance_a(score, date, lam):
+    """Activité pondérée et décrue, vue à la date `date`."""
+    return math.exp(score - lam * (date - EPOQUE).total_seconds())
+
+
+def note_bayesienne(vote_count, vote_sum, moyenne, prior):
+    if not vote_count or moyenne is None:
+        return None
+    return (prior * moyenne + vote_sum) / (prior + vote_count)
+
+
+# ──────────────────────────────────────────────
+#  ACTUALISATION
+# ──────────────────────────────────────────────
+def _verrouiller():
+    """Ligne d'état verrouillée : une seule actualisation à la fois."""
+    insert = insert_upsert()
+    db.session.execute(insert(ClassementEtat).values(id=1).on_conflict_do_nothing())
+    return db.session.execute(
+        db.select(ClassementEtat).where(ClassementEtat.id == 1).with_for_update()
+    ).scalar_one()
+
+
+def _moyenne_globale():
+    nombre, somme = db.session.execute(
+        db.select(db.func.sum(Document.vote_count), db.func.sum(Document.vote_sum))
+    ).one()
+    return somme / nombre if nombre else None
+
+
+def _recalculer_notes(moyenne, prior):
+    """Toutes les moyennes bayésiennes, après un changement de moyenne globale."""
+    d = Document
+    note = (
+        db.select(
+            db.case(
+                (d.vote_count > 0, (prior * moyenne + d.vote_sum) / (prior + d.vote_count)),
+                else_=None,
+            )
+        )
+        .where(d.id == Classement.document_id)
+        .scalar_subquery()
+    )
+    db.session.execute(
+        db.update(Classement).values(note_bayesienne=note)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def _ecrire(lignes):
+    insert = insert_upsert()
+    stmt = insert(Classement)
+    db.session.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[Classement.document_id],
+            set_={
+                colonne: stmt.excluded[colonne]
+                for colonne in (
+                    "matiere_id", "type", "score_tendance", "note_bayesienne", "updated_at"
+                )
+            },
+        ),
+        lignes,
+    )
+
+
+def _appliquer(activites, etat, config):
+    """Reporter un lot d'activités sur `classement` (sans commit)."""
+    lam, prior = decroissance(config), config["RATING_PRIOR_VOTES"]
+    increments, votes = {}, False
+    for a in activites:
+        poids = POIDS[a.type] * (a.valeur if a.type == "telechargement" else 1)
+        increments[a.document_id] = _log_somme(
+            increments.get(a.document_id), _log_activite(poids, a.created_at, lam)
+        )
+        votes = votes or a.type == "vote"
+
+    if votes:
+        moyenne = _moyenne_globale()
+        derive = (
+            etat.moyenne_notes is None
+            or moyenne is None
+            or abs(moyenne - etat.moyenne_notes) > DERIVE_MOYENNE
+        )
+        if derive:
+            etat.moyenne_notes = moyenne
+    ids = sorted(increments)
+    documents = db.session.execute(
+        db.select(Document.id, Document.matiere_id, Document.type,
+                  Document.vote_count, Document.vote_sum)
+        .where(Document.id.in_(ids))
+    ).all()
+    scores = dict(db.session.execute(
+        db.select(Classement.document_id, Classement.score_tendance)
+        .where(Classement.document_id.in_(ids))
+    ).all())
+    maintenant = maintenant_utc()
+    lignes = [
+        {
+            "document_id": d.id,
+            "matiere_id": d.matiere_id,
+            "type": d.type,
+            "score_tendance": _log_somme(scores.get(d.id), increments[d.id]),
+            "note_bayesienne": note_bayesienne(
+                d.vote_count, d.vote_sum, etat.moyenne_notes, prior
+            ),
+            "updated_at": maintenant,
+        }
+        for d in documents  # documents supprimés entre-temps : ignorés
+    ]
+    if lignes:
+        _ecrire(lignes)
+    if votes and derive and etat.moyenne_notes is not None:
+        _recalculer_notes(etat.moyenne_notes, prior)
+
+
+def actualiser(taille_lot=TAILLE_LOT):
+    """Consommer le journal d'activité par lots ; commite chaque lot.
+
+    Renvoie le nombre d'activités traitées.
+    """
+    config, total = current_app.config, 0
+    while True:
+        etat = _verrouiller()
+        activites = db.session.execute(
+            db.select(Activite.id, Activite.document_id, Activite.type,
+                      Activite.valeur, Activite.created_at)
+            .order_by(Activite.id)
+            .limit(taille_lot)
+        ).all()
+        if activites:
+            _appliquer(activites, etat, config)
+            # Les identifiants lus exactement : une activité d'id inférieur
+            # validée entre-temps sera lue au lot suivant
+            db.session.execute(
+                db.delete(Activite).where(Activite.id.in_([a.id for a in activites]))
+            )
+        db.session.commit()
+        total += len(activites)
+        if len(activites) < taille_lot:
+            return total
+
+
+@gestionnaire("actualiser_classements", max_tentatives=1)
+def actualiser_classements():
+    """Tâche périodique : un échec est rattrapé à la période suivante."""
+    actualiser()
+
+
+periodique("actualiser_classements", "RANKINGS_REFRESH_INTERVAL")
+
+
+# ──────────────────────────────────────────────
+#  COMMANDES
+# ──────────────────────────────────────────────
+classements_cli = AppGroup("classements", help="Classements tendances / mieux notés.")
+
+
+@classements_cli.command("actualiser")
+def actualiser_commande():
+    """Reporter l'activité récente sur les classements."""
+    click.echo(f"{actualiser()} activité(s) traitée(s)")
+
+
+@classements_cli.command("reconstruire")
+@click.option("--lot", default=1000, show_default=True, help="Documents par transaction.")
+def reconstruire_commande(lot):
+    """Repartir des totaux des documents (activité datée de leur publication).
+
+    Le journal d'activité en attente est vidé : il est compris dans les totaux.
+    """
+    config = current_app.config
+    lam, prior = decroissance(config), config["RATING_PRIOR_VOTES"]
+    etat = _verrouiller()
+    db.session.execute(db.delete(Activite))
+    db.session.execute(db.delete(Classement))
+    etat.moyenne_notes = _moyenne_globale()
+    dernier_id, n = 0, 0
+    while True:
+        documents = db.session.execute(
+            db.select(Document.id, Document.matiere_id, Document.type, Document.created_at,
+                      Document.nb_telechargements, Document.vote_count, Document.vote_sum)
+            .where(Document.id > dernier_id)
+            .order_by(Document.id)
+            .limit(lot)
+        ).all()
+        if not documents:
+            break
+        dernier_id = documents[-1].id
+        maintenant = maintenant_utc()
+        lignes = []
+        for d in documents:
+            poids = (d.nb_telechargements or 0) * POIDS["telechargement"] \
+                + d.vote_count * POIDS["vote"]
+            note = note_bayesienne(d.vote_count, d.vote_sum, etat.moyenne_notes, prior)
+            if not poids and note is None:
+                continue
+            lignes.append({
+                "document_id": d.id,
+                "matiere_id": d.matiere_id,
+                "type": d.type,
+                "score_tendance": (
+                    _log_activite(poids, d.created_at or maintenant, lam) if poids else None
+                ),
+                "note_bayesienne": note,
+                "updated_at": maintenant,
+            })
+        if lignes:
+            _ecrire(lignes)
+        db.session.commit()
+        n += len(lignes)
+        etat = _verrouiller()
+    db.session.commit()
+    click.echo(f"{n} document(s) classé(s)")
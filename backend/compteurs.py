@@ -0,0 +1,139 @@
+"""Compteur de téléchargements tamponné en mémoire.
+
+Chaque téléchargement incrémente un compteur local au processus ; un thread
+de fond vide périodiquement le tampon en un seul lot de
+`UPDATE document SET nb_telechargements = nb_telechargements + n`. Les
+incréments étant additifs, plusieurs workers gunicorn et plusieurs réplicas
+peuvent vider leurs tampons indépendamment sans perdre de comptes. Le tampon
+est vidé à l'arrêt du worker (hook gunicorn `worker_exit` et `atexit`) ; seul
+un arrêt brutal (SIGKILL) peut perdre au plus un intervalle de comptes.
+
+Avec `DOWNLOAD_COUNTER_FLUSH_INTERVAL = 0`, chaque incrément est écrit
+immédiatement (mode utilisé par les tests).
+"""
+import atexit
+import logging
+import os
+import threading
+from collections import Counter
+
+from flask import has_app_context
+
+from models import db, Activite, Document, maintenant_utc
+
+logger = logging.getLogger(__name__)
+
+
+class CompteurTelechargements:
+    """Extension Flask : tampon des téléchargements par document."""
+
+    def __init__(self, app=None):
+        self.app = None
+        self._pid = None
+        self._atexit_enregistre = False
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.intervalle = app.config["DOWNLOAD_COUNTER_FLUSH_INTERVAL"]
+        self.taille_max = app.config["DOWNLOAD_COUNTER_MAX_PENDING"]
+        app.extensions["compteur_telechargements"] = self
+        self._reinitialiser()
+        if not self._atexit_enregistre:
+            atexit.register(self.vider)
+            self._atexit_enregistre = True
+
+    def _reinitialiser(self):
+        """(Ré)initialiser l'état propre au processus (utile après un fork)."""
+        self._pid = os.getpid()
+        self._verrou = threading.Lock()
+        self._en_attente = Counter()
+        self._reveil = threading.Event()
+        self._thread = None
+
+    def _demarrer(self):
+        if self._pid != os.getpid():
+            self._reinitialiser()
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(
+                target=self._boucle, name="vidage-telechargements", daemon=True
+            )
+            self._thread.start()
+
+    def _boucle(self):
+        while True:
+            self._reveil.wait(self.intervalle)
+            self._reveil.clear()
+            self.vider()
+
+    def incrementer(self, document_id, n=1):
+        """Comptabiliser `n` téléchargements du document."""
+        if self.intervalle <= 0:
+            self._ecrire(Counter({document_id: n}))
+            return
+        self._demarrer()
+        with self._verrou:
+            self._en_attente[document_id] += n
+            plein = len(self._en_attente) >= self.taille_max
+        if plein:
+            self._reveil.set()
+
+    def en_attente(self):
+        """Nombre de téléchargements non encore écrits, par document."""
+        with self._verrou:
+            return dict(self._en_attente)
+
+    def vider(self):
+        """Écrire le tampon en base ; renvoie le nombre de documents mis à jour."""
+        if self.app is None or self._pid != os.getpid():
+            return 0
+        with self._verrou:
+            lot, self._en_attente = self._en_attente, Counter()
+        if not lot:
+            return 0
+        try:
+            if has_app_context():
+                self._ecrire(lot)
+            else:
+                with self.app.app_context():
+                    self._ecrire(lot)
+        except Exception:
+            logger.exception("Échec du vidage des compteurs de téléchargement")
+            with self._verrou:
+                self._en_attente.update(lot)  # réessayé au prochain vidage
+            return 0
+        return len(lot)
+
+    def _ecrire(self, lot):
+        """Un UPDATE par document, en un seul executemany et une transaction.
+
+        Les documents sont triés par id pour que deux workers qui vident en
+        même temps verrouillent les lignes dans le même ordre (pas d'interblocage).
+        Le lot est aussi ajouté au journal d'activité (classements).
+        """
+        table = Document.__table__
+        stmt = (
+            table.update()
+            .where(table.c.id == db.bindparam("b_id"))
+            .values(
+                nb_telechargements=db.func.coalesce(table.c.nb_telechargements, 0)
+                + db.bindparam("b_n")
+            )
+        )
+        try:
+            lignes = sorted(lot.items())
+            db.session.execute(stmt, [{"b_id": did, "b_n": n} for did, n in lignes])
+            maintenant = maintenant_utc()
+            db.session.execute(db.insert(Activite), [
+                {"document_id": did, "type": "telechargement", "valeur": n,
+                 "created_at": maintenant}
+                for did, n in lignes
+            ])
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+
+compteur_telechargements = CompteurTelechargements()
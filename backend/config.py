@@ -17,17 +17,122 @@ class Config:
     )
     SQLALCHEMY_TRACK_MODIFICATIONS = False
 
+    # Pool de connexions (par worker) et délai max des requêtes SQL (ms).
+    # DB_PGBOUNCER=1 : pas de paramètre de session au démarrage des connexions
+    # (pooling PgBouncer par transaction), délai posé par SET LOCAL.
+    DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", "5"))
+    DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", "10"))
+    DB_POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", "10"))
+    DB_POOL_RECYCLE = int(os.environ.get("DB_POOL_RECYCLE", "1800"))
+    DB_POOL_PRE_PING = os.environ.get("DB_POOL_PRE_PING", "1") == "1"
+    DB_PGBOUNCER = os.environ.get("DB_PGBOUNCER", "0") == "1"
+    DB_STATEMENT_TIMEOUT_MS = int(os.environ.get("DB_STATEMENT_TIMEOUT_MS", "30000"))
+
+    # Connexions ouvertes par worker avant de se déclarer prêt (/ready)
+    DB_WARMUP_CONNECTIONS = int(os.environ.get("DB_WARMUP_CONNECTIONS", "2"))
+
+    # `db.create_all()` à chaque démarrage : pratique en dev, désactivé en
+    # production où le schéma suit les migrations (flask db upgrade)
+    AUTO_CREATE_SCHEMA = os.environ.get("AUTO_CREATE_SCHEMA", "1") == "1"
+
+    # Réplica en lecture (streaming replication) : vide = pas de réplica.
+    # Mêmes identifiants que la base principale ; les routes en lecture seule y
+    # lisent tant que son retard reste sous REPLICA_MAX_LAG_SECONDS, sauf pour
+    # un client ayant écrit depuis moins de REPLICA_STICKY_SECONDS.
+    DB_REPLICA_HOST = os.environ.get("DB_REPLICA_HOST", "")
+    SQLALCHEMY_REPLICA_URI = (
+        f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_REPLICA_HOST}:{DB_PORT}/{DB_NAME}"
+        if DB_REPLICA_HOST else ""
+    )
+    REPLICA_MAX_LAG_SECONDS = float(os.environ.get("REPLICA_MAX_LAG_SECONDS", "5"))
+    REPLICA_CHECK_INTERVAL = float(os.environ.get("REPLICA_CHECK_INTERVAL", "5"))
+    REPLICA_STICKY_SECONDS = float(os.environ.get("REPLICA_STICKY_SECONDS", "10"))
+
     # JWT
     SECRET_KEY = os.environ.get("SECRET_KEY", "dev-secret-key-change-in-production")
     JWT_EXPIRATION_HOURS = int(os.environ.get("JWT_EXPIRATION_HOURS", "24"))
+    # Cache des utilisateurs authentifiés (nombre d'entrées, durée de vie en s)
+    AUTH_CACHE_SIZE = int(os.environ.get("AUTH_CACHE_SIZE", "10000"))
+    AUTH_CACHE_TTL = float(os.environ.get("AUTH_CACHE_TTL", "60"))
+    # Hachage des mots de passe : méthode Werkzeug, processus dédiés (0 = dans
+    # le thread de la requête), calculs simultanés max, attente max en s (→ 503)
+    PASSWORD_HASH_METHOD = os.environ.get("PASSWORD_HASH_METHOD", "scrypt:32768:8:1")
+    PASSWORD_HASH_WORKERS = int(os.environ.get("PASSWORD_HASH_WORKERS", "2"))
+    PASSWORD_HASH_MAX_PENDING = int(os.environ.get("PASSWORD_HASH_MAX_PENDING", "8"))
+    PASSWORD_HASH_QUEUE_TIMEOUT = float(
+        os.environ.get("PASSWORD_HASH_QUEUE_TIMEOUT", "0.5")
+    )
+
+    # Révision du code déployé : entre dans les ETag des réponses JSON, pour
+    # qu'un changement de format invalide les caches HTTP
+    APP_REVISION = os.environ.get("APP_REVISION", "")
+
+    # Référentiel en mémoire : délai max (s) entre deux vérifications de version
+    TAXONOMY_CHECK_INTERVAL = float(os.environ.get("TAXONOMY_CHECK_INTERVAL", "2"))
+
+    # Statistiques : délai min (s) entre deux recalculs de l'instantané
+    STATS_REFRESH_INTERVAL = float(os.environ.get("STATS_REFRESH_INTERVAL", "60"))
+
+    # Tâches en arrière-plan (flask taches worker) : délai de visibilité d'une
+    # tâche réservée, délais entre essais, attente quand la file est vide,
+    # limites par type ("apercu=1,extraire_texte=2")
+    TASKS_VISIBILITY_TIMEOUT = float(os.environ.get("TASKS_VISIBILITY_TIMEOUT", "300"))
+    TASKS_RETRY_BASE = float(os.environ.get("TASKS_RETRY_BASE", "10"))
+    TASKS_RETRY_MAX = float(os.environ.get("TASKS_RETRY_MAX", "3600"))
+    TASKS_POLL_INTERVAL = float(os.environ.get("TASKS_POLL_INTERVAL", "1"))
+    TASKS_CONCURRENCY = os.environ.get("TASKS_CONCURRENCY", "")
+
+    # Texte extrait des fichiers pour la recherche : au-delà, il est tronqué
+    EXTRACTION_MAX_CHARS = int(os.environ.get("EXTRACTION_MAX_CHARS", "500000"))
+    EXTRACTION_MAX_PAGES = int(os.environ.get("EXTRACTION_MAX_PAGES", "500"))
+
+    # Compression gzip/brotli des réponses JSON à partir de cette taille
+    # (octets ; 0 la désactive, p. ex. si nginx s'en charge)
+    COMPRESSION_MIN_SIZE = int(os.environ.get("COMPRESSION_MIN_SIZE", "1024"))
+
+    # Classements : demi-vie de l'activité « tendances », poids de la moyenne
+    # globale dans les moyennes bayésiennes (en nombre de votes), intervalle
+    # d'actualisation par le worker (s)
+    TRENDING_HALF_LIFE_HOURS = float(os.environ.get("TRENDING_HALF_LIFE_HOURS", "72"))
+    RATING_PRIOR_VOTES = int(os.environ.get("RATING_PRIOR_VOTES", "5"))
+    RANKINGS_REFRESH_INTERVAL = float(os.environ.get("RANKINGS_REFRESH_INTERVAL", "60"))
+
+    # Pagination
+    MAX_PER_PAGE = int(os.environ.get("MAX_PER_PAGE", "100"))
+
+    # Compteur de téléchargements (secondes entre deux écritures groupées)
+    DOWNLOAD_COUNTER_FLUSH_INTERVAL = float(
+        os.environ.get("DOWNLOAD_COUNTER_FLUSH_INTERVAL", "5")
+    )
+    DOWNLOAD_COUNTER_MAX_PENDING = int(
+        os.environ.get("DOWNLOAD_COUNTER_MAX_PENDING", "1000")
+    )
+
+    # Téléchargements servis par nginx : préfixe de la location interne
+    # (ex. "/uploads-internes/"), vide pour envoyer les fichiers depuis Python
+    DOWNLOAD_ACCEL_REDIRECT = os.environ.get("DOWNLOAD_ACCEL_REDIRECT", "")
 
     # Upload
     UPLOAD_FOLDER = os.environ.get(
         "UPLOAD_FOLDER", os.path.join(os.path.dirname(__file__), "uploads")
     )
-    MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16 Mo max
+    MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16 Mo max (par requête / par morceau)
+    # Upload par morceaux : taille max du fichier complet, durée de vie des sessions
+    MAX_UPLOAD_SIZE = int(os.environ.get("MAX_UPLOAD_SIZE", str(512 * 1024 * 1024)))
+    UPLOAD_SESSION_TTL_HOURS = float(os.environ.get("UPLOAD_SESSION_TTL_HOURS", "24"))
+    # Purge des sessions expirées par le worker (s)
+    UPLOAD_PURGE_INTERVAL = float(os.environ.get("UPLOAD_PURGE_INTERVAL", "900"))
+    # Suppression des fichiers stockés sans référence par le worker (s)
+    STORAGE_SWEEP_INTERVAL = float(os.environ.get("STORAGE_SWEEP_INTERVAL", "86400"))
     ALLOWED_EXTENSIONS = {"pdf", "doc", "docx", "ppt", "pptx", "jpg", "jpeg", "png"}
 
+    # Aperçus (miniatures) : dossier (par défaut UPLOAD_FOLDER/.apercus) et
+    # taille max du cache, au-delà de laquelle les moins servis sont supprimés
+    PREVIEW_FOLDER = os.environ.get("PREVIEW_FOLDER", "")
+    PREVIEW_CACHE_MAX_BYTES = int(
+        os.environ.get("PREVIEW_CACHE_MAX_BYTES", str(1024 * 1024 * 1024))
+    )
+
 
 class DevelopmentConfig(Config):
     DEBUG = True
@@ -35,12 +140,15 @@ class DevelopmentConfig(Config):
 
 class ProductionConfig(Config):
     DEBUG = False
+    AUTO_CREATE_SCHEMA = os.environ.get("AUTO_CREATE_SCHEMA", "0") == "1"
 
 
 class TestingConfig(Config):
     TESTING = True
     SQLALCHEMY_DATABASE_URI = "sqlite:///:memory:"
     UPLOAD_FOLDER = "/tmp/test_uploads"
+    DOWNLOAD_COUNTER_FLUSH_INTERVAL = 0
+    PASSWORD_HASH_WORKERS = 0
 
 
 config_by_name = {
@@ -0,0 +1,200 @@
+"""Pool de connexions PostgreSQL, délais d'exécution des requêtes et métriques.
+
+Réglages (variables d'environnement, cf. config) : taille du pool,
+débordement, délai d'attente d'une connexion, recyclage, pre-ping. En mode
+PgBouncer (pooling par transaction), aucun paramètre de session n'est
+envoyé au démarrage de la connexion : le délai par défaut est posé par
+`SET LOCAL` au début de chaque transaction.
+
+`delai_requetes(ms)` borne la durée des requêtes SQL d'une route : une
+requête annulée par PostgreSQL donne une réponse 503 au lieu d'occuper une
+connexion du pool. Le temps d'attente pour obtenir une connexion est mesuré
+par pool et exposé dans /api/admin/metriques.
+"""
+import bisect
+import threading
+import time
+from functools import wraps
+
+from flask import jsonify
+from sqlalchemy import event
+from sqlalchemy.exc import OperationalError, TimeoutError as DelaiPoolDepasse
+from sqlalchemy.pool import QueuePool
+
+from models import db
+
+# Bornes (ms) de l'histogramme des attentes ; dernière classe : au-delà
+BORNES_ATTENTE_MS = (1, 5, 10, 50, 100, 500, 1000)
+
+# SQLSTATE PostgreSQL d'une requête annulée (statement_timeout)
+REQUETE_ANNULEE = "57014"
+
+
+class MetriquesPool:
+    """Attentes de connexion d'un pool (propres au processus)."""
+
+    def __init__(self, nom):
+        self.nom = nom
+        self._verrou = threading.Lock()
+        self.reinitialiser()
+
+    def reinitialiser(self):
+        with self._verrou:
+            self.obtentions = 0
+            self.delais_depasses = 0
+            self.attente_totale = 0.0
+            self.attente_max = 0.0
+            self.histogramme = [0] * (len(BORNES_ATTENTE_MS) + 1)
+
+    def enregistrer(self, attente, obtenue=True):
+        ms = attente * 1000
+        with self._verrou:
+            if obtenue:
+                self.obtentions += 1
+            else:
+                self.delais_depasses += 1
+            self.attente_totale += ms
+            self.attente_max = max(self.attente_max, ms)
+            self.histogramme[bisect.bisect_left(BORNES_ATTENTE_MS, ms)] += 1
+
+    def statistiques(self):
+        with self._verrou:
+            total = self.obtentions + self.delais_depasses
+            return {
+                "obtentions": self.obtentions,
+                "delais_depasses": self.delais_depasses,
+                "attente_moyenne_ms": round(self.attente_totale / total, 3) if total else None,
+                "attente_max_ms": round(self.attente_max, 3),
+                "histogramme_ms": {
+                    **{f"<={b}": n for b, n in zip(BORNES_ATTENTE_MS, self.histogramme)},
+                    f">{BORNES_ATTENTE_MS[-1]}": self.histogramme[-1],
+                },
+            }
+
+
+class PoolInstrumente(QueuePool):
+    """QueuePool qui mesure l'attente de chaque obtention de connexion."""
+
+    metriques = None  # fixé par `classe_pool`
+
+    def _do_get(self):
+        debut = time.perf_counter()
+        try:
+            connexion = super()._do_get()
+        except DelaiPoolDepasse:
+            self.metriques.enregistrer(time.perf_counter() - debut, obtenue=False)
+            raise
+        self.metriques.enregistrer(time.perf_counter() - debut)
+        return connexion
+
+
+METRIQUES = {}  # nom du pool -> MetriquesPool
+_classes = {}
+
+
+def classe_pool(nom):
+    """Sous-classe de `PoolInstrumente` liée aux métriques du pool `nom`."""
+    if nom not in _classes:
+        METRIQUES[nom] = MetriquesPool(nom)
+        _classes[nom] = type(
+            f"PoolInstrumente_{nom}", (PoolInstrumente,), {"metriques": METRIQUES[nom]}
+        )
+    return _classes[nom]
+
+
+# ──────────────────────────────────────────────
+#  CONFIGURATION DU MOTEUR
+# ──────────────────────────────────────────────
+def options_moteur(config, uri=None, nom="principal"):
+    """Options de `create_engine` pour PostgreSQL (None pour les autres bases)."""
+    if not (uri or config["SQLALCHEMY_DATABASE_URI"]).startswith("postgresql"):
+        return None
+    options = {
+        "poolclass": classe_pool(nom),
+        "pool_size": config["DB_POOL_SIZE"],
+        "max_overflow": config["DB_MAX_OVERFLOW"],
+        "pool_timeout": config["DB_POOL_TIMEOUT"],
+        "pool_recycle": config["DB_POOL_RECYCLE"],
+        "pool_pre_ping": config["DB_POOL_PRE_PING"],
+    }
+    if not config["DB_PGBOUNCER"]:
+        options["connect_args"] = {
+            "options": f"-c statement_timeout={config['DB_STATEMENT_TIMEOUT_MS']}"
+        }
+    return options
+
+
+def configurer(app):
+    """Compléter SQLALCHEMY_ENGINE_OPTIONS (à appeler avant `db.init_app`)."""
+    options = options_moteur(app.config)
+    if options:
+        app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
+            **options, **app.config.get("SQLALCHEMY_ENGINE_OPTIONS", {})
+        }
+
+
+def _pool_sature(_erreur):
+    db.session.rollback()
+    response = jsonify({"error": "Service surchargé, réessayez dans un instant"})
+    response.headers["Retry-After"] = "1"
+    return response, 503
+
+
+def init_app(app):
+    """Pool saturé → 503 ; en mode PgBouncer, délai par défaut posé au début
+    de chaque transaction."""
+    app.register_error_handler(DelaiPoolDepasse, _pool_sature)
+    if app.config["DB_PGBOUNCER"] and options_moteur(app.config):
+        with app.app_context():
+            installer_delai_transaction(db.engine, app.config["DB_STATEMENT_TIMEOUT_MS"])
+
+
+def installer_delai_transaction(engine, delai_ms):
+    """Poser le délai par défaut au début de chaque transaction (`SET LOCAL`)."""
+    @event.listens_for(engine, "begin")
+    def _delai(connexion):
+        connexion.exec_driver_sql(f"SET LOCAL statement_timeout = {int(delai_ms)}")
+
+
+# ──────────────────────────────────────────────
+#  DÉLAI PAR ROUTE
+# ──────────────────────────────────────────────
+def est_requete_annulee(exc):
+    return getattr(exc.orig, "pgcode", None) == REQUETE_ANNULEE
+
+
+def delai_requetes(ms):
+    """Borner à `ms` millisecondes chaque requête SQL de la route (PostgreSQL).
+
+    Le délai vaut pour la transaction en cours (`SET LOCAL`) : il disparaît
+    au commit ou au rollback, y compris derrière PgBouncer.
+    """
+    def decorateur(vue):
+        @wraps(vue)
+        def enveloppe(*args, **kwargs):
+            if db.session.get_bind().dialect.name == "postgresql":
+                db.session.execute(db.text(f"SET LOCAL statement_timeout = {int(ms)}"))
+            try:
+                return vue(*args, **kwargs)
+            except OperationalError as exc:
+                if not est_requete_annulee(exc):
+                    raise
+                db.session.rollback()
+                response = jsonify({"error": "Requête trop longue, réessayez plus tard"})
+                response.headers["Retry-After"] = "5"
+                return response, 503
+
+        return enveloppe
+
+    return decorateur
+
+
+def statistiques():
+    """Métriques de tous les pools instrumentés et état du pool principal."""
+    resultat = {nom: m.statistiques() for nom, m in METRIQUES.items()}
+    pool = db.engine.pool
+    if isinstance(pool, QueuePool) and "principal" in resultat:
+        resultat["principal"].update(
+            taille=pool.size(), utilisees=pool.checkedout(), debordement=pool.overflow()
+        )
+    return resultat
@@ -0,0 +1,98 @@
+"""Démarrage des workers : préchauffage et disponibilité (/ready).
+
+En production, l'application est construite une seule fois par le maître
+gunicorn (`preload_app`) puis héritée par fork ; le schéma est géré par
+Flask-Migrate (`flask db upgrade`, lancé avant les workers) et non par
+`db.create_all()` (cf. AUTO_CREATE_SCHEMA).
+
+Après le fork, chaque worker abandonne les connexions éventuellement héritées
+du maître, ouvre `DB_WARMUP_CONNECTIONS` connexions (base principale et
+réplica) et charge le référentiel en mémoire. /ready ne répond 200 qu'une fois
+ce préchauffage réussi ; sans gunicorn (dev, tests), la première sonde
+déclenche le préchauffage.
+"""
+import logging
+import threading
+import time
+from contextlib import ExitStack
+
+from flask import current_app, jsonify
+
+import taxonomie
+from models import db
+
+logger = logging.getLogger(__name__)
+
+
+class EtatDemarrage:
+    """Préchauffage du worker courant (fait au plus une fois avec succès)."""
+
+    def __init__(self):
+        self.pret = False
+        self.duree = None
+        self._verrou = threading.Lock()
+
+    def reinitialiser(self):
+        """Après un fork : tout est à refaire dans le nouveau processus."""
+        self.pret = False
+        self.duree = None
+        self._verrou = threading.Lock()
+
+
+def _moteurs(app):
+    moteurs = [db.engine]
+    replica = app.extensions.get("replica")
+    if replica is not None:
+        moteurs.append(replica.engine)
+    return moteurs
+
+
+def _ouvrir(engine, n):
+    """Ouvrir `n` connexions simultanées puis les rendre au pool."""
+    with ExitStack() as pile:
+        for _ in range(n):
+            connexion = pile.enter_context(engine.connect())
+            connexion.exec_driver_sql("SELECT 1")
+
+
+def apres_fork(app):
+    """Oublier les connexions héritées du maître (sans les fermer : elles
+    appartiennent encore au maître)."""
+    with app.app_context():
+        for engine in _moteurs(app):
+            engine.dispose(close=False)
+    app.extensions["demarrage"].reinitialiser()
+
+
+def prechauffer(app):
+    """Remplir les pools et charger le référentiel ; True si le worker est prêt."""
+    etat = app.extensions["demarrage"]
+    with etat._verrou:
+        if etat.pret:
+            return True
+        debut = time.perf_counter()
+        try:
+            with app.app_context():
+                for engine in _moteurs(app):
+                    n = min(app.config["DB_WARMUP_CONNECTIONS"], app.config["DB_POOL_SIZE"])
+                    _ouvrir(engine, n if engine.dialect.name == "postgresql" else 1)
+                taxonomie.instantane()
+                db.session.remove()
+        except Exception:
+            logger.exception("Préchauffage du worker impossible")
+            return False
+        etat.duree = time.perf_counter() - debut
+        etat.pret = True
+        logger.info("Worker prêt en %.3f s", etat.duree)
+        return True
+
+
+def init_app(app):
+    app.extensions["demarrage"] = EtatDemarrage()
+
+    @app.route("/ready")
+    def ready():
+        if not prechauffer(current_app._get_current_object()):
+            return jsonify({"status": "indisponible"}), 503
+        etat = current_app.extensions["demarrage"]
+        return jsonify({"status": "pret", "prechauffage_s": round(etat.duree, 3)}), 200
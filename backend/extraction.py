@@ -0,0 +1,231 @@
+"""Extraction du texte des fichiers (PDF, DOCX, PPTX) pour la recherche.
+
+Lecture en flux, mémoire bornée par fichier : les documents Office sont des
+archives ZIP dont le XML est parcouru avec `iterparse` (éléments libérés au
+fil de l'eau), les PDF page par page (pypdf, optionnel). L'extraction s'arrête
+à `EXTRACTION_MAX_CHARS` caractères (ou `EXTRACTION_MAX_PAGES` pages) ; le texte
+est stocké compressé (`DocumentTexte`) et indexé (`search.indexer_contenu`).
+
+Les anciens formats binaires (doc, ppt) et les images n'ont pas de texte
+extrait. Les nouveaux documents sont traités par le worker (tâche
+`extraire_texte`) ; le corpus existant par :
+
+    flask texte indexer [--processus N] [--tous]
+"""
+import logging
+import os
+import re
+import time
+import zipfile
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from xml.etree import ElementTree
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+
+import search
+import stockage
+from models import db, Document, DocumentTexte, maintenant_utc
+from taches import TacheAbandonnee, gestionnaire
+
+try:
+    from pypdf import PdfReader
+except ImportError:  # PDF non indexés tant que pypdf n'est pas installé
+    PdfReader = None
+
+logger = logging.getLogger(__name__)
+
+W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+A = "{http://schemas.openxmlformats.org/drawingml/2006/main}"
+FORMATS = ("pdf", "docx", "pptx")
+TAILLE_XML_MAX = 256 * 1024 * 1024  # garde-fou contre les archives piégées
+
+
+class ErreurExtraction(Exception):
+    """Fichier illisible (archive ou XML corrompu, PDF invalide)."""
+
+
+def _texte_xml(flux, balise_texte, balise_paragraphe):
+    """Texte d'un XML Office, paragraphe par paragraphe."""
+    for _, element in ElementTree.iterparse(flux, events=("end",)):
+        if element.tag == balise_texte:
+            if element.text:
+                yield element.text
+        elif element.tag == W + "tab":
+            yield "\t"
+        elif element.tag == balise_paragraphe:
+            yield "\n"
+            element.clear()
+
+
+def _membre(archive, nom):
+    if archive.getinfo(nom).file_size > TAILLE_XML_MAX:
+        raise ErreurExtraction(f"{nom} : taille décompressée excessive")
+    return archive.open(nom)
+
+
+def _texte_docx(chemin, _max_pages):
+    with zipfile.ZipFile(chemin) as archive, _membre(archive, "word/document.xml") as flux:
+        yield from _texte_xml(flux, W + "t", W + "p")
+
+
+def _texte_pptx(chemin, max_pages):
+    with zipfile.ZipFile(chemin) as archive:
+        diapositives = sorted(
+            (int(m.group(1)), nom)
+            for nom in archive.namelist()
+            if (m := re.fullmatch(r"ppt/slides/slide(\d+)\.xml", nom))
+        )
+        for _, nom in diapositives[:max_pages]:
+            with _membre(archive, nom) as flux:
+                yield from _texte_xml(flux, A + "t", A + "p")
+            yield "\n"
+
+
+def _texte_pdf(chemin, max_pages):
+    if PdfReader is None:
+        return
+    lecteur = PdfReader(chemin)
+    for i, page in enumerate(lecteur.pages):
+        if i >= max_pages:
+            break
+        yield page.extract_text() or ""
+        yield "\n"
+
+
+LECTEURS = {"docx": _texte_docx, "pptx": _texte_pptx, "pdf": _texte_pdf}
+
+
+def extraire_fichier(chemin, format, max_caracteres, max_pages):
+    """(texte, tronqué) du fichier, ou None si le format n'a pas de texte."""
+    lecteur = LECTEURS.get(format)
+    if lecteur is None or (format == "pdf" and PdfReader is None):
+        return None
+    morceaux, longueur, tronque = [], 0, False
+    flux = lecteur(chemin, max_pages)
+    try:
+        for morceau in flux:
+            if longueur + len(morceau) > max_caracteres:
+                morceaux.append(morceau[: max_caracteres - longueur])
+                tronque = True
+                break
+            morceaux.append(morceau)
+            longueur += len(morceau)
+    except (zipfile.BadZipFile, KeyError, ElementTree.ParseError) as exc:
+        raise ErreurExtraction(str(exc)) from exc
+    except Exception as exc:  # erreurs propres à pypdf
+        if format != "pdf":
+            raise
+        raise ErreurExtraction(str(exc)) from exc
+    finally:
+        flux.close()  # referme l'archive si l'extraction s'arrête avant la fin
+    texte = re.sub(r"[ \t]*\n\s*", "\n", "".join(morceaux)).strip()
+    return texte, tronque
+
+
+def limites(config):
+    return {
+        "max_caracteres": config["EXTRACTION_MAX_CHARS"],
+        "max_pages": config["EXTRACTION_MAX_PAGES"],
+    }
+
+
+def enregistrer_texte(document_id, texte, tronque):
+    """Stocker le texte compressé et l'indexer (sans commit)."""
+    db.session.merge(DocumentTexte(
+        document_id=document_id,
+        contenu=zlib.compress(texte.encode("utf-8"), 6),
+        longueur=len(texte),
+        tronque=tronque,
+        extrait_a=maintenant_utc(),
+    ))
+    db.session.flush()
+    search.indexer_contenu(document_id, texte)
+
+
+@gestionnaire("extraire_texte", max_tentatives=3)
+def extraire_texte(document_id):
+    """Extraire et indexer le texte du fichier d'un document."""
+    doc = db.session.get(Document, document_id)
+    if doc is None:
+        return
+    chemin = stockage.chemin_absolu(doc.fichier_stockage)
+    if not os.path.exists(chemin):
+        raise TacheAbandonnee(f"Fichier absent : {doc.fichier_stockage}")
+    try:
+        resultat = extraire_fichier(chemin, doc.format, **limites(current_app.config))
+    except ErreurExtraction as exc:
+        raise TacheAbandonnee(f"Extraction impossible : {exc}") from exc
+    if resultat is not None:
+        enregistrer_texte(document_id, *resultat)
+
+
+# ──────────────────────────────────────────────
+#  INDEXATION DU CORPUS EXISTANT
+# ──────────────────────────────────────────────
+texte_cli = AppGroup("texte", help="Texte extrait des fichiers (recherche).")
+
+
+def _extraire_pour_indexation(argument):
+    """Exécuté dans un processus du pool : pas d'accès à la base.
+
+    Toute erreur est renvoyée comme échec du document : une exception
+    propagée par `pool.map` interromprait l'indexation entière.
+    """
+    document_id, chemin, format, bornes = argument
+    try:
+        return document_id, extraire_fichier(chemin, format, **bornes), None
+    except (ErreurExtraction, OSError) as exc:
+        return document_id, None, str(exc)
+    except Exception as exc:
+        logger.exception("Extraction du document %s impossible", document_id)
+        return document_id, None, f"{type(exc).__name__} : {exc}"
+
+
+@texte_cli.command("indexer")
+@click.option("--processus", default=os.cpu_count() or 1, show_default=True,
+              help="Processus d'extraction en parallèle.")
+@click.option("--tous", is_flag=True, help="Réextraire aussi les documents déjà indexés.")
+@click.option("--lot", default=200, show_default=True, help="Documents par transaction.")
+def indexer_commande(processus, tous, lot):
+    """Extraire et indexer le texte des documents existants."""
+    requete = db.select(Document.id, Document.fichier_stockage, Document.format).where(
+        Document.format.in_(FORMATS)
+    )
+    if not tous:
+        requete = requete.where(
+            ~db.exists().where(DocumentTexte.document_id == Document.id)
+        )
+    bornes = limites(current_app.config)
+    pool = ProcessPoolExecutor(processus) if processus > 1 else None
+    executer = pool.map if pool else map
+    debut, dernier_id, traites, indexes, echecs = time.perf_counter(), 0, 0, 0, 0
+    try:
+        while True:
+            documents = db.session.execute(
+                requete.where(Document.id > dernier_id).order_by(Document.id).limit(lot)
+            ).all()
+            if not documents:
+                break
+            dernier_id = documents[-1].id
+            arguments = [
+                (d.id, stockage.chemin_absolu(d.fichier_stockage), d.format, bornes)
+                for d in documents
+            ]
+            for document_id, resultat, erreur in executer(_extraire_pour_indexation, arguments):
+                if erreur:
+                    echecs += 1
+                    click.echo(f"Document {document_id} : {erreur}", err=True)
+                elif resultat is not None:
+                    enregistrer_texte(document_id, *resultat)
+                    indexes += 1
+            db.session.commit()
+            traites += len(documents)
+            debit = traites / max(time.perf_counter() - debut, 1e-9)
+            click.echo(f"  {traites} documents traités ({debit:.1f} documents/s)")
+    finally:
+        if pool:
+            pool.shutdown()
+    click.echo(f"{indexes} document(s) indexé(s), {echecs} échec(s) sur {traites}")
@@ -0,0 +1,28 @@
+"""Configuration gunicorn (chargée automatiquement depuis le répertoire courant)."""
+import os
+
+# Workers à threads : une requête qui attend le pool de hachage des mots de
+# passe ne bloque pas les autres requêtes du même worker.
+worker_class = os.environ.get("GUNICORN_WORKER_CLASS", "gthread")
+threads = int(os.environ.get("GUNICORN_THREADS", "4"))
+
+# Application construite une fois par le maître puis partagée par fork : les
+# workers démarrent sans réimporter le code ni reconfigurer les extensions.
+preload_app = os.environ.get("GUNICORN_PRELOAD", "1") == "1"
+
+
+def post_fork(server, worker):
+    """Oublier les connexions du maître, puis préchauffer le worker (/ready)."""
+    import demarrage
+
+    app = worker.app.wsgi()
+    demarrage.apres_fork(app)
+    demarrage.prechauffer(app)
+
+
+def worker_exit(server, worker):
+    """Écrire les compteurs de téléchargement tamponnés avant l'arrêt du worker."""
+    app = worker.wsgi
+    compteur = getattr(app, "extensions", {}).get("compteur_telechargements")
+    if compteur is not None:
+        compteur.vider()
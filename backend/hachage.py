@@ -0,0 +1,78 @@
+"""Hachage des mots de passe dans un pool de processus borné.
+
+Le hachage scrypt coûte plusieurs dizaines de millisecondes de CPU : il est
+exécuté dans un `ProcessPoolExecutor` dédié (`PASSWORD_HASH_WORKERS`
+processus par worker gunicorn). Au plus `PASSWORD_HASH_MAX_PENDING` calculs
+sont admis en même temps ; au-delà, l'appelant attend au plus
+`PASSWORD_HASH_QUEUE_TIMEOUT` secondes puis reçoit `HachageSurcharge`
+(réponse 503) au lieu de s'empiler indéfiniment.
+
+`PASSWORD_HASH_WORKERS = 0` calcule dans le thread appelant (tests, dev).
+`PASSWORD_HASH_METHOD` suit la syntaxe de Werkzeug (`scrypt:n:r:p`,
+`pbkdf2:sha256:iterations`) ; un hash produit avec d'autres paramètres est
+recalculé à la connexion suivante.
+"""
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+
+class HachageSurcharge(Exception):
+    """Trop de hachages en cours : la requête doit être refusée (503)."""
+
+
+class PoolHachage:
+    """Extension Flask : pool de hachage des mots de passe."""
+
+    def __init__(self, app=None):
+        self._pid = None
+        self._executor = None
+        self._prefixe = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.methode = app.config["PASSWORD_HASH_METHOD"]
+        self._prefixe = None
+        self.nb_processus = app.config["PASSWORD_HASH_WORKERS"]
+        self.attente_max = app.config["PASSWORD_HASH_QUEUE_TIMEOUT"]
+        self._places = threading.BoundedSemaphore(app.config["PASSWORD_HASH_MAX_PENDING"])
+        self._verrou = threading.Lock()
+        app.extensions["pool_hachage"] = self
+
+    def _pool(self):
+        """Pool du processus courant (recréé après un fork)."""
+        with self._verrou:
+            if self._executor is None or self._pid != os.getpid():
+                self._executor = ProcessPoolExecutor(max_workers=self.nb_processus)
+                self._pid = os.getpid()
+            return self._executor
+
+    def _executer(self, fonction, *args):
+        if not self._places.acquire(timeout=self.attente_max):
+            raise HachageSurcharge()
+        try:
+            if self.nb_processus <= 0:
+                return fonction(*args)
+            return self._pool().submit(fonction, *args).result()
+        finally:
+            self._places.release()
+
+    def generer(self, mot_de_passe):
+        """Hacher un mot de passe avec les paramètres courants."""
+        return self._executer(generate_password_hash, mot_de_passe, self.methode)
+
+    def verifier(self, hash_stocke, mot_de_passe):
+        return self._executer(check_password_hash, hash_stocke, mot_de_passe)
+
+    def est_a_jour(self, hash_stocke):
+        """Le hash a-t-il été produit avec la méthode et les paramètres courants ?"""
+        if self._prefixe is None:
+            # Forme complète de la méthode ("scrypt" -> "scrypt:32768:8:1")
+            self._prefixe = generate_password_hash("", self.methode).split("$", 1)[0]
+        return hash_stocke.split("$", 1)[0] == self._prefixe
+
+
+pool_hachage = PoolHachage()
@@ -0,0 +1,351 @@
+"""Import en masse du catalogue depuis des fichiers CSV ou JSONL.
+
+    flask importer universites universites.csv
+    flask importer filieres filieres.jsonl
+    flask importer matieres matieres.csv
+    flask importer utilisateurs utilisateurs.csv
+    flask importer documents documents.jsonl
+
+(dans cet ordre : chaque entité référence les précédentes). Les clés
+étrangères sont données par clés naturelles — sigle de l'université, nom de
+la filière, nom et niveau de la matière, e-mail de l'auteur — et résolues en
+SQL par jointure.
+
+Le fichier est lu en flux, par lots : chaque lot est chargé dans une table
+temporaire (COPY sous PostgreSQL, executemany ailleurs), puis inséré dans la
+table cible par un seul INSERT … SELECT qui ignore les lignes déjà présentes
+(même clé naturelle) ou dont une référence est introuvable. Le point de
+reprise (`import_reprise`) est validé dans la même transaction que le lot : un
+import interrompu reprend au lot suivant le dernier lot validé.
+
+Les utilisateurs importés sans `mot_de_passe` (hash werkzeug) ne peuvent pas
+se connecter tant qu'un mot de passe ne leur a pas été attribué.
+"""
+import csv
+import datetime
+import io
+import json
+import os
+import time
+from itertools import islice
+
+import click
+from flask.cli import AppGroup
+from sqlalchemy import Column, DateTime, Integer, MetaData, Table, Text, and_, cast, exists
+from sqlalchemy.orm import aliased
+
+from models import (
+    db, Document, Filiere, ImportReprise, Matiere, Universite, Utilisateur,
+)
+from routes import TYPES_DOCUMENT
+
+TAILLE_LOT = 5000
+MOT_DE_PASSE_INUTILISABLE = "!"  # jamais égal à un hash werkzeug
+
+_transit = MetaData()
+
+
+def _table_transit(nom, colonnes):
+    return Table(
+        f"import_{nom}", _transit, *(Column(c, Text) for c in colonnes),
+        prefixes=["TEMPORARY"],
+    )
+
+
+# ──────────────────────────────────────────────
+#  INSERT … SELECT PAR ENTITÉ
+# ──────────────────────────────────────────────
+def _inserer_universites(t):
+    requete = db.select(t.c.nom, t.c.sigle, t.c.ville).where(
+        ~exists().where(Universite.sigle == t.c.sigle)
+    )
+    return db.insert(Universite).from_select(["nom", "sigle", "ville"], requete)
+
+
+def _inserer_filieres(t):
+    requete = (
+        db.select(t.c.nom, Universite.id)
+        .join_from(t, Universite, Universite.sigle == t.c.universite)
+        .where(~exists().where(
+            Filiere.universite_id == Universite.id, Filiere.nom == t.c.nom
+        ))
+    )
+    return db.insert(Filiere).from_select(["nom", "universite_id"], requete)
+
+
+def _joindre_matiere(requete, t):
+    """Résoudre (universite, filiere, matiere, niveau) → Matiere."""
+    return (
+        requete.join(Universite, Universite.sigle == t.c.universite)
+        .join(Filiere, and_(Filiere.universite_id == Universite.id, Filiere.nom == t.c.filiere))
+    )
+
+
+def _inserer_matieres(t):
+    requete = _joindre_matiere(db.select(t.c.nom, Filiere.id, t.c.niveau).select_from(t), t)
+    requete = requete.where(~exists().where(
+        Matiere.filiere_id == Filiere.id, Matiere.nom == t.c.nom, Matiere.niveau == t.c.niveau
+    ))
+    return db.insert(Matiere).from_select(["nom", "filiere_id", "niveau"], requete)
+
+
+def _inserer_utilisateurs(t):
+    universite, filiere = aliased(Universite), aliased(Filiere)
+    requete = (
+        db.select(
+            t.c.nom, t.c.prenom, t.c.email,
+            db.func.coalesce(t.c.mot_de_passe, MOT_DE_PASSE_INUTILISABLE),
+            db.func.coalesce(t.c.role, "etudiant"),
+            universite.id, filiere.id, t.c.niveau,
+        )
+        .select_from(t)
+        .outerjoin(universite, universite.sigle == t.c.universite)
+        .outerjoin(filiere, and_(
+            filiere.universite_id == universite.id, filiere.nom == t.c.filiere
+        ))
+        .where(~exists().where(Utilisateur.email == t.c.email))
+    )
+    return db.insert(Utilisateur).from_select(
+        ["nom", "prenom", "email", "mot_de_passe", "role",
+         "universite_id", "filiere_id", "niveau"],
+        requete,
+    )
+
+
+def _inserer_documents(t):
+    created_at = t.c.created_at
+    if db.session.get_bind().dialect.name == "postgresql":
+        created_at = cast(created_at, DateTime)
+    requete = db.select(
+        t.c.titre,
+        db.func.coalesce(t.c.description, ""),
+        t.c.type,
+        t.c.fichier_nom,
+        db.func.coalesce(t.c.fichier_stockage, t.c.fichier_nom),
+        cast(db.func.coalesce(t.c.taille, "0"), Integer),
+        db.func.coalesce(t.c.format, "pdf"),
+        t.c.annee_academique,
+        Matiere.id,
+        Utilisateur.id,
+        db.literal(0),
+        db.func.coalesce(t.c.statut, "approuve"),
+        db.func.coalesce(created_at, db.func.now()),
+    ).select_from(t)
+    requete = (
+        _joindre_matiere(requete, t)
+        .join(Matiere, and_(
+            Matiere.filiere_id == Filiere.id,
+            Matiere.nom == t.c.matiere,
+            Matiere.niveau == t.c.niveau,
+        ))
+        .join(Utilisateur, Utilisateur.email == t.c.auteur)
+    )
+    return db.insert(Document).from_select(
+        ["titre", "description", "type", "fichier_nom", "fichier_stockage", "taille",
+         "format", "annee_academique", "matiere_id", "auteur_id", "nb_telechargements",
+         "statut", "created_at"],
+        requete,
+    )
+
+
+class Entite:
+    """Description d'une entité importable."""
+
+    def __init__(self, nom, colonnes, obligatoires, inserer, cle=None):
+        self.nom = nom
+        self.colonnes = colonnes
+        self.obligatoires = obligatoires
+        self.inserer = inserer
+        self.cle = cle  # clé naturelle (dédoublonnage dans un lot)
+        self.transit = _table_transit(nom, colonnes)
+
+
+ENTITES = {
+    e.nom: e
+    for e in (
+        Entite(
+            "universites", ("nom", "sigle", "ville"), ("nom", "sigle", "ville"),
+            _inserer_universites, cle=("sigle",),
+        ),
+        Entite(
+            "filieres", ("universite", "nom"), ("universite", "nom"),
+            _inserer_filieres, cle=("universite", "nom"),
+        ),
+        Entite(
+            "matieres", ("universite", "filiere", "nom", "niveau"),
+            ("universite", "filiere", "nom", "niveau"),
+            _inserer_matieres, cle=("universite", "filiere", "nom", "niveau"),
+        ),
+        Entite(
+            "utilisateurs",
+            ("nom", "prenom", "email", "mot_de_passe", "role",
+             "universite", "filiere", "niveau"),
+            ("nom", "prenom", "email"),
+            _inserer_utilisateurs, cle=("email",),
+        ),
+        Entite(
+            "documents",
+            ("titre", "description", "type", "fichier_nom", "fichier_stockage", "taille",
+             "format", "annee_academique", "universite", "filiere", "matiere", "niveau",
+             "auteur", "statut", "created_at"),
+            ("titre", "type", "fichier_nom", "universite", "filiere", "matiere",
+             "niveau", "auteur"),
+            _inserer_documents,
+        ),
+    )
+}
+
+
+# ──────────────────────────────────────────────
+#  LECTURE ET VALIDATION
+# ──────────────────────────────────────────────
+def lire_source(chemin):
+    """Enregistrements du fichier (dict), CSV avec en-tête ou JSON lines."""
+    if chemin.endswith((".jsonl", ".ndjson")):
+        with open(chemin, encoding="utf-8") as f:
+            for ligne in f:
+                if ligne.strip():
+                    yield json.loads(ligne)
+    else:
+        with open(chemin, newline="", encoding="utf-8-sig") as f:
+            yield from csv.DictReader(f)
+
+
+def _normaliser(entite, enregistrement):
+    """Valeurs texte nettoyées, ou None si l'enregistrement est invalide."""
+    ligne = {}
+    for colonne in entite.colonnes:
+        valeur = enregistrement.get(colonne)
+        valeur = str(valeur).strip() if valeur is not None else ""
+        ligne[colonne] = valeur or None
+    if any(ligne[c] is None for c in entite.obligatoires):
+        return None
+    try:
+        if "taille" in ligne and ligne["taille"] is not None:
+            ligne["taille"] = str(int(ligne["taille"]))
+        if "created_at" in ligne and ligne["created_at"] is not None:
+            date = datetime.datetime.fromisoformat(ligne["created_at"])
+            if date.tzinfo is not None:
+                date = date.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+            ligne["created_at"] = date.isoformat(sep=" ")
+    except ValueError:
+        return None
+    if entite.nom == "documents" and ligne["type"] not in TYPES_DOCUMENT:
+        return None
+    return ligne
+
+
+def _preparer_lot(entite, enregistrements):
+    valides = {}
+    for i, enregistrement in enumerate(enregistrements):
+        ligne = _normaliser(entite, enregistrement)
+        if ligne is None:
+            continue
+        cle = tuple(ligne[c] for c in entite.cle) if entite.cle else i
+        valides.setdefault(cle, ligne)  # première occurrence retenue
+    return list(valides.values())
+
+
+# ──────────────────────────────────────────────
+#  CHARGEMENT
+# ──────────────────────────────────────────────
+def _charger_transit(connexion, table, lignes):
+    """Remplir la table temporaire : COPY sous PostgreSQL, executemany sinon."""
+    if connexion.dialect.name != "postgresql":
+        connexion.execute(table.insert(), lignes)
+        return
+    tampon = io.StringIO()
+    ecrivain = csv.writer(tampon)
+    colonnes = [c.name for c in table.columns]
+    for ligne in lignes:
+        ecrivain.writerow(["" if ligne[c] is None else ligne[c] for c in colonnes])
+    tampon.seek(0)
+    with connexion.connection.dbapi_connection.cursor() as curseur:
+        curseur.copy_expert(
+            f"COPY {table.name} ({', '.join(colonnes)}) FROM STDIN WITH (FORMAT csv)",
+            tampon,
+        )
+
+
+def importer_lot(entite, lignes):
+    """Insérer un lot de lignes valides ; renvoie le nombre de lignes insérées.
+    Ne commite pas."""
+    connexion = db.session.connection()
+    entite.transit.create(connexion, checkfirst=True)
+    connexion.execute(entite.transit.delete())
+    if not lignes:
+        return 0
+    _charger_transit(connexion, entite.transit, lignes)
+    return db.session.execute(entite.inserer(entite.transit)).rowcount
+
+
+def cle_reprise(entite, chemin):
+    return f"{entite.nom}:{os.path.basename(chemin)}:{os.path.getsize(chemin)}"
+
+
+def importer(entite, chemin, taille_lot=TAILLE_LOT, depuis_zero=False, rapport=None):
+    """Importer `chemin` par lots, en reprenant après le dernier lot validé.
+
+    Renvoie le point de reprise final (lignes lues, lignes insérées).
+    """
+    cle = cle_reprise(entite, chemin)
+    reprise = db.session.get(ImportReprise, cle)
+    if reprise is None or depuis_zero:
+        reprise = db.session.merge(ImportReprise(cle=cle, lignes=0, inserees=0, termine=False))
+    elif reprise.termine:
+        return reprise
+
+    source = islice(lire_source(chemin), reprise.lignes, None)
+    debut = time.perf_counter()
+    lues = 0
+    while True:
+        lot = list(islice(source, taille_lot))
+        if not lot:
+            break
+        inserees = importer_lot(entite, _preparer_lot(entite, lot))
+        reprise.lignes += len(lot)
+        reprise.inserees += inserees
+        db.session.commit()
+        lues += len(lot)
+        if rapport is not None:
+            rapport(reprise, lues / max(time.perf_counter() - debut, 1e-9))
+    reprise.termine = True
+    db.session.commit()
+    return reprise
+
+
+# ──────────────────────────────────────────────
+#  COMMANDES
+# ──────────────────────────────────────────────
+importer_cli = AppGroup("importer", help="Import en masse du catalogue (CSV / JSONL).")
+
+
+def _commande(entite):
+    @click.argument("chemin", type=click.Path(exists=True, dir_okay=False))
+    @click.option("--lot", "taille_lot", default=TAILLE_LOT, show_default=True,
+                  help="Enregistrements par transaction.")
+    @click.option("--depuis-zero", is_flag=True,
+                  help="Ignorer le point de reprise et relire tout le fichier.")
+    def commande(chemin, taille_lot, depuis_zero):
+        def rapport(reprise, debit):
+            click.echo(
+                f"  {reprise.lignes} lues, {reprise.inserees} insérées "
+                f"({debit:.0f} lignes/s)"
+            )
+
+        debut = time.perf_counter()
+        reprise = importer(entite, chemin, taille_lot, depuis_zero, rapport)
+        duree = time.perf_counter() - debut
+        click.echo(
+            f"{entite.nom} : {reprise.lignes} enregistrement(s) lu(s), "
+            f"{reprise.inserees} inséré(s), "
+            f"{reprise.lignes - reprise.inserees} ignoré(s) (doublons, invalides "
+            f"ou références introuvables) en {duree:.1f} s"
+        )
+
+    commande.__doc__ = f"Importer des {entite.nom} depuis un fichier CSV ou JSONL."
+    importer_cli.command(entite.nom)(commande)
+
+
+for _entite in ENTITES.values():
+    _commande(_entite)
@@ -0,0 +1,111 @@
+"""Schéma initial (tables créées jusqu'ici par db.create_all)
+
+Revision ID: 0001_schema_initial
+Revises:
+Create Date: 2026-10-18 09:00:00
+
+Les bases existantes créées par `db.create_all()` doivent être marquées
+avec `flask db stamp 0001_schema_initial` avant le premier `flask db upgrade`.
+Ne pas les marquer `head` : les révisions suivantes (colonnes de votes et
+leur rattrapage, recherche, `fichier`…) seraient sautées. Une base dont le
+schéma correspond déjà à une révision plus récente se marque avec celle-ci.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0001_schema_initial'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'universite',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('nom', sa.String(length=250), nullable=False),
+        sa.Column('sigle', sa.String(length=20), nullable=False),
+        sa.Column('ville', sa.String(length=100), nullable=False),
+        sa.Column('created_at', sa.DateTime(), server_default=sa.func.now(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('sigle'),
+    )
+    op.create_table(
+        'filiere',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('nom', sa.String(length=200), nullable=False),
+        sa.Column('universite_id', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), server_default=sa.func.now(), nullable=True),
+        sa.ForeignKeyConstraint(['universite_id'], ['universite.id']),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_table(
+        'matiere',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('nom', sa.String(length=200), nullable=False),
+        sa.Column('filiere_id', sa.Integer(), nullable=False),
+        sa.Column('niveau', sa.String(length=10), nullable=False),
+        sa.Column('created_at', sa.DateTime(), server_default=sa.func.now(), nullable=True),
+        sa.ForeignKeyConstraint(['filiere_id'], ['filiere.id']),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_table(
+        'utilisateur',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('nom', sa.String(length=100), nullable=False),
+        sa.Column('prenom', sa.String(length=100), nullable=False),
+        sa.Column('email', sa.String(length=150), nullable=False),
+        sa.Column('mot_de_passe', sa.String(length=255), nullable=False),
+        sa.Column('role', sa.String(length=20), nullable=True),
+        sa.Column('universite_id', sa.Integer(), nullable=True),
+        sa.Column('filiere_id', sa.Integer(), nullable=True),
+        sa.Column('niveau', sa.String(length=10), nullable=True),
+        sa.Column('created_at', sa.DateTime(), server_default=sa.func.now(), nullable=True),
+        sa.ForeignKeyConstraint(['filiere_id'], ['filiere.id']),
+        sa.ForeignKeyConstraint(['universite_id'], ['universite.id']),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('email'),
+    )
+    op.create_table(
+        'document',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('titre', sa.String(length=300), nullable=False),
+        sa.Column('description', sa.Text(), nullable=True),
+        sa.Column('type', sa.String(length=20), nullable=False),
+        sa.Column('fichier_nom', sa.String(length=300), nullable=False),
+        sa.Column('fichier_stockage', sa.String(length=300), nullable=False),
+        sa.Column('taille', sa.Integer(), nullable=True),
+        sa.Column('format', sa.String(length=10), nullable=True),
+        sa.Column('annee_academique', sa.String(length=20), nullable=True),
+        sa.Column('matiere_id', sa.Integer(), nullable=False),
+        sa.Column('auteur_id', sa.Integer(), nullable=False),
+        sa.Column('nb_telechargements', sa.Integer(), nullable=True),
+        sa.Column('statut', sa.String(length=20), nullable=True),
+        sa.Column('created_at', sa.DateTime(), server_default=sa.func.now(), nullable=True),
+        sa.ForeignKeyConstraint(['auteur_id'], ['utilisateur.id']),
+        sa.ForeignKeyConstraint(['matiere_id'], ['matiere.id']),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_table(
+        'vote',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('document_id', sa.Integer(), nullable=False),
+        sa.Column('utilisateur_id', sa.Integer(), nullable=False),
+        sa.Column('note', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), server_default=sa.func.now(), nullable=True),
+        sa.ForeignKeyConstraint(['document_id'], ['document.id']),
+        sa.ForeignKeyConstraint(['utilisateur_id'], ['utilisateur.id']),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('document_id', 'utilisateur_id', name='uq_vote'),
+    )
+
+
+def downgrade():
+    op.drop_table('vote')
+    op.drop_table('document')
+    op.drop_table('utilisateur')
+    op.drop_table('matiere')
+    op.drop_table('filiere')
+    op.drop_table('universite')
@@ -0,0 +1,41 @@
+"""Agrégats de votes dénormalisés sur document (vote_count, vote_sum)
+
+Revision ID: 0002_agregats_votes
+Revises: 0001_schema_initial
+Create Date: 2026-10-18 09:30:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0002_agregats_votes'
+down_revision = '0001_schema_initial'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('document') as batch_op:
+        batch_op.add_column(
+            sa.Column('vote_count', sa.Integer(), server_default='0', nullable=False)
+        )
+        batch_op.add_column(
+            sa.Column('vote_sum', sa.Integer(), server_default='0', nullable=False)
+        )
+
+    # Backfill à partir des votes existants
+    op.execute(
+        """
+        UPDATE document SET
+            vote_count = (SELECT COUNT(*) FROM vote WHERE vote.document_id = document.id),
+            vote_sum = (SELECT COALESCE(SUM(vote.note), 0) FROM vote WHERE vote.document_id = document.id)
+        """
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('document') as batch_op:
+        batch_op.drop_column('vote_sum')
+        batch_op.drop_column('vote_count')
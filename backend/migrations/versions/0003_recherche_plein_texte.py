@@ -0,0 +1,128 @@
+"""Recherche plein texte : tsvector + GIN (PostgreSQL), FTS5 (SQLite)
+
+Revision ID: 0003_recherche_plein_texte
+Revises: 0002_agregats_votes
+Create Date: 2026-10-18 10:00:00
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '0003_recherche_plein_texte'
+down_revision = '0002_agregats_votes'
+branch_labels = None
+depends_on = None
+
+# Copie figée du DDL de search.py au moment de cette révision
+PG_DDL = [
+    "CREATE EXTENSION IF NOT EXISTS unaccent",
+    """
+    DO $$
+    BEGIN
+        IF NOT EXISTS (SELECT 1 FROM pg_ts_config WHERE cfgname = 'french_unaccent') THEN
+            CREATE TEXT SEARCH CONFIGURATION french_unaccent (COPY = french);
+            ALTER TEXT SEARCH CONFIGURATION french_unaccent
+                ALTER MAPPING FOR hword, hword_part, word WITH unaccent, french_stem;
+        END IF;
+    END
+    $$
+    """,
+    "ALTER TABLE document ADD COLUMN IF NOT EXISTS search_vector tsvector",
+    "CREATE INDEX IF NOT EXISTS ix_document_search_vector ON document USING gin (search_vector)",
+    """
+    CREATE OR REPLACE FUNCTION document_search_vector_maj() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector :=
+            setweight(to_tsvector('french_unaccent', coalesce(NEW.titre, '')), 'A') ||
+            setweight(to_tsvector('french_unaccent', coalesce(
+                (SELECT nom FROM matiere WHERE id = NEW.matiere_id), '')), 'B') ||
+            setweight(to_tsvector('french_unaccent', coalesce(NEW.description, '')), 'C');
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE OR REPLACE TRIGGER document_search_vector_trg
+        BEFORE INSERT OR UPDATE OF titre, description, matiere_id ON document
+        FOR EACH ROW EXECUTE FUNCTION document_search_vector_maj()
+    """,
+    """
+    CREATE OR REPLACE FUNCTION matiere_search_vector_maj() RETURNS trigger AS $$
+    BEGIN
+        -- Recalcul via le trigger document (UPDATE OF titre)
+        UPDATE document SET titre = titre WHERE matiere_id = NEW.id;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE OR REPLACE TRIGGER matiere_search_vector_trg
+        AFTER UPDATE OF nom ON matiere
+        FOR EACH ROW WHEN (OLD.nom IS DISTINCT FROM NEW.nom)
+        EXECUTE FUNCTION matiere_search_vector_maj()
+    """,
+    "UPDATE document SET titre = titre WHERE search_vector IS NULL",
+]
+
+_SQLITE_INSERT_FTS = """
+        INSERT INTO document_fts (rowid, titre, matiere, description)
+        VALUES (
+            new.id, new.titre,
+            coalesce((SELECT nom FROM matiere WHERE id = new.matiere_id), ''),
+            coalesce(new.description, '')
+        );
+"""
+
+SQLITE_DDL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS document_fts
+    USING fts5(titre, matiere, description, tokenize = 'unicode61 remove_diacritics 2')
+    """,
+    "CREATE TRIGGER IF NOT EXISTS document_fts_ai AFTER INSERT ON document BEGIN"
+    + _SQLITE_INSERT_FTS
+    + "END",
+    "CREATE TRIGGER IF NOT EXISTS document_fts_au "
+    "AFTER UPDATE OF titre, description, matiere_id ON document BEGIN "
+    "DELETE FROM document_fts WHERE rowid = old.id;"
+    + _SQLITE_INSERT_FTS
+    + "END",
+    """
+    CREATE TRIGGER IF NOT EXISTS document_fts_ad AFTER DELETE ON document BEGIN
+        DELETE FROM document_fts WHERE rowid = old.id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS matiere_fts_au AFTER UPDATE OF nom ON matiere BEGIN
+        UPDATE document_fts SET matiere = new.nom
+        WHERE rowid IN (SELECT id FROM document WHERE matiere_id = new.id);
+    END
+    """,
+    """
+    INSERT INTO document_fts (rowid, titre, matiere, description)
+    SELECT d.id, d.titre, m.nom, coalesce(d.description, '')
+    FROM document d JOIN matiere m ON m.id = d.matiere_id
+    WHERE d.id NOT IN (SELECT rowid FROM document_fts)
+    """,
+]
+
+
+def upgrade():
+    ddl = PG_DDL if op.get_bind().dialect.name == 'postgresql' else SQLITE_DDL
+    for sql in ddl:
+        op.execute(sql)
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute('DROP TRIGGER IF EXISTS matiere_search_vector_trg ON matiere')
+        op.execute('DROP TRIGGER IF EXISTS document_search_vector_trg ON document')
+        op.execute('DROP FUNCTION IF EXISTS matiere_search_vector_maj()')
+        op.execute('DROP FUNCTION IF EXISTS document_search_vector_maj()')
+        op.execute('DROP INDEX IF EXISTS ix_document_search_vector')
+        op.execute('ALTER TABLE document DROP COLUMN IF EXISTS search_vector')
+        op.execute('DROP TEXT SEARCH CONFIGURATION IF EXISTS french_unaccent')
+    else:
+        for trigger in ('matiere_fts_au', 'document_fts_ad', 'document_fts_au', 'document_fts_ai'):
+            op.execute(f'DROP TRIGGER IF EXISTS {trigger}')
+        op.execute('DROP TABLE IF EXISTS document_fts')
@@ -0,0 +1,47 @@
+"""Sessions d'upload par morceaux
+
+Revision ID: 0004_session_upload
+Revises: 0003_recherche_plein_texte
+Create Date: 2026-10-18 11:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0004_session_upload'
+down_revision = '0003_recherche_plein_texte'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'session_upload',
+        sa.Column('id', sa.String(length=32), nullable=False),
+        sa.Column('utilisateur_id', sa.Integer(), nullable=False),
+        sa.Column('fichier_nom', sa.String(length=300), nullable=False),
+        sa.Column('format', sa.String(length=10), nullable=False),
+        sa.Column('taille_totale', sa.BigInteger(), nullable=False),
+        sa.Column('recu', sa.BigInteger(), nullable=False),
+        sa.Column('sha256_attendu', sa.String(length=64), nullable=True),
+        sa.Column('titre', sa.String(length=300), nullable=False),
+        sa.Column('description', sa.Text(), nullable=True),
+        sa.Column('type', sa.String(length=20), nullable=False),
+        sa.Column('annee_academique', sa.String(length=20), nullable=True),
+        sa.Column('matiere_id', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['matiere_id'], ['matiere.id']),
+        sa.ForeignKeyConstraint(['utilisateur_id'], ['utilisateur.id']),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index(
+        'ix_session_upload_updated_at', 'session_upload', ['updated_at'], unique=False
+    )
+
+
+def downgrade():
+    op.drop_index('ix_session_upload_updated_at', table_name='session_upload')
+    op.drop_table('session_upload')
@@ -0,0 +1,47 @@
+"""Stockage des fichiers par contenu : table fichier, document.fichier_sha256
+
+Revision ID: 0005_stockage_par_contenu
+Revises: 0004_session_upload
+Create Date: 2026-10-18 11:30:00
+
+Les fichiers existants (nommés par uuid) restent servis tels quels ; la
+commande `flask stockage migrer` les déplace vers le stockage par contenu.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0005_stockage_par_contenu'
+down_revision = '0004_session_upload'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'fichier',
+        sa.Column('sha256', sa.String(length=64), nullable=False),
+        sa.Column('taille', sa.BigInteger(), nullable=False),
+        sa.Column('nb_references', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), server_default=sa.func.now(), nullable=True),
+        sa.PrimaryKeyConstraint('sha256'),
+    )
+    # ADD COLUMN simple (pas de batch) : sous SQLite, recréer la table
+    # supprimerait les triggers de recherche plein texte.
+    op.add_column('document', sa.Column('fichier_sha256', sa.String(length=64), nullable=True))
+    op.create_index('ix_document_fichier_sha256', 'document', ['fichier_sha256'], unique=False)
+    if op.get_bind().dialect.name != 'sqlite':
+        op.create_foreign_key(
+            'fk_document_fichier_sha256', 'document', 'fichier', ['fichier_sha256'], ['sha256']
+        )
+
+
+def downgrade():
+    # Comme à l'upgrade : pas de clé étrangère sous SQLite, et DROP COLUMN
+    # simple (un batch recréerait `document` sans ses triggers de recherche)
+    if op.get_bind().dialect.name != 'sqlite':
+        op.drop_constraint('fk_document_fichier_sha256', 'document', type_='foreignkey')
+    op.drop_index('ix_document_fichier_sha256', table_name='document')
+    op.drop_column('document', 'fichier_sha256')
+    op.drop_table('fichier')
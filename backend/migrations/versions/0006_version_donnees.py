@@ -0,0 +1,30 @@
+"""Versions des tables pour les validateurs HTTP (ETag / Last-Modified)
+
+Revision ID: 0006_version_donnees
+Revises: 0005_stockage_par_contenu
+Create Date: 2026-10-18 12:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0006_version_donnees'
+down_revision = '0005_stockage_par_contenu'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'version_donnees',
+        sa.Column('nom_table', sa.String(length=50), nullable=False),
+        sa.Column('version', sa.BigInteger(), nullable=False),
+        sa.Column('modifie_a', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('nom_table'),
+    )
+
+
+def downgrade():
+    op.drop_table('version_donnees')
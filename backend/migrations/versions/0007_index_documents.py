@@ -0,0 +1,53 @@
+"""Index des chemins de filtrage des documents et des clés étrangères
+
+Revision ID: 0007_index_documents
+Revises: 0006_version_donnees
+Create Date: 2026-10-18 13:00:00
+
+Sous PostgreSQL, les index sont créés avec CREATE INDEX CONCURRENTLY (hors
+transaction) pour ne pas bloquer les écritures sur des tables déjà remplies.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0007_index_documents'
+down_revision = '0006_version_donnees'
+branch_labels = None
+depends_on = None
+
+APPROUVE = sa.text("statut = 'approuve'")
+
+INDEX = [
+    ('ix_document_approuve_recents', 'document', ['created_at', 'id'], APPROUVE),
+    ('ix_document_approuve_matiere', 'document', ['matiere_id', 'created_at', 'id'], APPROUVE),
+    ('ix_document_approuve_type', 'document', ['type', 'created_at', 'id'], APPROUVE),
+    ('ix_document_auteur_id', 'document', ['auteur_id'], None),
+    ('ix_vote_utilisateur_id', 'vote', ['utilisateur_id'], None),
+    ('ix_matiere_filiere_niveau', 'matiere', ['filiere_id', 'niveau'], None),
+    ('ix_filiere_universite_id', 'filiere', ['universite_id'], None),
+]
+
+
+def upgrade():
+    postgres = op.get_bind().dialect.name == 'postgresql'
+    with op.get_context().autocommit_block():
+        for nom, table, colonnes, condition in INDEX:
+            op.create_index(
+                nom, table, colonnes, unique=False,
+                postgresql_where=condition, sqlite_where=condition,
+                postgresql_concurrently=postgres,
+                if_not_exists=True,
+            )
+    if postgres:
+        op.execute('ANALYZE document')
+
+
+def downgrade():
+    postgres = op.get_bind().dialect.name == 'postgresql'
+    with op.get_context().autocommit_block():
+        for nom, table, _, _ in reversed(INDEX):
+            op.drop_index(
+                nom, table_name=table, postgresql_concurrently=postgres, if_exists=True
+            )
@@ -0,0 +1,32 @@
+"""Points de reprise des imports en masse
+
+Revision ID: 0008_import_reprise
+Revises: 0007_index_documents
+Create Date: 2026-10-18 15:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0008_import_reprise'
+down_revision = '0007_index_documents'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'import_reprise',
+        sa.Column('cle', sa.String(length=300), nullable=False),
+        sa.Column('lignes', sa.BigInteger(), nullable=False),
+        sa.Column('inserees', sa.BigInteger(), nullable=False),
+        sa.Column('termine', sa.Boolean(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('cle'),
+    )
+
+
+def downgrade():
+    op.drop_table('import_reprise')
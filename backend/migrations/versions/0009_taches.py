@@ -0,0 +1,56 @@
+"""File de tâches en arrière-plan et statut de traitement des documents
+
+Revision ID: 0009_taches
+Revises: 0008_import_reprise
+Create Date: 2026-10-18 16:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0009_taches'
+down_revision = '0008_import_reprise'
+branch_labels = None
+depends_on = None
+
+A_FAIRE = sa.text("etat IN ('en_attente', 'en_cours')")
+
+
+def upgrade():
+    op.create_table(
+        'tache',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('type', sa.String(length=50), nullable=False),
+        sa.Column('charge', sa.JSON(), nullable=False),
+        sa.Column('document_id', sa.Integer(), nullable=True),
+        sa.Column('etat', sa.String(length=20), nullable=False),
+        sa.Column('tentatives', sa.Integer(), nullable=False),
+        sa.Column('max_tentatives', sa.Integer(), nullable=False),
+        sa.Column('disponible_a', sa.DateTime(), nullable=False),
+        sa.Column('jeton', sa.String(length=64), nullable=True),
+        sa.Column('erreur', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_tache_document_id', 'tache', ['document_id'], unique=False)
+    op.create_index(
+        'ix_tache_a_faire', 'tache', ['type', 'disponible_a'], unique=False,
+        postgresql_where=A_FAIRE, sqlite_where=A_FAIRE,
+    )
+    # ADD COLUMN simple (pas de batch_alter_table : il recréerait `document`
+    # et ses déclencheurs de recherche sous SQLite)
+    op.add_column(
+        'document',
+        sa.Column('statut_traitement', sa.String(length=20), nullable=False,
+                  server_default='termine'),
+    )
+
+
+def downgrade():
+    op.drop_column('document', 'statut_traitement')
+    op.drop_index('ix_tache_a_faire', table_name='tache')
+    op.drop_index('ix_tache_document_id', table_name='tache')
+    op.drop_table('tache')
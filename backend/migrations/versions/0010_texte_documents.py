@@ -0,0 +1,59 @@
+"""Texte extrait des fichiers et son index de recherche
+
+Revision ID: 0010_texte_documents
+Revises: 0009_taches
+Create Date: 2026-10-18 18:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0010_texte_documents'
+down_revision = '0009_taches'
+branch_labels = None
+depends_on = None
+
+# Copie figée du DDL de search.py à cette révision
+PG_DDL = [
+    "ALTER TABLE document_texte ADD COLUMN IF NOT EXISTS search_vector tsvector",
+    "CREATE INDEX IF NOT EXISTS ix_document_texte_search_vector "
+    "ON document_texte USING gin (search_vector)",
+]
+
+SQLITE_DDL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS document_texte_fts
+    USING fts5(contenu, tokenize = 'unicode61 remove_diacritics 2')
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS document_texte_ad AFTER DELETE ON document BEGIN
+        DELETE FROM document_texte WHERE document_id = old.id;
+        DELETE FROM document_texte_fts WHERE rowid = old.id;
+    END
+    """,
+]
+
+
+def upgrade():
+    op.create_table(
+        'document_texte',
+        sa.Column('document_id', sa.Integer(), nullable=False),
+        sa.Column('contenu', sa.LargeBinary(), nullable=False),
+        sa.Column('longueur', sa.Integer(), nullable=False),
+        sa.Column('tronque', sa.Boolean(), nullable=False),
+        sa.Column('extrait_a', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['document_id'], ['document.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('document_id'),
+    )
+    ddl = PG_DDL if op.get_bind().dialect.name == 'postgresql' else SQLITE_DDL
+    for sql in ddl:
+        op.execute(sql)
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        op.execute('DROP TRIGGER IF EXISTS document_texte_ad')
+        op.execute('DROP TABLE IF EXISTS document_texte_fts')
+    op.drop_table('document_texte')
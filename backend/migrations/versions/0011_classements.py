@@ -0,0 +1,64 @@
+"""Journal d'activité et classements précalculés (tendances, mieux notés)
+
+Revision ID: 0011_classements
+Revises: 0010_texte_documents
+Create Date: 2026-10-18 20:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0011_classements'
+down_revision = '0010_texte_documents'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'activite',
+        sa.Column('id', sa.BigInteger().with_variant(sa.Integer(), 'sqlite'),
+                  autoincrement=True, nullable=False),
+        sa.Column('document_id', sa.Integer(), nullable=False),
+        sa.Column('type', sa.String(length=20), nullable=False),
+        sa.Column('valeur', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_table(
+        'classement',
+        sa.Column('document_id', sa.Integer(), nullable=False),
+        sa.Column('matiere_id', sa.Integer(), nullable=False),
+        sa.Column('type', sa.String(length=20), nullable=False),
+        sa.Column('score_tendance', sa.Float(), nullable=True),
+        sa.Column('note_bayesienne', sa.Float(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['document_id'], ['document.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('document_id'),
+    )
+    for nom, colonne in (('tendance', 'score_tendance'), ('note', 'note_bayesienne')):
+        op.create_index(f'ix_classement_{nom}', 'classement', [colonne, 'document_id'])
+        op.create_index(
+            f'ix_classement_type_{nom}', 'classement', ['type', colonne, 'document_id']
+        )
+        op.create_index(
+            f'ix_classement_matiere_{nom}', 'classement', ['matiere_id', colonne, 'document_id']
+        )
+    op.create_table(
+        'classement_etat',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('moyenne_notes', sa.Float(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+    )
+
+
+def downgrade():
+    op.drop_table('classement_etat')
+    for nom in ('tendance', 'note'):
+        for prefixe in ('ix_classement_', 'ix_classement_type_', 'ix_classement_matiere_'):
+            op.drop_index(f'{prefixe}{nom}', table_name='classement')
+    op.drop_table('classement')
+    op.drop_table('activite')
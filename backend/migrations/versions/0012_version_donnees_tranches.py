@@ -0,0 +1,53 @@
+"""Versions des tables réparties en tranches
+
+Revision ID: 0012_version_donnees_tranches
+Revises: 0011_classements
+Create Date: 2026-10-18 21:00:00
+
+La clé primaire passe de (nom_table) à (nom_table, tranche) : la table est
+recréée, les versions existantes deviennent la tranche 0. Au retour
+arrière, les tranches sont additionnées.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0012_version_donnees_tranches'
+down_revision = '0011_classements'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'version_donnees_tranches',
+        sa.Column('nom_table', sa.String(length=50), nullable=False),
+        sa.Column('tranche', sa.SmallInteger(), nullable=False),
+        sa.Column('version', sa.BigInteger(), nullable=False),
+        sa.Column('modifie_a', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('nom_table', 'tranche'),
+    )
+    op.execute(
+        'INSERT INTO version_donnees_tranches (nom_table, tranche, version, modifie_a) '
+        'SELECT nom_table, 0, version, modifie_a FROM version_donnees'
+    )
+    op.drop_table('version_donnees')
+    op.rename_table('version_donnees_tranches', 'version_donnees')
+
+
+def downgrade():
+    op.create_table(
+        'version_donnees_totales',
+        sa.Column('nom_table', sa.String(length=50), nullable=False),
+        sa.Column('version', sa.BigInteger(), nullable=False),
+        sa.Column('modifie_a', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('nom_table'),
+    )
+    op.execute(
+        'INSERT INTO version_donnees_totales (nom_table, version, modifie_a) '
+        'SELECT nom_table, SUM(version), MAX(modifie_a) FROM version_donnees '
+        'GROUP BY nom_table'
+    )
+    op.drop_table('version_donnees')
+    op.rename_table('version_donnees_totales', 'version_donnees')
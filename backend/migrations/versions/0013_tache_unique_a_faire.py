@@ -0,0 +1,46 @@
+"""Au plus une tâche à faire par (type, document)
+
+Revision ID: 0013_tache_unique_a_faire
+Revises: 0012_version_donnees_tranches
+Create Date: 2026-10-18 22:00:00
+
+Les doublons déjà planifiés sont supprimés avant la création de l'index : on
+garde la tâche en cours, sinon la plus ancienne.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0013_tache_unique_a_faire'
+down_revision = '0012_version_donnees_tranches'
+branch_labels = None
+depends_on = None
+
+A_FAIRE = sa.text("etat IN ('en_attente', 'en_cours')")
+
+
+def upgrade():
+    op.execute("""
+        DELETE FROM tache
+        WHERE etat IN ('en_attente', 'en_cours')
+          AND document_id IS NOT NULL
+          AND EXISTS (
+              SELECT 1 FROM tache AS autre
+              WHERE autre.type = tache.type
+                AND autre.document_id = tache.document_id
+                AND autre.etat IN ('en_attente', 'en_cours')
+                AND (
+                    (autre.etat = 'en_cours' AND tache.etat = 'en_attente')
+                    OR (autre.etat = tache.etat AND autre.id < tache.id)
+                )
+          )
+    """)
+    op.create_index(
+        'ux_tache_document_a_faire', 'tache', ['type', 'document_id'], unique=True,
+        postgresql_where=A_FAIRE, sqlite_where=A_FAIRE,
+    )
+
+
+def downgrade():
+    op.drop_index('ux_tache_document_a_faire', table_name='tache')
@@ -1,8 +1,52 @@
 """Modèles SQLAlchemy — domaine : partage de documents universitaires."""
+import datetime
+import zlib
+
 from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session
+from sqlalchemy.dialects import postgresql, sqlite
 from werkzeug.security import generate_password_hash, check_password_hash
 
-db = SQLAlchemy()
+
+class SessionRoutee(Session):
+    """Session qui envoie ses lectures vers `info["moteur_lecture"]` s'il est
+    défini (routes en lecture seule, cf. replicas) ; flush et DML restent
+    sur la base principale."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        moteur = self.info.get("moteur_lecture")
+        if (
+            moteur is not None
+            and bind is None
+            and not self._flushing
+            and not getattr(clause, "is_dml", False)
+        ):
+            return moteur
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+db = SQLAlchemy(session_options={"class_": SessionRoutee})
+
+
+# ──────────────────────────────────────────────
+#  VERSIONS DES DONNÉES (validateurs HTTP)
+# ──────────────────────────────────────────────
+class VersionDonnees(db.Model):
+    """Compteur de modifications d'une table, incrémenté à chaque transaction qui l'écrit.
+
+    Réparti en plusieurs tranches (lignes) par table : deux transactions
+    concurrentes n'attendent le verrou de la même ligne que si elles tirent
+    la même tranche. La version d'une table est la somme de ses tranches.
+    """
+    __tablename__ = "version_donnees"
+
+    nom_table = db.Column(db.String(50), primary_key=True)
+    tranche = db.Column(db.SmallInteger, primary_key=True, default=0)
+    version = db.Column(db.BigInteger, nullable=False, default=0)
+    modifie_a = db.Column(db.DateTime, nullable=True)
+
+    def __repr__(self):
+        return f"<VersionDonnees {self.nom_table}[{self.tranche}] v{self.version}>"
 
 
 # ──────────────────────────────────────────────
@@ -25,7 +69,7 @@ class Universite(db.Model):
             "nom": self.nom,
             "sigle": self.sigle,
             "ville": self.ville,
-            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "created_at": self.created_at,
         }
 
     def __repr__(self):
@@ -37,6 +81,7 @@ class Universite(db.Model):
 # ──────────────────────────────────────────────
 class Filiere(db.Model):
     __tablename__ = "filiere"
+    __table_args__ = (db.Index("ix_filiere_universite_id", "universite_id"),)
 
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     nom = db.Column(db.String(200), nullable=False)
@@ -53,7 +98,7 @@ class Filiere(db.Model):
             "nom": self.nom,
             "universite_id": self.universite_id,
             "universite": self.universite.sigle if self.universite else None,
-            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "created_at": self.created_at,
         }
 
     def __repr__(self):
@@ -65,6 +110,7 @@ class Filiere(db.Model):
 # ──────────────────────────────────────────────
 class Matiere(db.Model):
     __tablename__ = "matiere"
+    __table_args__ = (db.Index("ix_matiere_filiere_niveau", "filiere_id", "niveau"),)
 
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     nom = db.Column(db.String(200), nullable=False)
@@ -81,7 +127,7 @@ class Matiere(db.Model):
             "filiere_id": self.filiere_id,
             "filiere": self.filiere.nom if self.filiere else None,
             "niveau": self.niveau,
-            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "created_at": self.created_at,
         }
 
     def __repr__(self):
@@ -127,25 +173,63 @@ class Utilisateur(db.Model):
             "universite_id": self.universite_id,
             "filiere_id": self.filiere_id,
             "niveau": self.niveau,
-            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "created_at": self.created_at,
         }
 
     def __repr__(self):
         return f"<Utilisateur {self.prenom} {self.nom}>"
 
 
+# ──────────────────────────────────────────────
+#  FICHIER (stockage par contenu, dédupliqué)
+# ──────────────────────────────────────────────
+class Fichier(db.Model):
+    __tablename__ = "fichier"
+
+    sha256 = db.Column(db.String(64), primary_key=True)
+    taille = db.Column(db.BigInteger, nullable=False)
+    nb_references = db.Column(db.Integer, nullable=False, default=1)
+    created_at = db.Column(db.DateTime, server_default=db.func.now())
+
+    def __repr__(self):
+        return f"<Fichier {self.sha256[:12]} x{self.nb_references}>"
+
+
 # ──────────────────────────────────────────────
 #  DOCUMENT
 # ──────────────────────────────────────────────
+APPROUVE = db.text("statut = 'approuve'")
+
+
 class Document(db.Model):
     __tablename__ = "document"
+    # Chemins d'accès des listes (documents approuvés, du plus récent au plus
+    # ancien) : index partiels parcourus dans l'ordre de l'index, sans tri.
+    __table_args__ = (
+        db.Index(
+            "ix_document_approuve_recents", "created_at", "id",
+            postgresql_where=APPROUVE, sqlite_where=APPROUVE,
+        ),
+        db.Index(
+            "ix_document_approuve_matiere", "matiere_id", "created_at", "id",
+            postgresql_where=APPROUVE, sqlite_where=APPROUVE,
+        ),
+        db.Index(
+            "ix_document_approuve_type", "type", "created_at", "id",
+            postgresql_where=APPROUVE, sqlite_where=APPROUVE,
+        ),
+        db.Index("ix_document_auteur_id", "auteur_id"),
+    )
 
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     titre = db.Column(db.String(300), nullable=False)
     description = db.Column(db.Text, default="")
     type = db.Column(db.String(20), nullable=False)  # cours, examen, td, tp, expose
     fichier_nom = db.Column(db.String(300), nullable=False)  # nom original
-    fichier_stockage = db.Column(db.String(300), nullable=False)  # nom sur disque
+    fichier_stockage = db.Column(db.String(300), nullable=False)  # chemin relatif sur disque
+    fichier_sha256 = db.Column(
+        db.String(64), db.ForeignKey("fichier.sha256"), nullable=True, index=True
+    )  # NULL pour les fichiers antérieurs au stockage par contenu
     taille = db.Column(db.Integer, default=0)
     format = db.Column(db.String(10), default="pdf")
     annee_academique = db.Column(db.String(20), nullable=True)
@@ -154,18 +238,33 @@ class Document(db.Model):
         db.Integer, db.ForeignKey("utilisateur.id"), nullable=False
     )
     nb_telechargements = db.Column(db.Integer, default=0)
+    # Agrégats dénormalisés, maintenus par `enregistrer_vote`
+    vote_count = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    vote_sum = db.Column(db.Integer, nullable=False, default=0, server_default="0")
     statut = db.Column(db.String(20), default="en_attente")  # en_attente, approuve, rejete
+    # Traitements en arrière-plan du fichier (cf. taches) :
+    # en_attente, en_cours, termine, echoue
+    statut_traitement = db.Column(
+        db.String(20), nullable=False, default="termine", server_default="termine"
+    )
     created_at = db.Column(db.DateTime, server_default=db.func.now())
 
     votes = db.relationship("Vote", backref="document", lazy=True, cascade="all, delete-orphan")
 
+    @staticmethod
+    def calculer_note(vote_count, vote_sum):
+        if not vote_count:
+            return 0
+        return round(vote_sum / vote_count, 1)
+
     @property
     def note_moyenne(self):
-        if not self.votes:
-            return 0
-        return round(sum(v.note for v in self.votes) / len(self.votes), 1)
+        return self.calculer_note(self.vote_count, self.vote_sum)
 
-    def to_dict(self):
+    def to_dict(self, matiere=None):
+        """`matiere` : nom de la matière déjà connu (évite de charger la relation)."""
+        if matiere is None and self.matiere:
+            matiere = self.matiere.nom
         return {
             "id": self.id,
             "titre": self.titre,
@@ -176,7 +275,7 @@ class Document(db.Model):
             "format": self.format,
             "annee_academique": self.annee_academique,
             "matiere_id": self.matiere_id,
-            "matiere": self.matiere.nom if self.matiere else None,
+            "matiere": matiere,
             "auteur_id": self.auteur_id,
             "auteur": (
                 f"{self.auteur.prenom} {self.auteur.nom}" if self.auteur else None
@@ -184,13 +283,20 @@ class Document(db.Model):
             "nb_telechargements": self.nb_telechargements,
             "note_moyenne": self.note_moyenne,
             "statut": self.statut,
-            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "statut_traitement": self.statut_traitement,
+            "created_at": self.created_at,
         }
 
     def __repr__(self):
         return f"<Document {self.titre}>"
 
 
+# Filtre des listes publiques. Valeur écrite dans la requête (pas de
+# paramètre lié) : SQLite ne reconnaît la condition des index partiels
+# (`statut = 'approuve'`) que face à un littéral.
+DOCUMENT_APPROUVE = Document.statut == db.literal("approuve", literal_execute=True)
+
+
 # ──────────────────────────────────────────────
 #  VOTE (notation des documents)
 # ──────────────────────────────────────────────
@@ -198,6 +304,7 @@ class Vote(db.Model):
     __tablename__ = "vote"
     __table_args__ = (
         db.UniqueConstraint("document_id", "utilisateur_id", name="uq_vote"),
+        db.Index("ix_vote_utilisateur_id", "utilisateur_id"),
     )
 
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
@@ -216,5 +323,243 @@ class Vote(db.Model):
             "document_id": self.document_id,
             "utilisateur_id": self.utilisateur_id,
             "note": self.note,
-            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "created_at": self.created_at,
+        }
+
+
+# ──────────────────────────────────────────────
+#  SESSION D'UPLOAD PAR MORCEAUX
+# ──────────────────────────────────────────────
+def maintenant_utc():
+    """Horodatage UTC naïf, calculé côté Python (comparable aux dates d'expiration)."""
+    return datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+
+
+class SessionUpload(db.Model):
+    __tablename__ = "session_upload"
+
+    id = db.Column(db.String(32), primary_key=True)  # uuid4 hex
+    utilisateur_id = db.Column(
+        db.Integer, db.ForeignKey("utilisateur.id"), nullable=False
+    )
+    fichier_nom = db.Column(db.String(300), nullable=False)
+    format = db.Column(db.String(10), nullable=False)
+    taille_totale = db.Column(db.BigInteger, nullable=False)
+    recu = db.Column(db.BigInteger, nullable=False, default=0)
+    sha256_attendu = db.Column(db.String(64), nullable=True)
+    # Métadonnées du futur document
+    titre = db.Column(db.String(300), nullable=False)
+    description = db.Column(db.Text, default="")
+    type = db.Column(db.String(20), nullable=False)
+    annee_academique = db.Column(db.String(20), nullable=True)
+    matiere_id = db.Column(db.Integer, db.ForeignKey("matiere.id"), nullable=False)
+    created_at = db.Column(db.DateTime, default=maintenant_utc)
+    updated_at = db.Column(db.DateTime, default=maintenant_utc, index=True)
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "fichier_nom": self.fichier_nom,
+            "taille": self.taille_totale,
+            "recu": self.recu,
+            "titre": self.titre,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
         }
+
+
+# ──────────────────────────────────────────────
+#  TEXTE EXTRAIT DES FICHIERS (recherche dans le contenu)
+# ──────────────────────────────────────────────
+class DocumentTexte(db.Model):
+    """Texte extrait du fichier d'un document, compressé (zlib, UTF-8).
+
+    L'index de recherche correspondant (tsvector ou FTS5) est maintenu par
+    `search.indexer_contenu`.
+    """
+    __tablename__ = "document_texte"
+
+    document_id = db.Column(
+        db.Integer, db.ForeignKey("document.id", ondelete="CASCADE"), primary_key=True
+    )
+    contenu = db.Column(db.LargeBinary, nullable=False)
+    longueur = db.Column(db.Integer, nullable=False)  # en caractères
+    tronque = db.Column(db.Boolean, nullable=False, default=False)
+    extrait_a = db.Column(db.DateTime, default=maintenant_utc, onupdate=maintenant_utc)
+
+    @property
+    def texte(self):
+        return zlib.decompress(self.contenu).decode("utf-8")
+
+    def __repr__(self):
+        return f"<DocumentTexte {self.document_id} ({self.longueur} car.)>"
+
+
+# ──────────────────────────────────────────────
+#  REPRISE DES IMPORTS EN MASSE
+# ──────────────────────────────────────────────
+class ImportReprise(db.Model):
+    """Point de reprise d'un import (cf. importation) : nombre d'enregistrements
+    du fichier source déjà traités, validé dans la même transaction que le lot."""
+    __tablename__ = "import_reprise"
+
+    cle = db.Column(db.String(300), primary_key=True)  # entité:fichier:taille
+    lignes = db.Column(db.BigInteger, nullable=False, default=0)
+    inserees = db.Column(db.BigInteger, nullable=False, default=0)
+    termine = db.Column(db.Boolean, nullable=False, default=False)
+    updated_at = db.Column(db.DateTime, default=maintenant_utc, onupdate=maintenant_utc)
+
+
+# ──────────────────────────────────────────────
+#  FILE DE TÂCHES EN ARRIÈRE-PLAN
+# ──────────────────────────────────────────────
+A_FAIRE = db.text("etat IN ('en_attente', 'en_cours')")
+
+
+class Tache(db.Model):
+    """Tâche en arrière-plan (cf. taches). `disponible_a` : date à partir de
+    laquelle elle peut être (re)prise — prochain essai après un échec, ou fin
+    du délai de visibilité d'une tâche en cours."""
+    __tablename__ = "tache"
+    __table_args__ = (
+        db.Index(
+            "ix_tache_a_faire", "type", "disponible_a",
+            postgresql_where=A_FAIRE, sqlite_where=A_FAIRE,
+        ),
+        # Au plus une tâche d'un type à faire par document (cf. planifier_si_absente)
+        db.Index(
+            "ux_tache_document_a_faire", "type", "document_id", unique=True,
+            postgresql_where=A_FAIRE, sqlite_where=A_FAIRE,
+        ),
+    )
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    type = db.Column(db.String(50), nullable=False)
+    charge = db.Column(db.JSON, nullable=False, default=dict)
+    # Sans clé étrangère : la tâche d'un document supprimé se termine à vide
+    document_id = db.Column(db.Integer, nullable=True, index=True)
+    etat = db.Column(db.String(20), nullable=False, default="en_attente")
+    # en_attente, en_cours, terminee, echouee
+    tentatives = db.Column(db.Integer, nullable=False, default=0)
+    max_tentatives = db.Column(db.Integer, nullable=False, default=5)
+    disponible_a = db.Column(db.DateTime, nullable=False, default=maintenant_utc)
+    jeton = db.Column(db.String(64), nullable=True)  # réservation en cours
+    erreur = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=maintenant_utc)
+    updated_at = db.Column(db.DateTime, default=maintenant_utc, onupdate=maintenant_utc)
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "type": self.type,
+            "document_id": self.document_id,
+            "etat": self.etat,
+            "tentatives": self.tentatives,
+            "disponible_a": self.disponible_a,
+            "erreur": self.erreur,
+        }
+
+    def __repr__(self):
+        return f"<Tache {self.type} #{self.id} {self.etat}>"
+
+
+# ──────────────────────────────────────────────
+#  CLASSEMENTS (tendances, mieux notés)
+# ──────────────────────────────────────────────
+class Activite(db.Model):
+    """Journal des téléchargements et votes récents, consommé (puis vidé) par
+    `classements.actualiser`. `valeur` : nombre de téléchargements ou note."""
+    __tablename__ = "activite"
+
+    id = db.Column(db.BigInteger().with_variant(db.Integer, "sqlite"), primary_key=True)
+    document_id = db.Column(db.Integer, nullable=False)
+    type = db.Column(db.String(20), nullable=False)  # telechargement, vote
+    valeur = db.Column(db.Integer, nullable=False, default=1)
+    created_at = db.Column(db.DateTime, nullable=False, default=maintenant_utc)
+
+
+class Classement(db.Model):
+    """Scores précalculés d'un document (cf. classements). `matiere_id` et
+    `type` sont recopiés du document pour filtrer dans l'ordre des index."""
+    __tablename__ = "classement"
+    __table_args__ = (
+        db.Index("ix_classement_tendance", "score_tendance", "document_id"),
+        db.Index("ix_classement_type_tendance", "type", "score_tendance", "document_id"),
+        db.Index("ix_classement_matiere_tendance", "matiere_id", "score_tendance", "document_id"),
+        db.Index("ix_classement_note", "note_bayesienne", "document_id"),
+        db.Index("ix_classement_type_note", "type", "note_bayesienne", "document_id"),
+        db.Index("ix_classement_matiere_note", "matiere_id", "note_bayesienne", "document_id"),
+    )
+
+    document_id = db.Column(
+        db.Integer, db.ForeignKey("document.id", ondelete="CASCADE"), primary_key=True
+    )
+    matiere_id = db.Column(db.Integer, nullable=False)
+    type = db.Column(db.String(20), nullable=False)
+    # log(Σ poids · e^(λ·(t − époque))) : NULL sans activité récente
+    score_tendance = db.Column(db.Float, nullable=True)
+    # Moyenne bayésienne des notes : NULL sans vote
+    note_bayesienne = db.Column(db.Float, nullable=True)
+    updated_at = db.Column(db.DateTime, default=maintenant_utc, onupdate=maintenant_utc)
+
+
+class ClassementEtat(db.Model):
+    """Ligne unique : verrou des actualisations et moyenne globale des notes
+    utilisée pour les moyennes bayésiennes en place."""
+    __tablename__ = "classement_etat"
+
+    id = db.Column(db.Integer, primary_key=True)
+    moyenne_notes = db.Column(db.Float, nullable=True)
+    updated_at = db.Column(db.DateTime, default=maintenant_utc, onupdate=maintenant_utc)
+
+
+def insert_upsert():
+    """Construction INSERT … ON CONFLICT propre au dialecte courant."""
+    if db.session.get_bind().dialect.name == "postgresql":
+        return postgresql.insert
+    return sqlite.insert
+
+
+def enregistrer_vote(document_id, utilisateur_id, note):
+    """Insérer ou mettre à jour un vote et ses agrégats sur `document`.
+
+    La ligne du document est verrouillée (SELECT … FOR UPDATE) : les votes
+    concurrents sur un même document sont sérialisés, ce qui garantit que
+    l'ancienne note lue est la bonne. Le vote lui-même est écrit en un seul
+    upsert, puis `vote_count`/`vote_sum` sont ajustés par delta dans la même
+    transaction. Ne commite pas.
+    """
+    db.session.execute(
+        db.select(Document.id).where(Document.id == document_id).with_for_update()
+    )
+    ancienne = db.session.execute(
+        db.select(Vote.note).where(
+            Vote.document_id == document_id, Vote.utilisateur_id == utilisateur_id
+        )
+    ).scalar()
+
+    insert = insert_upsert()
+    stmt = insert(Vote).values(
+        document_id=document_id, utilisateur_id=utilisateur_id, note=note
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[Vote.document_id, Vote.utilisateur_id],
+        set_={"note": stmt.excluded.note},
+    ).returning(Vote)
+    vote = db.session.scalars(
+        stmt, execution_options={"populate_existing": True}
+    ).one()
+
+    db.session.execute(
+        db.update(Document)
+        .where(Document.id == document_id)
+        .values(
+            vote_count=Document.vote_count + (0 if ancienne is not None else 1),
+            vote_sum=Document.vote_sum + note - (ancienne or 0),
+        )
+        .execution_options(synchronize_session=False)
+    )
+    db.session.execute(
+        db.insert(Activite).values(document_id=document_id, type="vote", valeur=note)
+    )
+    return vote
@@ -0,0 +1,166 @@
+"""Pagination des listes de documents — par page (OFFSET) ou par curseur (keyset).
+
+Mode page (historique) : `page`, `per_page` → `total`, `page`, `pages`.
+Mode curseur : présence du paramètre `cursor` (vide pour la première page) ;
+la page suivante est lue avec `WHERE (created_at, id) < (…)`, sans OFFSET,
+et la réponse porte un `next_cursor` opaque (null en fin de liste).
+
+Le paramètre `total` choisit le comptage : `exact` (COUNT(*), défaut en mode
+page sauf indication de la route), `estimation` (estimation du planificateur
+PostgreSQL) ou `aucun` (défaut en mode curseur).
+"""
+import base64
+import binascii
+import datetime
+import json
+import math
+from collections import namedtuple
+
+from flask import current_app, jsonify, request
+
+from models import db, Document
+
+MODES_TOTAL = ("exact", "estimation", "aucun")
+
+ParametresPagination = namedtuple(
+    "ParametresPagination", "page per_page curseur position total"
+)
+
+
+# ──────────────────────────────────────────────
+#  CURSEUR
+# ──────────────────────────────────────────────
+def encoder_curseur(document):
+    """Curseur opaque désignant la position (created_at, id) d'un document."""
+    brut = json.dumps([document.created_at.isoformat(), document.id])
+    return base64.urlsafe_b64encode(brut.encode()).decode().rstrip("=")
+
+
+def decoder_curseur(curseur):
+    """Inverse de `encoder_curseur` ; lève ValueError si le curseur est invalide."""
+    try:
+        brut = base64.urlsafe_b64decode(curseur + "=" * (-len(curseur) % 4))
+        created_at, document_id = json.loads(brut)
+        return datetime.datetime.fromisoformat(created_at), int(document_id)
+    except (binascii.Error, UnicodeDecodeError, TypeError, ValueError) as exc:
+        raise ValueError("curseur invalide") from exc
+
+
+# ──────────────────────────────────────────────
+#  PARAMÈTRES
+# ──────────────────────────────────────────────
+def lire_parametres(total_defaut="exact"):
+    """Lire les paramètres de pagination de la requête courante.
+
+    Renvoie (params, None) ou (None, réponse d'erreur 400). `per_page` est
+    borné à [1, MAX_PER_PAGE] ; `total_defaut` : comptage en mode page si la
+    requête n'en précise pas.
+    """
+    per_page = request.args.get("per_page", 20, type=int)
+    per_page = max(1, min(per_page, current_app.config["MAX_PER_PAGE"]))
+    page = max(1, request.args.get("page", 1, type=int))
+
+    curseur = request.args.get("cursor")
+    total = request.args.get("total", "aucun" if curseur is not None else total_defaut)
+    if total not in MODES_TOTAL:
+        return None, (
+            jsonify({"error": f"Total invalide. Valeurs : {', '.join(MODES_TOTAL)}"}),
+            400,
+        )
+
+    position = None
+    if curseur:
+        try:
+            position = decoder_curseur(curseur)
+        except ValueError:
+            return None, (jsonify({"error": "Curseur invalide"}), 400)
+
+    return ParametresPagination(
+        page=page,
+        per_page=per_page,
+        curseur=curseur is not None,
+        position=position,
+        total=total,
+    ), None
+
+
+# ──────────────────────────────────────────────
+#  COMPTAGE
+# ──────────────────────────────────────────────
+def _estimer(query):
+    """Nombre de lignes estimé par le planificateur PostgreSQL (EXPLAIN)."""
+    dialecte = db.session.get_bind().dialect
+    compiled = query.order_by(None).statement.compile(dialect=dialecte)
+    plan = (
+        db.session.connection()
+        .exec_driver_sql(f"EXPLAIN (FORMAT JSON) {compiled}", compiled.params)
+        .scalar()
+    )
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+def compter(query, mode, ordonne=True):
+    """Total selon le mode demandé (l'estimation retombe sur COUNT hors PostgreSQL).
+
+    `ordonne` : compter dans l'ordre de la liste quand cet ordre est celui
+    d'un index (date, classement) ; le COUNT parcourt alors cet index partiel
+    au lieu de la table entière. Sinon (tri par pertinence), l'ordre est
+    retiré.
+    """
+    if mode == "aucun":
+        return None
+    if mode == "estimation" and db.session.get_bind().dialect.name == "postgresql":
+        return _estimer(query)
+    if not ordonne:
+        query = query.order_by(None)
+    return query.with_entities(Document.id).count()
+
+
+# ──────────────────────────────────────────────
+#  PAGINATION
+# ──────────────────────────────────────────────
+def _apres(position):
+    """Condition keyset : documents situés après `position` dans l'ordre DESC."""
+    created_at, document_id = position
+    colonne = Document.created_at
+    if db.session.get_bind().dialect.name == "sqlite":
+        # SQLite stocke les dates en texte (avec ou sans microsecondes selon
+        # qu'elles viennent de CURRENT_TIMESTAMP ou de Python) : normaliser.
+        colonne = db.func.strftime("%Y-%m-%d %H:%M:%f", colonne)
+        created_at = db.func.strftime("%Y-%m-%d %H:%M:%f", created_at.isoformat(" "))
+    return db.tuple_(colonne, Document.id) < db.tuple_(created_at, document_id)
+
+
+def paginer(query, params, ordonne=True):
+    """Paginer une requête sur `Document` ; renvoie (documents, méta-données).
+
+    En mode curseur, la requête doit être ordonnée par
+    (created_at DESC, id DESC). `ordonne` : cf. `compter`.
+    """
+    if params.curseur:
+        page_query = query
+        if params.position:
+            page_query = page_query.filter(_apres(params.position))
+        items = page_query.limit(params.per_page + 1).all()
+        suivant = None
+        if len(items) > params.per_page:
+            items = items[: params.per_page]
+            suivant = encoder_curseur(items[-1])
+        return items, {
+            "per_page": params.per_page,
+            "next_cursor": suivant,
+            "total": compter(query, params.total, ordonne),
+        }
+
+    pagination = query.paginate(
+        page=params.page, per_page=params.per_page, error_out=False, count=False
+    )
+    total = compter(query, params.total, ordonne)
+    return pagination.items, {
+        "total": total,
+        "page": pagination.page,
+        "pages": math.ceil(total / params.per_page) if total is not None else None,
+        "per_page": params.per_page,
+    }
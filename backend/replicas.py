@@ -0,0 +1,187 @@
+"""Routage des lectures vers un réplica PostgreSQL (optionnel).
+
+Les routes décorées par `lecture_seule` lisent sur le réplica
+(`SQLALCHEMY_REPLICA_URI`) ; tout le reste — écritures, flush, DML, routes
+non décorées — reste sur la base principale (cf. `models.SessionRoutee`).
+
+Lecture de ses propres écritures : toute requête d'écriture réussie (POST,
+PUT, PATCH, DELETE) pose un cookie qui renvoie les lectures de ce client vers
+la base principale pendant `REPLICA_STICKY_SECONDS`.
+
+Retard du réplica : mesuré au plus toutes les `REPLICA_CHECK_INTERVAL`
+secondes, sur le réplica lui-même (`now() - pg_last_xact_replay_timestamp()`,
+0 si tout le WAL reçu est rejoué et que la réception est active : une base
+principale inactive ne fait pas paraître le réplica en retard, un réplica
+déconnecté est écarté). Hors PostgreSQL (copie SQLite des tests), il
+est estimé à partir de `version_donnees`. Au-delà de
+`REPLICA_MAX_LAG_SECONDS`, ou si le réplica est injoignable, les lectures
+retournent sur la base principale jusqu'à la vérification suivante.
+"""
+import logging
+import threading
+import time
+from functools import wraps
+
+from flask import current_app, request
+from sqlalchemy import create_engine
+
+import connexions
+from models import db, maintenant_utc
+from versions import selection_versions
+
+logger = logging.getLogger(__name__)
+
+COOKIE_ECRITURE = "ecriture_recente"
+# Mesuré sur le réplica ; NULL (retard infini) sans réception du WAL en
+# cours — WAL receiver arrêté ou déconnecté : reçu et rejoué restent égaux
+# sans que le réplica soit à jour — ou si rien n'a encore été rejoué.
+# `status` n'est lisible qu'avec le rôle pg_read_all_stats.
+RETARD_REPLAY = db.text("""
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN NOT EXISTS (
+            SELECT 1 FROM pg_stat_wal_receiver WHERE status = 'streaming'
+        ) THEN NULL
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+    END
+""")
+METHODES_ECRITURE = frozenset({"POST", "PUT", "PATCH", "DELETE"})
+
+
+class Replica:
+    """Moteur du réplica et état de santé (propre au processus)."""
+
+    def __init__(self, app):
+        config = app.config
+        uri = config["SQLALCHEMY_REPLICA_URI"]
+        options = connexions.options_moteur(config, uri=uri, nom="replica") or {}
+        self.engine = create_engine(uri, **options)
+        if options and config["DB_PGBOUNCER"]:
+            connexions.installer_delai_transaction(
+                self.engine, config["DB_STATEMENT_TIMEOUT_MS"]
+            )
+        self.retard_max = config["REPLICA_MAX_LAG_SECONDS"]
+        self.intervalle = config["REPLICA_CHECK_INTERVAL"]
+        self.lectures_replica = 0
+        self.lectures_primaire = 0
+        self.retard = None
+        self._sain = False
+        self._verifie_a = None
+        self._verrou = threading.Lock()
+
+    @staticmethod
+    def _versions(connexion):
+        lignes = connexion.execute(selection_versions())
+        return {nom: (version, date) for nom, version, date in lignes}
+
+    def mesurer_retard(self):
+        """Retard (s) du réplica sur la base principale, 0 s'il est à jour."""
+        if self.engine.dialect.name == "postgresql":
+            with self.engine.connect() as connexion:
+                retard = connexion.execute(RETARD_REPLAY).scalar()
+            # Réception interrompue ou rien de rejoué : retard inconnu
+            return float("inf") if retard is None else max(float(retard), 0.0)
+        return self._estimer_retard()
+
+    def _estimer_retard(self):
+        """Sans PostgreSQL : âge de la dernière modification vue par le
+        réplica, pour chaque table en retard (majorant du retard réel)."""
+        with db.engine.connect() as connexion:
+            primaire = self._versions(connexion)
+        with self.engine.connect() as connexion:
+            replica = self._versions(connexion)
+        maintenant = maintenant_utc()
+        retard = 0.0
+        for table, (version, _) in primaire.items():
+            version_replica, vue_a = replica.get(table, (0, None))
+            if version_replica < version:
+                if vue_a is None:
+                    return float("inf")
+                retard = max(retard, (maintenant - vue_a).total_seconds())
+        return retard
+
+    def disponible(self):
+        """Le réplica peut-il servir les lectures ? (vérifié périodiquement)"""
+        recent = (
+            self._verifie_a is not None
+            and time.monotonic() - self._verifie_a < self.intervalle
+        )
+        if recent or not self._verrou.acquire(blocking=self._verifie_a is None):
+            return self._sain
+        try:
+            try:
+                self.retard = self.mesurer_retard()
+                self._sain = self.retard <= self.retard_max
+            except Exception:
+                logger.exception("Réplica injoignable, lectures sur la base principale")
+                self.retard, self._sain = None, False
+            if not self._sain:
+                logger.warning("Réplica écarté (retard : %s s)", self.retard)
+            self._verifie_a = time.monotonic()
+        finally:
+            self._verrou.release()
+        return self._sain
+
+    def statistiques(self):
+        return {
+            "sain": self._sain,
+            "retard_s": self.retard,
+            "lectures_replica": self.lectures_replica,
+            "lectures_primaire": self.lectures_primaire,
+        }
+
+
+def _ecriture_recente():
+    try:
+        return float(request.cookies.get(COOKIE_ECRITURE, 0)) > time.time()
+    except ValueError:
+        return False
+
+
+def _marquer_ecriture(response):
+    replica = current_app.extensions.get("replica")
+    if replica is not None and request.method in METHODES_ECRITURE and response.status_code < 400:
+        duree = current_app.config["REPLICA_STICKY_SECONDS"]
+        response.set_cookie(
+            COOKIE_ECRITURE, str(time.time() + duree), max_age=int(duree) + 1,
+            httponly=True, samesite="Lax",
+        )
+    return response
+
+
+def init_app(app):
+    if app.config["SQLALCHEMY_REPLICA_URI"]:
+        app.extensions["replica"] = Replica(app)
+        app.after_request(_marquer_ecriture)
+
+
+def statistiques():
+    """État du réplica pour /api/admin/metriques (None sans réplica)."""
+    replica = current_app.extensions.get("replica")
+    return replica.statistiques() if replica is not None else None
+
+
+def lecture_seule(vue):
+    """Servir la route depuis le réplica quand c'est possible."""
+    @wraps(vue)
+    def enveloppe(*args, **kwargs):
+        replica = current_app.extensions.get("replica")
+        if replica is None:
+            return vue(*args, **kwargs)
+        if _ecriture_recente() or not replica.disponible():
+            replica.lectures_primaire += 1
+            return vue(*args, **kwargs)
+
+        replica.lectures_replica += 1
+        session = db.session()
+        session.info["moteur_lecture"] = replica.engine
+        try:
+            return vue(*args, **kwargs)
+        finally:
+            # Fin de la transaction de lecture : la suite de la requête (et,
+            # dans les tests, la requête suivante) repart sur la base principale.
+            session.info.pop("moteur_lecture", None)
+            session.rollback()
+
+    return enveloppe
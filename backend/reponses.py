@@ -0,0 +1,136 @@
+"""Encodage des réponses : JSON rapide et compression négociée.
+
+JSON : `FournisseurJSON` remplace le fournisseur de Flask (`jsonify`,
+`request.get_json`). Il utilise orjson s'il est installé, sinon le module
+`json` de la bibliothèque standard ; les dates sont écrites au format ISO 8601
+dans les deux cas (les `to_dict` renvoient donc des `datetime` tels quels).
+Les clés gardent l'ordre des dictionnaires, sans tri.
+
+Compression : les réponses JSON et texte d'au moins `COMPRESSION_MIN_SIZE`
+octets sont compressées en brotli (si le module `brotli` est installé) ou en
+gzip, selon l'en-tête Accept-Encoding du client. Les fichiers (send_file) ne
+sont jamais recompressés.
+"""
+import dataclasses
+import datetime
+import decimal
+import gzip
+import json
+import uuid
+
+from flask import request
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+NIVEAU_GZIP = 6
+QUALITE_BROTLI = 4  # bon compromis taille / CPU pour du contenu dynamique
+
+
+def _par_defaut(objet):
+    """Types non natifs : mêmes conversions avec orjson et avec `json`."""
+    if isinstance(objet, (datetime.datetime, datetime.date, datetime.time)):
+        return objet.isoformat()
+    if isinstance(objet, (decimal.Decimal, uuid.UUID)):
+        return str(objet)
+    if dataclasses.is_dataclass(objet) and not isinstance(objet, type):
+        return dataclasses.asdict(objet)
+    if hasattr(objet, "__html__"):
+        return str(objet.__html__())
+    raise TypeError(f"Objet de type {type(objet).__name__} non sérialisable en JSON")
+
+
+class FournisseurJSON(DefaultJSONProvider):
+    sort_keys = False
+    ensure_ascii = False
+
+    def _encoder(self, objet, indente=False):
+        """Document JSON en octets (UTF-8)."""
+        if orjson is not None:
+            options = orjson.OPT_NON_STR_KEYS | (orjson.OPT_INDENT_2 if indente else 0)
+            try:
+                return orjson.dumps(objet, default=_par_defaut, option=options)
+            except orjson.JSONEncodeError:
+                pass  # entiers au-delà de 64 bits… : repli sur `json`
+        return json.dumps(
+            objet,
+            default=_par_defaut,
+            ensure_ascii=False,
+            indent=2 if indente else None,
+            separators=None if indente else (",", ":"),
+        ).encode("utf-8")
+
+    def dumps(self, obj, **kwargs):
+        if kwargs:
+            kwargs.setdefault("default", _par_defaut)
+            kwargs.setdefault("ensure_ascii", False)
+            return json.dumps(obj, **kwargs)
+        return self._encoder(obj).decode("utf-8")
+
+    def loads(self, s, **kwargs):
+        if orjson is not None and not kwargs:
+            return orjson.loads(s)  # JSONDecodeError hérite de ValueError
+        return json.loads(s, **kwargs)
+
+    def response(self, *args, **kwargs):
+        objet = self._prepare_response_obj(args, kwargs)
+        indente = self.compact is False or (self.compact is None and self._app.debug)
+        return self._app.response_class(
+            self._encoder(objet, indente) + b"\n", mimetype=self.mimetype
+        )
+
+
+# ──────────────────────────────────────────────
+#  COMPRESSION
+# ──────────────────────────────────────────────
+def _compressible(response):
+    return response.mimetype == "application/json" or response.mimetype.startswith("text/")
+
+
+def _compresser(donnees, encodage):
+    if encodage == "br":
+        return brotli.compress(donnees, quality=QUALITE_BROTLI)
+    return gzip.compress(donnees, compresslevel=NIVEAU_GZIP, mtime=0)
+
+
+def compresser(response, taille_min):
+    """Compresser le corps de `response` selon Accept-Encoding (après la vue)."""
+    if (
+        response.direct_passthrough
+        or response.is_streamed
+        or response.status_code in (204, 206, 304)
+        or "Content-Encoding" in response.headers
+        or not _compressible(response)
+    ):
+        return response
+    donnees = response.get_data()
+    if len(donnees) < taille_min:
+        return response
+
+    response.vary.add("Accept-Encoding")
+    encodages = ["br", "gzip"] if brotli is not None else ["gzip"]
+    encodage = request.accept_encodings.best_match(encodages)
+    if encodage is None:
+        return response
+    response.set_data(_compresser(donnees, encodage))
+    response.headers["Content-Encoding"] = encodage
+    # Une autre représentation : l'ETag ne peut plus être fort
+    etag, faible = response.get_etag()
+    if etag and not faible:
+        response.set_etag(etag, weak=True)
+    return response
+
+
+def init_app(app):
+    app.json = FournisseurJSON(app)
+    taille_min = app.config["COMPRESSION_MIN_SIZE"]
+    if taille_min > 0:
+        app.after_request(lambda response: compresser(response, taille_min))
@@ -1,15 +1,55 @@
 """Routes API — partage de documents universitaires."""
-import os
+import mimetypes
+import re
 import uuid
 
-from flask import Blueprint, request, jsonify, send_from_directory, current_app
+from flask import (
+    Blueprint, abort, g, request, jsonify, send_file, send_from_directory, current_app
+)
 from werkzeug.utils import secure_filename
 
-from models import db, Utilisateur, Universite, Filiere, Matiere, Document, Vote
+from models import (
+    db, Classement, Utilisateur, Document, DOCUMENT_APPROUVE, SessionUpload, Tache,
+    enregistrer_vote, maintenant_utc,
+)
+import apercus
 from auth import generate_token, token_required, admin_required
+import catalogue
+import classements
+import connexions
+from catalogue import TABLES_CATALOGUE
+from connexions import delai_requetes
+from compteurs import compteur_telechargements
+from hachage import HachageSurcharge, pool_hachage
+from pagination import lire_parametres, paginer
+import replicas
+from replicas import lecture_seule
+from search import TRIS, extraits, rechercher
+import statistiques
+from statistiques import TABLES_STATS
+from serializers import avec_relations, documents_to_dict, lire_champs, preparer, serialiser
+import stockage
+import taches
+import taxonomie
+import traitements
+import uploads
+from taxonomie import TABLES_TAXONOMIE
+from versions import etag_versions, reponse_versionnee
 
 api = Blueprint("api", __name__, url_prefix="/api")
 
+TYPES_DOCUMENT = ("cours", "examen", "td", "tp", "expose")
+SHA256_HEX = re.compile(r"[0-9a-fA-F]{64}")
+
+# Durées de cache HTTP (s) : référentiel (universités, filières, matières),
+# statistiques ; les listes de documents sont revalidées à chaque usage.
+DUREE_REFERENTIEL = 300
+DUREE_STATS = 60
+
+# Délais max (ms) des requêtes SQL des routes coûteuses (503 au-delà)
+DELAI_LISTE_MS = 3000
+DELAI_RECHERCHE_MS = 2000
+
 
 def _allowed_file(filename):
     return (
@@ -24,6 +64,14 @@ def _allowed_file(filename):
 # ══════════════════════════════════════════════
 
 
+@api.errorhandler(HachageSurcharge)
+def hachage_surcharge(_erreur):
+    """Pool de hachage saturé : refuser vite plutôt que d'empiler les requêtes."""
+    response = jsonify({"error": "Service surchargé, réessayez dans un instant"})
+    response.headers["Retry-After"] = "1"
+    return response, 503
+
+
 @api.route("/auth/register", methods=["POST"])
 def register():
     """Inscription d'un nouvel utilisateur."""
@@ -44,7 +92,7 @@ def register():
         filiere_id=data.get("filiere_id"),
         niveau=data.get("niveau"),
     )
-    user.set_password(data["mot_de_passe"])
+    user.mot_de_passe = pool_hachage.generer(data["mot_de_passe"])
     db.session.add(user)
     db.session.commit()
 
@@ -60,9 +108,18 @@ def login():
         return jsonify({"error": "Email et mot de passe requis"}), 400
 
     user = Utilisateur.query.filter_by(email=data["email"]).first()
-    if not user or not user.check_password(data["mot_de_passe"]):
+    if not user or not pool_hachage.verifier(user.mot_de_passe, data["mot_de_passe"]):
         return jsonify({"error": "Email ou mot de passe incorrect"}), 401
 
+    if not pool_hachage.est_a_jour(user.mot_de_passe):
+        # Recalculer le hash avec les paramètres courants ; en cas de
+        # surcharge, la mise à niveau attendra la prochaine connexion.
+        try:
+            user.mot_de_passe = pool_hachage.generer(data["mot_de_passe"])
+            db.session.commit()
+        except HachageSurcharge:
+            pass
+
     token = generate_token(user)
     return jsonify({"token": token, "utilisateur": user.to_dict()}), 200
 
@@ -80,18 +137,37 @@ def get_me(current_user):
 
 
 @api.route("/universites", methods=["GET"])
+@lecture_seule
+@reponse_versionnee(*TABLES_TAXONOMIE, max_age=DUREE_REFERENTIEL)
 def get_universites():
     """Lister toutes les universités."""
-    universites = Universite.query.order_by(Universite.nom).all()
-    return jsonify([u.to_dict() for u in universites]), 200
+    return jsonify(taxonomie.instantane().universites()), 200
 
 
 @api.route("/universites/<int:uid>", methods=["GET"])
+@lecture_seule
+@reponse_versionnee(*TABLES_TAXONOMIE, max_age=DUREE_REFERENTIEL)
 def get_universite(uid):
     """Détails d'une université + ses filières."""
-    u = Universite.query.get_or_404(uid)
-    data = u.to_dict()
-    data["filieres"] = [f.to_dict() for f in u.filieres]
+    referentiel = taxonomie.instantane()
+    data = referentiel.universite(uid)
+    if data is None:
+        abort(404)
+    data["filieres"] = referentiel.filieres(universite_id=uid, par_id=True)
+    return jsonify(data), 200
+
+
+@api.route("/universites/<int:uid>/catalogue", methods=["GET"])
+@lecture_seule
+@delai_requetes(DELAI_LISTE_MS)
+@reponse_versionnee(*TABLES_CATALOGUE)
+def get_catalogue(uid):
+    """Arbre filières → matières d'une université, avec nombre de documents
+    approuvés et date du dernier ajout par nœud (filtrable par niveau)."""
+    niveau = request.args.get("niveau") or None
+    data = catalogue.catalogue(taxonomie.instantane(), uid, niveau)
+    if data is None:
+        abort(404)
     return jsonify(data), 200
 
 
@@ -101,21 +177,24 @@ def get_universite(uid):
 
 
 @api.route("/filieres", methods=["GET"])
+@lecture_seule
+@reponse_versionnee(*TABLES_TAXONOMIE, max_age=DUREE_REFERENTIEL)
 def get_filieres():
     """Lister les filières (filtrable par universite_id)."""
     universite_id = request.args.get("universite_id", type=int)
-    query = Filiere.query
-    if universite_id:
-        query = query.filter_by(universite_id=universite_id)
-    return jsonify([f.to_dict() for f in query.order_by(Filiere.nom).all()]), 200
+    return jsonify(taxonomie.instantane().filieres(universite_id=universite_id or None)), 200
 
 
 @api.route("/filieres/<int:fid>", methods=["GET"])
+@lecture_seule
+@reponse_versionnee(*TABLES_TAXONOMIE, max_age=DUREE_REFERENTIEL)
 def get_filiere(fid):
     """Détails d'une filière + ses matières."""
-    f = Filiere.query.get_or_404(fid)
-    data = f.to_dict()
-    data["matieres"] = [m.to_dict() for m in f.matieres]
+    referentiel = taxonomie.instantane()
+    data = referentiel.filiere(fid)
+    if data is None:
+        abort(404)
+    data["matieres"] = referentiel.matieres(filiere_id=fid, par_id=True)
     return jsonify(data), 200
 
 
@@ -125,29 +204,36 @@ def get_filiere(fid):
 
 
 @api.route("/matieres", methods=["GET"])
+@lecture_seule
+@reponse_versionnee(*TABLES_TAXONOMIE, max_age=DUREE_REFERENTIEL)
 def get_matieres():
     """Lister les matières (filtrable par filiere_id, niveau)."""
     filiere_id = request.args.get("filiere_id", type=int)
     niveau = request.args.get("niveau")
-    query = Matiere.query
-    if filiere_id:
-        query = query.filter_by(filiere_id=filiere_id)
-    if niveau:
-        query = query.filter_by(niveau=niveau)
-    return jsonify([m.to_dict() for m in query.order_by(Matiere.nom).all()]), 200
+    matieres = taxonomie.instantane().matieres(
+        filiere_id=filiere_id or None, niveau=niveau or None
+    )
+    return jsonify(matieres), 200
 
 
 @api.route("/matieres/<int:mid>", methods=["GET"])
+@lecture_seule
+@delai_requetes(DELAI_LISTE_MS)
+@reponse_versionnee(*TABLES_TAXONOMIE, "document")
 def get_matiere(mid):
-    """Détails d'une matière + ses documents."""
-    m = Matiere.query.get_or_404(mid)
-    data = m.to_dict()
+    """Détails d'une matière + ses documents (`fields` : champs des documents)."""
+    champs, error = lire_champs()
+    if error:
+        return error
+    data = taxonomie.instantane().matiere(mid)
+    if data is None:
+        abort(404)
     docs = (
-        Document.query.filter_by(matiere_id=m.id, statut="approuve")
+        preparer(Document.query.filter(Document.matiere_id == mid, DOCUMENT_APPROUVE), champs)
         .order_by(Document.created_at.desc())
         .all()
     )
-    data["documents"] = [d.to_dict() for d in docs]
+    data["documents"] = serialiser(docs, champs)
     return jsonify(data), 200
 
 
@@ -156,56 +242,127 @@ def get_matiere(mid):
 # ══════════════════════════════════════════════
 
 
-@api.route("/documents", methods=["GET"])
-def get_documents():
-    """Lister les documents approuvés avec filtres et pagination."""
+def _filtrer(query, modele):
+    """Filtres matiere_id, type, niveau, filiere_id, universite_id de la requête
+    courante, sur les colonnes `matiere_id` / `type` de `modele`."""
     matiere_id = request.args.get("matiere_id", type=int)
     type_doc = request.args.get("type")
     niveau = request.args.get("niveau")
     universite_id = request.args.get("universite_id", type=int)
     filiere_id = request.args.get("filiere_id", type=int)
-    page = request.args.get("page", 1, type=int)
-    per_page = request.args.get("per_page", 20, type=int)
-
-    query = Document.query.filter(Document.statut == "approuve")
 
     if matiere_id:
-        query = query.filter(Document.matiere_id == matiere_id)
+        query = query.filter(modele.matiere_id == matiere_id)
     if type_doc:
-        query = query.filter(Document.type == type_doc)
+        query = query.filter(modele.type == type_doc)
 
-    # Filtres nécessitant un join sur Matière / Filière
+    # Filtres sur le référentiel : résolus en ids de matières, sans jointure
     if niveau or filiere_id or universite_id:
-        query = query.join(Matiere)
-        if niveau:
-            query = query.filter(Matiere.niveau == niveau)
-        if filiere_id:
-            query = query.filter(Matiere.filiere_id == filiere_id)
-        if universite_id:
-            query = query.join(Filiere).filter(
-                Filiere.universite_id == universite_id
-            )
-
-    pagination = query.order_by(Document.created_at.desc()).paginate(
-        page=page, per_page=per_page, error_out=False
+        ids = taxonomie.instantane().ids_matieres(
+            universite_id=universite_id or None,
+            filiere_id=filiere_id or None,
+            niveau=niveau or None,
+        )
+        query = query.filter(modele.matiere_id.in_(ids))
+    return query
+
+
+@api.route("/documents", methods=["GET"])
+@lecture_seule
+@delai_requetes(DELAI_LISTE_MS)
+@reponse_versionnee(*TABLES_TAXONOMIE, "document")
+def get_documents():
+    """Lister les documents approuvés avec filtres et pagination.
+
+    `fields=id,titre,…` : ne lire et ne renvoyer que ces champs.
+    """
+    params, error = lire_parametres()
+    if error:
+        return error
+    champs, error = lire_champs()
+    if error:
+        return error
+
+    query = Document.query.filter(DOCUMENT_APPROUVE)
+    query = _filtrer(query, Document)
+    query = query.order_by(Document.created_at.desc(), Document.id.desc())
+    documents, meta = paginer(preparer(query, champs), params)
+    return jsonify({"documents": serialiser(documents, champs), **meta}), 200
+
+
+def _classement(colonne, valeur):
+    """Documents approuvés dans l'ordre décroissant de `colonne` (table
+    `classement`), mêmes filtres que /documents ; `score` : `valeur(ligne)`.
+
+    La page d'identifiants est lue seule, dans l'ordre de l'index de
+    `classement` ; les documents sont ensuite chargés par clé primaire (une
+    jointure de plus dans la première requête, celle de l'auteur, suffit à
+    faire préférer à SQLite un parcours de `document` suivi d'un tri).
+    Pas de total par défaut (`total=aucun`) : un COUNT parcourrait toute la
+    jointure, là où la page n'est qu'une lecture d'index.
+    """
+    params, error = lire_parametres(total_defaut="aucun")
+    if error:
+        return error
+    if params.curseur:
+        return jsonify({"error": "Pagination par curseur indisponible pour les classements"}), 400
+    champs, error = lire_champs(supplementaires=("score",))
+    if error:
+        return error
+
+    rangs = (
+        Document.query.with_entities(Document.id, colonne.label("score"))
+        .join(Classement, Classement.document_id == Document.id)
+        .filter(DOCUMENT_APPROUVE, colonne.isnot(None))
+    )
+    rangs = _filtrer(rangs, Classement)
+    rangs = rangs.order_by(colonne.desc(), Classement.document_id.desc())
+    page, meta = paginer(rangs, params)
+
+    scores = {ligne.id: ligne.score for ligne in page}
+    rang = {document_id: i for i, document_id in enumerate(scores)}
+    documents = preparer(Document.query.filter(Document.id.in_(scores)), champs).all()
+    documents.sort(key=lambda d: rang[d.id])
+    resultats = serialiser(documents, champs)
+    if champs is None or "score" in champs:
+        for document, resultat in zip(documents, resultats):
+            resultat["score"] = valeur(scores[document.id])
+    return jsonify({"documents": resultats, **meta}), 200
+
+
+@api.route("/documents/tendances", methods=["GET"])
+@lecture_seule
+@delai_requetes(DELAI_LISTE_MS)
+@reponse_versionnee(*TABLES_TAXONOMIE, "document", "classement")
+def get_tendances():
+    """Documents les plus actifs récemment (téléchargements et votes, avec
+    décroissance temporelle). `score` : activité pondérée à la date de la
+    dernière actualisation des classements."""
+    _, reference = g.versions_donnees["classement"]
+    reference = reference or maintenant_utc()
+    lam = classements.decroissance(current_app.config)
+    return _classement(
+        Classement.score_tendance,
+        lambda score: round(classements.tendance_a(score, reference, lam), 3),
     )
 
-    return jsonify(
-        {
-            "documents": [d.to_dict() for d in pagination.items],
-            "total": pagination.total,
-            "page": pagination.page,
-            "pages": pagination.pages,
-            "per_page": per_page,
-        }
-    ), 200
+
+@api.route("/documents/mieux-notes", methods=["GET"])
+@lecture_seule
+@delai_requetes(DELAI_LISTE_MS)
+@reponse_versionnee(*TABLES_TAXONOMIE, "document", "classement")
+def get_mieux_notes():
+    """Documents les mieux notés ; `score` : moyenne bayésienne des notes."""
+    return _classement(Classement.note_bayesienne, lambda note: round(note, 2))
 
 
 @api.route("/documents/<int:did>", methods=["GET"])
+@lecture_seule
+@reponse_versionnee(*TABLES_TAXONOMIE, "document")
 def get_document(did):
     """Détails d'un document."""
-    d = Document.query.get_or_404(did)
-    return jsonify(d.to_dict()), 200
+    d = avec_relations(Document.query).filter(Document.id == did).first_or_404()
+    return jsonify(documents_to_dict([d])[0]), 200
 
 
 @api.route("/documents", methods=["POST"])
@@ -226,54 +383,148 @@ def create_document(current_user):
     titre = request.form.get("titre")
     matiere_id = request.form.get("matiere_id", type=int)
     type_doc = request.form.get("type")
+    error = _valider_champs(titre, matiere_id, type_doc)
+    if error:
+        return error
+
+    # Sauvegarde fichier (dédupliqué par contenu)
+    chemin_tmp, sha256, taille = stockage.recevoir_flux(fichier.stream)
+    doc = _creer_document(
+        current_user,
+        fichier_nom=fichier.filename,
+        chemin_tmp=chemin_tmp,
+        sha256=sha256,
+        taille=taille,
+        titre=titre,
+        description=request.form.get("description", ""),
+        type_doc=type_doc,
+        annee_academique=request.form.get("annee_academique", ""),
+        matiere_id=matiere_id,
+    )
+    db.session.commit()
+    return jsonify(doc.to_dict()), 201
 
+
+def _valider_champs(titre, matiere_id, type_doc):
+    """Valider les métadonnées obligatoires d'un document ; renvoie l'erreur ou None."""
     if not titre or not matiere_id or not type_doc:
         return jsonify({"error": "Champs requis : titre, matiere_id, type"}), 400
+    if not isinstance(titre, str) or not isinstance(type_doc, str):
+        return jsonify({"error": "Champs 'titre' et 'type' : texte attendu"}), 400
+    if not isinstance(matiere_id, int) or isinstance(matiere_id, bool):
+        return jsonify({"error": "Champ 'matiere_id' : entier attendu"}), 400
 
-    types_valides = ("cours", "examen", "td", "tp", "expose")
-    if type_doc not in types_valides:
-        return jsonify({"error": f"Type invalide. Valeurs : {', '.join(types_valides)}"}), 400
+    if type_doc not in TYPES_DOCUMENT:
+        return jsonify({"error": f"Type invalide. Valeurs : {', '.join(TYPES_DOCUMENT)}"}), 400
+    if taxonomie.instantane().matiere(matiere_id) is None:
+        return jsonify({"error": "Matière introuvable"}), 404
+    return None
 
-    # Sauvegarde fichier
-    ext = fichier.filename.rsplit(".", 1)[1].lower()
-    nom_stockage = f"{uuid.uuid4().hex}.{ext}"
-    upload_dir = current_app.config["UPLOAD_FOLDER"]
-    os.makedirs(upload_dir, exist_ok=True)
-    chemin = os.path.join(upload_dir, nom_stockage)
-    fichier.save(chemin)
 
+def _creer_document(current_user, fichier_nom, chemin_tmp, sha256, taille, titre,
+                    description, type_doc, annee_academique, matiere_id):
+    """Stocker le fichier reçu (`chemin_tmp`) et ajouter son `Document` (sans commit)."""
     doc = Document(
         titre=titre,
-        description=request.form.get("description", ""),
+        description=description,
         type=type_doc,
-        fichier_nom=secure_filename(fichier.filename),
-        fichier_stockage=nom_stockage,
-        taille=os.path.getsize(chemin),
-        format=ext,
-        annee_academique=request.form.get("annee_academique", ""),
+        fichier_nom=secure_filename(fichier_nom),
+        fichier_stockage=stockage.enregistrer(chemin_tmp, sha256, taille),
+        fichier_sha256=sha256,
+        taille=taille,
+        format=fichier_nom.rsplit(".", 1)[1].lower(),
+        annee_academique=annee_academique,
         matiere_id=matiere_id,
         auteur_id=current_user.id,
         statut="approuve",  # auto-approuvé pour le MVP
     )
     db.session.add(doc)
-    db.session.commit()
-    return jsonify(doc.to_dict()), 201
+    traitements.planifier_traitements(doc)
+    return doc
+
+
+APERCU_MAX_AGE = 365 * 24 * 3600
+
+
+def _etag_fichier(doc):
+    """ETag fort : le SHA-256 du contenu (ou l'uuid des anciens fichiers)."""
+    return doc.fichier_sha256 or doc.fichier_stockage.rsplit(".", 1)[0]
+
+
+def _est_nouveau_telechargement():
+    """Un GET complet ou une plage commençant à l'octet 0 (pas une reprise)."""
+    if request.method != "GET":
+        return False
+    plage = request.range
+    return plage is None or plage.ranges[0][0] == 0
+
+
+def _reponse_accel_redirect(doc, etag):
+    """Déléguer l'envoi des octets à nginx (X-Accel-Redirect, Range compris)."""
+    prefixe = current_app.config["DOWNLOAD_ACCEL_REDIRECT"].rstrip("/")
+    resp = current_app.response_class(
+        mimetype=mimetypes.guess_type(doc.fichier_nom)[0] or "application/octet-stream"
+    )
+    resp.headers["X-Accel-Redirect"] = f"{prefixe}/{doc.fichier_stockage}"
+    resp.headers.set("Content-Disposition", "attachment", filename=doc.fichier_nom)
+    resp.set_etag(etag)
+    resp.cache_control.no_cache = True
+    return resp
 
 
 @api.route("/documents/<int:did>/download", methods=["GET"])
 def download_document(did):
-    """Télécharger le fichier d'un document."""
+    """Télécharger le fichier d'un document (Range / 206, ETag / 304)."""
     doc = Document.query.get_or_404(did)
-    doc.nb_telechargements += 1
-    db.session.commit()
+    etag = _etag_fichier(doc)
+
+    if request.if_none_match.contains_weak(etag):
+        resp = current_app.response_class(status=304)
+        resp.set_etag(etag)
+        return resp
+
+    if _est_nouveau_telechargement():
+        compteur_telechargements.incrementer(doc.id)
+
+    if current_app.config["DOWNLOAD_ACCEL_REDIRECT"]:
+        return _reponse_accel_redirect(doc, etag)
+
     return send_from_directory(
         current_app.config["UPLOAD_FOLDER"],
         doc.fichier_stockage,
         as_attachment=True,
         download_name=doc.fichier_nom,
+        etag=etag,
     )
 
 
+@api.route("/documents/<int:did>/apercu/<rendu>", methods=["GET"])
+def apercu_document(did, rendu):
+    """Aperçu JPEG d'un document (`miniature` ou `apercu`), sans compter de
+    téléchargement. 202 tant qu'il est en préparation."""
+    if rendu not in apercus.RENDUS:
+        abort(404)
+    doc = Document.query.get_or_404(did)
+    chemin = apercus.lire(doc, rendu)
+    if chemin is None:
+        if not apercus.en_preparation(doc):
+            abort(404)
+        resp = jsonify({"status": "en_preparation"})
+        resp.status_code = 202
+        resp.headers["Retry-After"] = "5"
+        resp.cache_control.no_store = True
+        return resp
+
+    # Nommé d'après le contenu du fichier : ne change jamais pour ce document
+    resp = send_file(
+        chemin, mimetype="image/jpeg", etag=f"{_etag_fichier(doc)}-{rendu}",
+        max_age=APERCU_MAX_AGE,
+    )
+    resp.cache_control.public = True
+    resp.cache_control.immutable = True
+    return resp
+
+
 @api.route("/documents/<int:did>", methods=["DELETE"])
 @token_required
 def delete_document(current_user, did):
@@ -282,16 +533,159 @@ def delete_document(current_user, did):
     if doc.auteur_id != current_user.id and current_user.role != "admin":
         return jsonify({"error": "Non autorisé"}), 403
 
-    # Supprimer le fichier physique
-    chemin = os.path.join(current_app.config["UPLOAD_FOLDER"], doc.fichier_stockage)
-    if os.path.exists(chemin):
-        os.remove(chemin)
-
     db.session.delete(doc)
+    db.session.flush()  # la ligne `fichier` est référencée par le document
+    # Retirer la référence au fichier (supprimé avec la dernière, au commit)
+    stockage.supprimer_fichier_document(doc)
     db.session.commit()
     return jsonify({"message": "Document supprimé"}), 200
 
 
+# ══════════════════════════════════════════════
+#  UPLOAD PAR MORCEAUX (reprise possible)
+# ══════════════════════════════════════════════
+
+
+def _session_upload(current_user, sid):
+    """Session d'upload de l'utilisateur courant ; renvoie (session, erreur)."""
+    upload = db.session.get(SessionUpload, sid)
+    if upload is None or upload.utilisateur_id != current_user.id:
+        return None, (jsonify({"error": "Session d'upload introuvable"}), 404)
+    if uploads.est_expiree(upload):
+        uploads.supprimer_session(upload)
+        db.session.commit()
+        return None, (jsonify({"error": "Session d'upload expirée"}), 410)
+    return upload, None
+
+
+def _etat_upload(upload):
+    data = upload.to_dict()
+    data["expire_le"] = uploads.expiration(upload)
+    return data
+
+
+@api.route("/uploads", methods=["POST"])
+@token_required
+def init_upload(current_user):
+    """Ouvrir une session d'upload : métadonnées du document + taille du fichier."""
+    data = request.get_json() or {}
+    fichier_nom = data.get("fichier_nom") or ""
+    taille = data.get("taille")
+
+    if not _allowed_file(fichier_nom):
+        extensions = ", ".join(current_app.config["ALLOWED_EXTENSIONS"])
+        return jsonify({"error": f"Format non autorisé. Formats acceptés : {extensions}"}), 400
+    if not isinstance(taille, int) or isinstance(taille, bool) or taille <= 0:
+        return jsonify({"error": "Champ 'taille' requis (entier positif, en octets)"}), 400
+    if taille > current_app.config["MAX_UPLOAD_SIZE"]:
+        return jsonify({"error": "Fichier trop volumineux"}), 413
+
+    matiere_id = data.get("matiere_id")
+    error = _valider_champs(data.get("titre"), matiere_id, data.get("type"))
+    if error:
+        return error
+    if not all(isinstance(data.get(c, ""), str) for c in ("description", "annee_academique")):
+        return jsonify({"error": "Champs 'description' et 'annee_academique' : texte attendu"}), 400
+    sha256 = data.get("sha256") or None
+    if sha256 is not None and not (isinstance(sha256, str) and SHA256_HEX.fullmatch(sha256)):
+        return jsonify({"error": "Champ 'sha256' : 64 caractères hexadécimaux attendus"}), 400
+
+    upload = SessionUpload(
+        id=uuid.uuid4().hex,
+        utilisateur_id=current_user.id,
+        fichier_nom=fichier_nom,
+        format=fichier_nom.rsplit(".", 1)[1].lower(),
+        taille_totale=taille,
+        sha256_attendu=sha256.lower() if sha256 else None,
+        titre=data["titre"],
+        description=data.get("description", ""),
+        type=data["type"],
+        annee_academique=data.get("annee_academique", ""),
+        matiere_id=matiere_id,
+    )
+    uploads.creer_fichier_partiel(upload.id)
+    db.session.add(upload)
+    db.session.commit()
+    return jsonify(_etat_upload(upload)), 201
+
+
+@api.route("/uploads/<sid>", methods=["GET"])
+@token_required
+def get_upload(current_user, sid):
+    """État d'une session : `recu` est l'offset à partir duquel reprendre."""
+    upload, error = _session_upload(current_user, sid)
+    if error:
+        return error
+    return jsonify(_etat_upload(upload)), 200
+
+
+@api.route("/uploads/<sid>", methods=["PUT"])
+@token_required
+def put_upload_chunk(current_user, sid):
+    """Envoyer un morceau (corps brut) à la position `offset`."""
+    upload, error = _session_upload(current_user, sid)
+    if error:
+        return error
+
+    offset = request.args.get("offset", type=int)
+    if offset is None:
+        return jsonify({"error": "Paramètre 'offset' requis"}), 400
+
+    try:
+        uploads.ecrire_morceau(upload, offset, request.stream)
+    except uploads.MorceauInvalide as exc:
+        db.session.rollback()
+        return jsonify({"error": str(exc), "recu": upload.recu}), exc.status
+    return jsonify(_etat_upload(upload)), 200
+
+
+@api.route("/uploads/<sid>/finalize", methods=["POST"])
+@token_required
+def finalize_upload(current_user, sid):
+    """Transformer une session complète en document."""
+    upload, error = _session_upload(current_user, sid)
+    if error:
+        return error
+    if upload.recu != upload.taille_totale:
+        return jsonify({"error": "Upload incomplet", "recu": upload.recu}), 409
+
+    sha256 = uploads.sha256_final(upload)
+    if upload.sha256_attendu and upload.sha256_attendu != sha256:
+        uploads.supprimer_session(upload)
+        db.session.commit()
+        return jsonify({"error": "Somme de contrôle SHA-256 incorrecte"}), 422
+
+    doc = _creer_document(
+        current_user,
+        fichier_nom=upload.fichier_nom,
+        chemin_tmp=uploads.chemin_partiel(upload.id),
+        sha256=sha256,
+        taille=upload.taille_totale,
+        titre=upload.titre,
+        description=upload.description,
+        type_doc=upload.type,
+        annee_academique=upload.annee_academique,
+        matiere_id=upload.matiere_id,
+    )
+    uploads.supprimer_session(upload)
+    db.session.commit()
+    data = doc.to_dict()
+    data["sha256"] = sha256
+    return jsonify(data), 201
+
+
+@api.route("/uploads/<sid>", methods=["DELETE"])
+@token_required
+def abort_upload(current_user, sid):
+    """Abandonner une session d'upload."""
+    upload, error = _session_upload(current_user, sid)
+    if error:
+        return error
+    uploads.supprimer_session(upload)
+    db.session.commit()
+    return jsonify({"message": "Session d'upload supprimée"}), 200
+
+
 # ══════════════════════════════════════════════
 #  VOTES / NOTATION
 # ══════════════════════════════════════════════
@@ -308,18 +702,7 @@ def vote_document(current_user, did):
     if note is None or not isinstance(note, int) or note < 1 or note > 5:
         return jsonify({"error": "Note requise (entier entre 1 et 5)"}), 400
 
-    vote = Vote.query.filter_by(
-        document_id=did, utilisateur_id=current_user.id
-    ).first()
-
-    if vote:
-        vote.note = note  # mise à jour
-    else:
-        vote = Vote(
-            document_id=did, utilisateur_id=current_user.id, note=note
-        )
-        db.session.add(vote)
-
+    vote = enregistrer_vote(did, current_user.id, note)
     db.session.commit()
     return jsonify({"note_moyenne": doc.note_moyenne, "vote": vote.to_dict()}), 200
 
@@ -330,59 +713,91 @@ def vote_document(current_user, did):
 
 
 @api.route("/search", methods=["GET"])
+@lecture_seule
+@delai_requetes(DELAI_RECHERCHE_MS)
+@reponse_versionnee(*TABLES_TAXONOMIE, "document", "document_texte")
 def search_documents():
-    """Recherche de documents par mot-clé (titre, description, matière)."""
+    """Recherche plein texte (titre, description, matière, contenu du fichier),
+    triée par pertinence ou date ; `extrait` surligne les mots dans le contenu.
+    `fields` comme pour /documents (plus `extrait`)."""
     q = request.args.get("q", "").strip()
     if not q:
         return jsonify({"error": "Paramètre 'q' requis"}), 400
 
-    page = request.args.get("page", 1, type=int)
-    per_page = request.args.get("per_page", 20, type=int)
     type_doc = request.args.get("type")
-
-    query = (
-        Document.query.join(Matiere)
-        .filter(
-            Document.statut == "approuve",
-            db.or_(
-                Document.titre.ilike(f"%{q}%"),
-                Document.description.ilike(f"%{q}%"),
-                Matiere.nom.ilike(f"%{q}%"),
-            ),
-        )
-    )
-
+    tri = request.args.get("tri", "pertinence")
+    if tri not in TRIS:
+        return jsonify({"error": f"Tri invalide. Valeurs : {', '.join(TRIS)}"}), 400
+    params, error = lire_parametres()
+    if error:
+        return error
+    if params.curseur and tri != "date":
+        return jsonify({"error": "La pagination par curseur requiert tri=date"}), 400
+    champs, error = lire_champs(supplementaires=("extrait",))
+    if error:
+        return error
+
+    query = Document.query.filter(DOCUMENT_APPROUVE)
     if type_doc:
         query = query.filter(Document.type == type_doc)
 
-    pagination = query.order_by(Document.created_at.desc()).paginate(
-        page=page, per_page=per_page, error_out=False
+    documents, meta = paginer(
+        preparer(rechercher(query, q, tri), champs), params, ordonne=tri == "date"
     )
+    resultats = serialiser(documents, champs)
+    if champs is None or "extrait" in champs:
+        passages = extraits([d.id for d in documents], q)
+        for document, resultat in zip(documents, resultats):
+            resultat["extrait"] = passages.get(document.id)
+    return jsonify({"documents": resultats, **meta}), 200
+
 
+# ══════════════════════════════════════════════
+#  ADMINISTRATION
+# ══════════════════════════════════════════════
+
+
+@api.route("/admin/metriques", methods=["GET"])
+@admin_required
+def get_metriques(current_user):
+    """Métriques internes du processus (caches, pools de connexions)."""
     return jsonify(
         {
-            "documents": [d.to_dict() for d in pagination.items],
-            "total": pagination.total,
-            "page": pagination.page,
-            "pages": pagination.pages,
+            "cache_auth": current_app.extensions["cache_principaux"].statistiques(),
+            "pools_bd": connexions.statistiques(),
+            "replica": replicas.statistiques(),
         }
     ), 200
 
 
+@api.route("/admin/taches", methods=["GET"])
+@admin_required
+def get_taches(current_user):
+    """État de la file de tâches et derniers échecs définitifs."""
+    echecs = (
+        Tache.query.filter_by(etat="echouee")
+        .order_by(Tache.updated_at.desc())
+        .limit(50)
+        .all()
+    )
+    return jsonify(
+        {"files": taches.statistiques(), "echecs": [t.to_dict() for t in echecs]}
+    ), 200
+
+
 # ══════════════════════════════════════════════
 #  STATISTIQUES (bonus)
 # ══════════════════════════════════════════════
 
 
 @api.route("/stats", methods=["GET"])
+@lecture_seule
+@delai_requetes(DELAI_LISTE_MS)
 def get_stats():
-    """Statistiques globales de la plateforme."""
-    return jsonify(
-        {
-            "universites": Universite.query.count(),
-            "filieres": Filiere.query.count(),
-            "matieres": Matiere.query.count(),
-            "documents": Document.query.filter_by(statut="approuve").count(),
-            "utilisateurs": Utilisateur.query.count(),
-        }
-    ), 200
+    """Statistiques globales de la plateforme (instantané matérialisé)."""
+    instantane = statistiques.instantane()
+    response = jsonify(statistiques.en_dict(instantane))
+    response.set_etag(etag_versions(dict(zip(TABLES_STATS, instantane.versions))), weak=True)
+    response.cache_control.public = True
+    response.cache_control.max_age = DUREE_STATS
+    return response.make_conditional(request)
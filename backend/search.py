@@ -0,0 +1,321 @@
+"""Recherche plein texte — PostgreSQL (tsvector + GIN) ou SQLite (FTS5).
+
+PostgreSQL : colonne `document.search_vector` maintenue par trigger, indexée
+en GIN, configuration `french_unaccent` (racinisation française + unaccent).
+SQLite (tests) : table virtuelle FTS5 `document_fts` maintenue par triggers,
+tokenizer unicode61 sans diacritiques.
+
+Le texte extrait des fichiers (cf. extraction) a son propre index, écrit par
+`indexer_contenu` : `document_texte.search_vector` (PostgreSQL) ou la table
+FTS5 `document_texte_fts` (SQLite). Un document correspond à la recherche si
+tous les mots figurent dans ses métadonnées ou tous dans son contenu.
+
+Les mêmes objets DDL sont installés par `db.create_all()` (dev, tests) et par
+la migration `0003_recherche_plein_texte` (production).
+"""
+import re
+import unicodedata
+import zlib
+
+from sqlalchemy import DDL, event
+
+from models import db, Document, DocumentTexte
+
+TRIS = ("pertinence", "date")
+
+# ──────────────────────────────────────────────
+#  DDL PostgreSQL
+# ──────────────────────────────────────────────
+PG_DDL = [
+    "CREATE EXTENSION IF NOT EXISTS unaccent",
+    """
+    DO $$
+    BEGIN
+        IF NOT EXISTS (SELECT 1 FROM pg_ts_config WHERE cfgname = 'french_unaccent') THEN
+            CREATE TEXT SEARCH CONFIGURATION french_unaccent (COPY = french);
+            ALTER TEXT SEARCH CONFIGURATION french_unaccent
+                ALTER MAPPING FOR hword, hword_part, word WITH unaccent, french_stem;
+        END IF;
+    END
+    $$
+    """,
+    "ALTER TABLE document ADD COLUMN IF NOT EXISTS search_vector tsvector",
+    "CREATE INDEX IF NOT EXISTS ix_document_search_vector ON document USING gin (search_vector)",
+    """
+    CREATE OR REPLACE FUNCTION document_search_vector_maj() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector :=
+            setweight(to_tsvector('french_unaccent', coalesce(NEW.titre, '')), 'A') ||
+            setweight(to_tsvector('french_unaccent', coalesce(
+                (SELECT nom FROM matiere WHERE id = NEW.matiere_id), '')), 'B') ||
+            setweight(to_tsvector('french_unaccent', coalesce(NEW.description, '')), 'C');
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE OR REPLACE TRIGGER document_search_vector_trg
+        BEFORE INSERT OR UPDATE OF titre, description, matiere_id ON document
+        FOR EACH ROW EXECUTE FUNCTION document_search_vector_maj()
+    """,
+    """
+    CREATE OR REPLACE FUNCTION matiere_search_vector_maj() RETURNS trigger AS $$
+    BEGIN
+        -- Recalcul via le trigger document (UPDATE OF titre)
+        UPDATE document SET titre = titre WHERE matiere_id = NEW.id;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE OR REPLACE TRIGGER matiere_search_vector_trg
+        AFTER UPDATE OF nom ON matiere
+        FOR EACH ROW WHEN (OLD.nom IS DISTINCT FROM NEW.nom)
+        EXECUTE FUNCTION matiere_search_vector_maj()
+    """,
+    "UPDATE document SET titre = titre WHERE search_vector IS NULL",
+    "ALTER TABLE document_texte ADD COLUMN IF NOT EXISTS search_vector tsvector",
+    "CREATE INDEX IF NOT EXISTS ix_document_texte_search_vector "
+    "ON document_texte USING gin (search_vector)",
+]
+
+# ──────────────────────────────────────────────
+#  DDL SQLite (FTS5)
+# ──────────────────────────────────────────────
+_SQLITE_INSERT_FTS = """
+        INSERT INTO document_fts (rowid, titre, matiere, description)
+        VALUES (
+            new.id, new.titre,
+            coalesce((SELECT nom FROM matiere WHERE id = new.matiere_id), ''),
+            coalesce(new.description, '')
+        );
+"""
+
+SQLITE_DDL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS document_fts
+    USING fts5(titre, matiere, description, tokenize = 'unicode61 remove_diacritics 2')
+    """,
+    "CREATE TRIGGER IF NOT EXISTS document_fts_ai AFTER INSERT ON document BEGIN"
+    + _SQLITE_INSERT_FTS
+    + "END",
+    "CREATE TRIGGER IF NOT EXISTS document_fts_au "
+    "AFTER UPDATE OF titre, description, matiere_id ON document BEGIN "
+    "DELETE FROM document_fts WHERE rowid = old.id;"
+    + _SQLITE_INSERT_FTS
+    + "END",
+    """
+    CREATE TRIGGER IF NOT EXISTS document_fts_ad AFTER DELETE ON document BEGIN
+        DELETE FROM document_fts WHERE rowid = old.id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS matiere_fts_au AFTER UPDATE OF nom ON matiere BEGIN
+        UPDATE document_fts SET matiere = new.nom
+        WHERE rowid IN (SELECT id FROM document WHERE matiere_id = new.id);
+    END
+    """,
+    """
+    INSERT INTO document_fts (rowid, titre, matiere, description)
+    SELECT d.id, d.titre, m.nom, coalesce(d.description, '')
+    FROM document d JOIN matiere m ON m.id = d.matiere_id
+    WHERE d.id NOT IN (SELECT rowid FROM document_fts)
+    """,
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS document_texte_fts
+    USING fts5(contenu, tokenize = 'unicode61 remove_diacritics 2')
+    """,
+    # Clés étrangères non appliquées par SQLite : nettoyage explicite
+    """
+    CREATE TRIGGER IF NOT EXISTS document_texte_ad AFTER DELETE ON document BEGIN
+        DELETE FROM document_texte WHERE document_id = old.id;
+        DELETE FROM document_texte_fts WHERE rowid = old.id;
+    END
+    """,
+]
+
+for _sql in PG_DDL:
+    event.listen(db.metadata, "after_create", DDL(_sql).execute_if(dialect="postgresql"))
+for _sql in SQLITE_DDL:
+    event.listen(db.metadata, "after_create", DDL(_sql).execute_if(dialect="sqlite"))
+for _table in ("document_fts", "document_texte_fts"):
+    event.listen(
+        db.metadata,
+        "before_drop",
+        DDL(f"DROP TABLE IF EXISTS {_table}").execute_if(dialect="sqlite"),
+    )
+
+
+# ──────────────────────────────────────────────
+#  INDEX DU CONTENU
+# ──────────────────────────────────────────────
+def indexer_contenu(document_id, texte):
+    """(Ré)indexer le texte extrait d'un document (sans commit)."""
+    if db.session.get_bind().dialect.name == "postgresql":
+        db.session.execute(
+            db.text(
+                "UPDATE document_texte SET search_vector = "
+                "setweight(to_tsvector('french_unaccent', :texte), 'D') "
+                "WHERE document_id = :id"
+            ),
+            {"texte": texte, "id": document_id},
+        )
+    else:
+        db.session.execute(
+            db.text("DELETE FROM document_texte_fts WHERE rowid = :id"), {"id": document_id}
+        )
+        db.session.execute(
+            db.text("INSERT INTO document_texte_fts (rowid, contenu) VALUES (:id, :texte)"),
+            {"texte": texte, "id": document_id},
+        )
+
+
+# ──────────────────────────────────────────────
+#  REQUÊTES
+# ──────────────────────────────────────────────
+def _termes(q):
+    """Découper la saisie en mots (lettres/chiffres uniquement)."""
+    return re.findall(r"\w+", q.lower())
+
+
+# Poids du contenu des fichiers face aux métadonnées dans la pertinence
+POIDS_CONTENU = 0.2
+
+
+def _correspondances_postgresql(termes):
+    tsquery = db.func.to_tsquery(
+        "french_unaccent", " & ".join(f"{t}:*" for t in termes)
+    )
+    vecteur = db.literal_column("document.search_vector")
+    contenu = db.literal_column("document_texte.search_vector")
+    return (
+        db.select(Document.id.label("id"), db.func.ts_rank_cd(vecteur, tsquery).label("rang"))
+        .where(vecteur.op("@@")(tsquery)),
+        db.select(
+            DocumentTexte.document_id,
+            db.func.ts_rank_cd(contenu, tsquery) * POIDS_CONTENU,
+        ).where(contenu.op("@@")(tsquery)),
+    )
+
+
+def _correspondances_sqlite(termes):
+    expression = " ".join(f'"{t}"*' for t in termes)
+
+    def correspondances(nom, rang):
+        fts = db.literal_column(nom)
+        return (
+            db.select(db.literal_column("rowid").label("id"), rang.label("rang"))
+            .select_from(db.table(nom))
+            .where(fts.op("MATCH")(expression))
+        )
+
+    # bm25 : plus petit = plus pertinent ; poids titre > matière > description
+    return (
+        correspondances(
+            "document_fts", -db.func.bm25(db.literal_column("document_fts"), 10.0, 5.0, 1.0)
+        ),
+        correspondances(
+            "document_texte_fts",
+            -db.func.bm25(db.literal_column("document_texte_fts")) * POIDS_CONTENU,
+        ),
+    )
+
+
+def rechercher(query, q, tri="pertinence"):
+    """Restreindre une requête sur `Document` aux résultats de `q`, triés.
+
+    Chaque mot de `q` doit apparaître (préfixe accepté) dans le titre, la
+    description ou le nom de la matière — ou bien, chacun, dans le texte du
+    fichier. `tri` vaut "pertinence" ou "date" ; l'ordre par date
+    décroissante sert aussi de départage.
+    """
+    termes = _termes(q)
+    if not termes:
+        return query.filter(db.false())
+
+    if db.session.get_bind().dialect.name == "postgresql":
+        metadonnees, contenu = _correspondances_postgresql(termes)
+    else:
+        metadonnees, contenu = _correspondances_sqlite(termes)
+    union = db.union_all(metadonnees, contenu).subquery()
+    scores = (
+        db.select(union.c.id, db.func.sum(union.c.rang).label("rang"))
+        .group_by(union.c.id)
+        .subquery()
+    )
+    query = query.join(scores, scores.c.id == Document.id)
+    if tri == "pertinence":
+        query = query.order_by(scores.c.rang.desc())
+    return query.order_by(Document.created_at.desc(), Document.id.desc())
+
+
+# ──────────────────────────────────────────────
+#  EXTRAITS
+# ──────────────────────────────────────────────
+LARGEUR_EXTRAIT = 200
+
+_VARIANTES = {
+    base: f"[{base}{accents}]"
+    for base, accents in (
+        ("a", "àâäáãå"), ("c", "ç"), ("e", "éèêë"), ("i", "îïíì"), ("n", "ñ"),
+        ("o", "ôöóòõ"), ("u", "ùûüú"), ("y", "ÿý"),
+    )
+}
+
+
+def _sans_accents(mot):
+    return "".join(
+        c for c in unicodedata.normalize("NFD", mot) if not unicodedata.combining(c)
+    )
+
+
+def _motif(termes):
+    """Mots commençant par l'un des termes, sans tenir compte des accents."""
+    alternatives = (
+        "".join(_VARIANTES.get(c, re.escape(c)) for c in _sans_accents(t))
+        for t in termes
+    )
+    return re.compile(r"\b(?:" + "|".join(alternatives) + r")\w*", re.IGNORECASE)
+
+
+def extrait(texte, termes, largeur=LARGEUR_EXTRAIT):
+    """Passage de `texte` autour de la première occurrence d'un terme.
+
+    Renvoie {"texte": …, "surlignages": [[début, fin], …]} (positions dans
+    le passage) ou None si aucun terme n'apparaît.
+    """
+    motif = _motif(termes)
+    premier = motif.search(texte)
+    if premier is None:
+        return None
+    debut = max(0, premier.start() - largeur // 3)
+    if debut:
+        espace = texte.find(" ", debut, premier.start())
+        debut = espace + 1 if espace != -1 else debut
+    fin = min(len(texte), debut + largeur)
+    if fin < len(texte):
+        espace = texte.rfind(" ", premier.end(), fin)
+        fin = espace if espace != -1 else fin
+    passage = " ".join(texte[debut:fin].split())
+    passage = ("… " if debut else "") + passage + (" …" if fin < len(texte) else "")
+    return {
+        "texte": passage,
+        "surlignages": [[m.start(), m.end()] for m in motif.finditer(passage)],
+    }
+
+
+def extraits(documents_ids, q):
+    """{document_id: extrait} du texte des fichiers, pour une page de résultats."""
+    termes = _termes(q)
+    if not documents_ids or not termes:
+        return {}
+    textes = db.session.execute(
+        db.select(DocumentTexte.document_id, DocumentTexte.contenu)
+        .where(DocumentTexte.document_id.in_(documents_ids))
+    )
+    resultat = {}
+    for document_id, contenu in textes:
+        passage = extrait(zlib.decompress(contenu).decode("utf-8"), termes)
+        if passage is not None:
+            resultat[document_id] = passage
+    return resultat
@@ -0,0 +1,125 @@
+"""Sérialisation des listes de documents — nombre de requêtes constant par page.
+
+Deux chemins :
+- entités complètes (`avec_relations` + `documents_to_dict`), même forme
+  JSON que `Document.to_dict` ;
+- champs choisis par le client (`fields=id,titre,type,note_moyenne`) :
+  `projeter` ne sélectionne que les colonnes utiles (sans charger d'entités
+  ni la colonne `description` si elle n'est pas demandée) et
+  `lignes_to_dict` ne sérialise que ces clés.
+"""
+from flask import jsonify, request
+from sqlalchemy.orm import joinedload
+
+from models import Document, Utilisateur
+import taxonomie
+
+
+def avec_relations(query):
+    """Précharger l'auteur dans la requête de la page (JOIN).
+
+    Le nom de la matière vient de l'instantané du référentiel.
+    """
+    return query.options(joinedload(Document.auteur))
+
+
+def documents_to_dict(documents):
+    """Sérialiser une page de documents (même forme JSON que `to_dict`).
+
+    L'auteur doit avoir été chargé via `avec_relations` ; la note moyenne
+    est lue sur les agrégats dénormalisés `vote_count`/`vote_sum`.
+    """
+    referentiel = taxonomie.instantane()
+    return [d.to_dict(matiere=referentiel.nom_matiere(d.matiere_id)) for d in documents]
+
+
+# ──────────────────────────────────────────────
+#  CHAMPS CHOISIS (fields=…)
+# ──────────────────────────────────────────────
+# Champ sérialisé -> colonnes lues, dans l'ordre de `Document.to_dict`
+COLONNES = {
+    "id": (Document.id,),
+    "titre": (Document.titre,),
+    "description": (Document.description,),
+    "type": (Document.type,),
+    "fichier_nom": (Document.fichier_nom,),
+    "taille": (Document.taille,),
+    "format": (Document.format,),
+    "annee_academique": (Document.annee_academique,),
+    "matiere_id": (Document.matiere_id,),
+    "matiere": (Document.matiere_id,),
+    "auteur_id": (Document.auteur_id,),
+    "auteur": (
+        Utilisateur.prenom.label("auteur_prenom"),
+        Utilisateur.nom.label("auteur_nom"),
+    ),
+    "nb_telechargements": (Document.nb_telechargements,),
+    "note_moyenne": (Document.vote_count, Document.vote_sum),
+    "statut": (Document.statut,),
+    "statut_traitement": (Document.statut_traitement,),
+    "created_at": (Document.created_at,),
+}
+# Toujours lues : identité et position du curseur (`encoder_curseur`)
+COLONNES_TOUJOURS = (Document.id, Document.created_at)
+
+
+def lire_champs(supplementaires=()):
+    """Lire `fields` dans la requête courante.
+
+    Renvoie (champs, None) — champs None si le paramètre est absent — ou
+    (None, réponse d'erreur 400). `supplementaires` : champs propres à la
+    route, calculés hors de la requête SQL (ex. `extrait`).
+    """
+    brut = request.args.get("fields")
+    if brut is None:
+        return None, None
+    champs = [c.strip() for c in brut.split(",") if c.strip()]
+    inconnus = [c for c in champs if c not in COLONNES and c not in supplementaires]
+    if not champs or inconnus:
+        valeurs = ", ".join([*COLONNES, *supplementaires])
+        return None, (
+            jsonify({"error": f"Champs invalides : {', '.join(inconnus)}. Valeurs : {valeurs}"}),
+            400,
+        )
+    return tuple(dict.fromkeys(champs)), None
+
+
+def projeter(query, champs):
+    """Restreindre une requête sur `Document` aux colonnes de `champs`."""
+    colonnes = dict.fromkeys(COLONNES_TOUJOURS)
+    for champ in champs:
+        colonnes.update(dict.fromkeys(COLONNES.get(champ, ())))
+    query = query.with_entities(*colonnes)
+    if "auteur" in champs:
+        query = query.outerjoin(Utilisateur, Utilisateur.id == Document.auteur_id)
+    return query
+
+
+def lignes_to_dict(lignes, champs):
+    """Sérialiser les lignes de `projeter` : seules les clés de `champs`."""
+    referentiel = taxonomie.instantane()
+    calculs = {
+        "matiere": lambda l: referentiel.nom_matiere(l.matiere_id),
+        "auteur": lambda l: f"{l.auteur_prenom} {l.auteur_nom}" if l.auteur_nom else None,
+        "note_moyenne": lambda l: Document.calculer_note(l.vote_count, l.vote_sum),
+    }
+    champs = [c for c in champs if c in COLONNES]
+    return [
+        {
+            champ: calculs[champ](ligne) if champ in calculs else getattr(ligne, champ)
+            for champ in champs
+        }
+        for ligne in lignes
+    ]
+
+
+def preparer(query, champs):
+    """Requête de la page : entités complètes, ou colonnes de `champs`."""
+    return avec_relations(query) if champs is None else projeter(query, champs)
+
+
+def serialiser(resultats, champs):
+    """Sérialiser le résultat d'une requête passée par `preparer`."""
+    if champs is None:
+        return documents_to_dict(resultats)
+    return lignes_to_dict(resultats, champs)
@@ -0,0 +1,116 @@
+"""Statistiques de la plateforme, matérialisées en mémoire.
+
+Un instantané (totaux + répartition des documents approuvés par type,
+université et niveau) est calculé en deux requêtes et resservi tel quel ;
+il est recalculé au plus toutes les `STATS_REFRESH_INTERVAL` secondes, et
+seulement si l'une des tables comptées a changé depuis (`version_donnees`).
+Pendant un recalcul, les autres requêtes continuent de recevoir l'ancien
+instantané. La réponse indique la date et l'âge de l'instantané ; son ETag est
+dérivé des versions de l'instantané servi, pas des versions courantes.
+"""
+import threading
+import time
+from collections import Counter, namedtuple
+
+from flask import current_app, g
+
+import taxonomie
+from models import db, Document, Filiere, Matiere, Universite, Utilisateur, maintenant_utc
+from versions import lire_versions
+
+TABLES_STATS = ("universite", "filiere", "matiere", "document", "utilisateur")
+
+InstantaneStats = namedtuple("InstantaneStats", "versions calcule_a genere_a donnees")
+
+
+def calculer():
+    """Totaux et répartitions, en deux requêtes."""
+    def compte(modele):
+        return db.select(db.func.count()).select_from(modele).scalar_subquery()
+
+    universites, filieres, matieres, utilisateurs = db.session.execute(
+        db.select(compte(Universite), compte(Filiere), compte(Matiere), compte(Utilisateur))
+    ).one()
+    lignes = db.session.execute(
+        db.select(Document.type, Document.matiere_id, db.func.count())
+        .where(Document.statut == "approuve")
+        .group_by(Document.type, Document.matiere_id)
+    ).all()
+
+    referentiel = taxonomie.instantane()
+    par_type, par_universite, par_niveau = Counter(), Counter(), Counter()
+    for type_doc, matiere_id, n in lignes:
+        par_type[type_doc] += n
+        matiere = referentiel.matiere(matiere_id)
+        if matiere is None:
+            continue
+        par_niveau[matiere["niveau"]] += n
+        par_universite[referentiel.filiere(matiere["filiere_id"])["universite_id"]] += n
+
+    return {
+        "universites": universites,
+        "filieres": filieres,
+        "matieres": matieres,
+        "documents": sum(par_type.values()),
+        "utilisateurs": utilisateurs,
+        "documents_par_type": dict(par_type),
+        "documents_par_niveau": dict(sorted(par_niveau.items())),
+        "documents_par_universite": [
+            {"id": u["id"], "sigle": u["sigle"], "nb_documents": par_universite[u["id"]]}
+            for u in referentiel.universites()
+        ],
+    }
+
+
+class Statistiques:
+    """Instantané courant des statistiques d'une application."""
+
+    def __init__(self, intervalle=60.0):
+        self.intervalle = intervalle
+        self.calculs = 0
+        self._instantane = None
+        self._verrou = threading.Lock()
+
+    def _recalculer(self, versions):
+        self._instantane = InstantaneStats(
+            versions, time.monotonic(), maintenant_utc(), calculer()
+        )
+        self.calculs += 1
+
+    def lire(self):
+        """Instantané à servir (recalculé si périmé et si les données ont changé)."""
+        courantes = lire_versions(TABLES_STATS)
+        g.versions_donnees = courantes  # reprises par l'instantané du référentiel
+        versions = tuple(courantes[t][0] for t in TABLES_STATS)
+
+        actuel = self._instantane
+        if actuel is None:
+            with self._verrou:
+                if self._instantane is None:
+                    self._recalculer(versions)
+        elif (
+            actuel.versions != versions
+            and time.monotonic() - actuel.calcule_a >= self.intervalle
+            and self._verrou.acquire(blocking=False)
+        ):
+            try:
+                self._recalculer(versions)
+            finally:
+                self._verrou.release()
+        return self._instantane
+
+
+def init_app(app):
+    app.extensions["statistiques"] = Statistiques(app.config["STATS_REFRESH_INTERVAL"])
+
+
+def instantane():
+    return current_app.extensions["statistiques"].lire()
+
+
+def en_dict(instantane):
+    return {
+        **instantane.donnees,
+        "genere_a": instantane.genere_a,
+        "age_secondes": round(time.monotonic() - instantane.calcule_a, 1),
+    }
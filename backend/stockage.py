@@ -0,0 +1,254 @@
+"""Stockage des fichiers par contenu (SHA-256) avec comptage de références.
+
+Un fichier est rangé sous `UPLOAD_FOLDER/ab/cd/abcd…` (deux niveaux de
+répertoires tirés du préfixe du hash) ; la table `fichier` compte les
+documents qui le référencent. Un upload identique à un fichier existant ne
+fait qu'incrémenter le compteur ; le fichier est supprimé du disque quand la
+dernière référence disparaît.
+
+Ordre des opérations face à la concurrence : l'upload incrémente le compteur
+(upsert) *avant* de poser le fichier, la suppression met le fichier de côté
+(renommage sous `.tmp`) *avant* de valider sa transaction, et ne l'efface
+qu'après le commit ; un rollback le remet en place. L'upsert attend le verrou
+de ligne pris par une suppression en cours : le fichier posé par l'upload
+n'est donc jamais effacé par une suppression concurrente, et une ligne
+`fichier` validée désigne toujours des octets présents.
+
+L'inverse n'est pas garanti : un upload annulé après avoir posé son fichier
+laisse des octets sans ligne `fichier`. Ils sont supprimés par le balayage
+périodique (`balayer_orphelins`, toutes les `STORAGE_SWEEP_INTERVAL`
+secondes, ou `flask stockage balayer`), selon le même protocole qu'une
+suppression.
+"""
+import hashlib
+import os
+import re
+import uuid
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from models import db, Document, Fichier, insert_upsert
+from taches import gestionnaire, periodique
+
+TAILLE_BLOC = 64 * 1024
+HEX = re.compile(r"[0-9a-f]+")
+
+
+def chemin_relatif(sha256):
+    """Chemin du fichier relatif à UPLOAD_FOLDER (répertoires sharded)."""
+    return os.path.join(sha256[:2], sha256[2:4], sha256)
+
+
+def chemin_absolu(chemin):
+    return os.path.join(current_app.config["UPLOAD_FOLDER"], chemin)
+
+
+def _dossier_temporaire():
+    dossier = os.path.join(current_app.config["UPLOAD_FOLDER"], ".tmp")
+    os.makedirs(dossier, exist_ok=True)
+    return dossier
+
+
+def recevoir_flux(flux):
+    """Recopier un flux dans un fichier temporaire en le hachant.
+
+    Renvoie (chemin temporaire, sha256, taille) ; le fichier temporaire est
+    sur le même système de fichiers que le stockage (renommage atomique).
+    """
+    chemin_tmp = os.path.join(_dossier_temporaire(), uuid.uuid4().hex)
+    hachage = hashlib.sha256()
+    taille = 0
+    with open(chemin_tmp, "wb") as sortie:
+        for bloc in iter(lambda: flux.read(TAILLE_BLOC), b""):
+            hachage.update(bloc)
+            sortie.write(bloc)
+            taille += len(bloc)
+    return chemin_tmp, hachage.hexdigest(), taille
+
+
+def enregistrer(chemin_tmp, sha256, taille):
+    """Ajouter une référence au contenu `sha256` à partir d'un fichier temporaire.
+
+    Le fichier temporaire est consommé (déplacé ou supprimé). Renvoie le
+    chemin de stockage relatif. Ne commite pas.
+    """
+    insert = insert_upsert()
+    stmt = insert(Fichier).values(sha256=sha256, taille=taille, nb_references=1)
+    db.session.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[Fichier.sha256],
+            set_={"nb_references": Fichier.nb_references + 1},
+        )
+    )
+
+    chemin = chemin_relatif(sha256)
+    destination = chemin_absolu(chemin)
+    if os.path.exists(destination):
+        os.remove(chemin_tmp)  # doublon : les octets sont déjà stockés
+    else:
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+        os.replace(chemin_tmp, destination)
+    return chemin
+
+
+def liberer(sha256):
+    """Retirer une référence ; supprime le fichier avec la dernière. Ne commite pas."""
+    table = Fichier.__table__
+    restant = db.session.execute(
+        table.update()
+        .where(table.c.sha256 == sha256)
+        .values(nb_references=table.c.nb_references - 1)
+        .returning(table.c.nb_references)
+    ).scalar()
+    if restant is None or restant > 0:
+        return
+    db.session.execute(
+        table.delete().where(table.c.sha256 == sha256, table.c.nb_references <= 0)
+    )
+    supprimer_apres_commit(chemin_absolu(chemin_relatif(sha256)))
+
+
+def supprimer_fichier_document(doc):
+    """Libérer le fichier d'un document (ancien stockage par uuid compris).
+
+    Le document doit déjà être supprimé en base (flush) : la ligne `fichier`
+    est référencée par `document.fichier_sha256`.
+    """
+    if doc.fichier_sha256:
+        liberer(doc.fichier_sha256)
+        return
+    supprimer_apres_commit(chemin_absolu(doc.fichier_stockage))
+
+
+# ──────────────────────────────────────────────
+#  SUPPRESSION DIFFÉRÉE
+# ──────────────────────────────────────────────
+def supprimer_apres_commit(chemin):
+    """Mettre un fichier de côté ; il est effacé au commit de la transaction
+    courante, remis en place si elle est annulée."""
+    de_cote = os.path.join(_dossier_temporaire(), f"supprime-{uuid.uuid4().hex}")
+    try:
+        os.replace(chemin, de_cote)
+    except FileNotFoundError:
+        return
+    db.session.info.setdefault("fichiers_supprimes", []).append((chemin, de_cote))
+
+
+@event.listens_for(Session, "after_commit")
+def _effacer_fichiers_supprimes(session):
+    for _, de_cote in session.info.pop("fichiers_supprimes", ()):
+        try:
+            os.remove(de_cote)
+        except FileNotFoundError:
+            pass
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _restaurer_fichiers_supprimes(session, transaction):
+    """Transaction terminée sans commit (rollback, fermeture) : remettre les
+    fichiers en place."""
+    if transaction.parent is not None:
+        return
+    for chemin, de_cote in session.info.pop("fichiers_supprimes", ()):
+        try:
+            os.replace(de_cote, chemin)
+        except FileNotFoundError:
+            pass
+
+
+# ──────────────────────────────────────────────
+#  FICHIERS ORPHELINS
+# ──────────────────────────────────────────────
+def _contenus_stockes(racine):
+    """sha256 des fichiers rangés sous `racine/ab/cd/` (hors .tmp, .sessions…)."""
+    for niveau1 in os.scandir(racine) if os.path.isdir(racine) else ():
+        if len(niveau1.name) != 2 or not HEX.fullmatch(niveau1.name) or not niveau1.is_dir():
+            continue
+        for niveau2 in os.scandir(niveau1.path):
+            if len(niveau2.name) != 2 or not HEX.fullmatch(niveau2.name) or not niveau2.is_dir():
+                continue
+            prefixe = niveau1.name + niveau2.name
+            for entree in os.scandir(niveau2.path):
+                nom = entree.name
+                if len(nom) == 64 and nom.startswith(prefixe) and HEX.fullmatch(nom):
+                    yield nom
+
+
+def _supprimer_orphelin(sha256):
+    """Supprimer le fichier `sha256` s'il n'a toujours pas de ligne ; commite.
+
+    Une ligne provisoire est insérée le temps de la transaction : un upload
+    concurrent du même contenu attend son commit (upsert), puis trouve la
+    place libre et pose son propre fichier.
+    """
+    insert = insert_upsert()
+    inseree = db.session.execute(
+        insert(Fichier)
+        .values(sha256=sha256, taille=0, nb_references=0)
+        .on_conflict_do_nothing(index_elements=[Fichier.sha256])
+    ).rowcount == 1
+    if inseree:
+        supprimer_apres_commit(chemin_absolu(chemin_relatif(sha256)))
+        db.session.execute(db.delete(Fichier).where(Fichier.sha256 == sha256))
+    db.session.commit()
+    return inseree
+
+
+def balayer_orphelins(taille_lot=500):
+    """Supprimer les fichiers stockés sans ligne `fichier` ; renvoie leur nombre."""
+    contenus = _contenus_stockes(current_app.config["UPLOAD_FOLDER"])
+    supprimes = 0
+    while lot := [sha256 for _, sha256 in zip(range(taille_lot), contenus)]:
+        connus = set(db.session.scalars(
+            db.select(Fichier.sha256).where(Fichier.sha256.in_(lot))
+        ))
+        db.session.commit()
+        supprimes += sum(_supprimer_orphelin(sha256) for sha256 in lot if sha256 not in connus)
+    return supprimes
+
+
+@gestionnaire("balayer_stockage", max_tentatives=1)
+def balayer_stockage():
+    """Tâche périodique : un échec est rattrapé à la période suivante."""
+    balayer_orphelins()
+
+
+periodique("balayer_stockage", "STORAGE_SWEEP_INTERVAL")
+
+
+# ──────────────────────────────────────────────
+#  COMMANDES
+# ──────────────────────────────────────────────
+stockage_cli = AppGroup("stockage", help="Stockage des fichiers par contenu.")
+
+
+@stockage_cli.command("balayer")
+def balayer_commande():
+    """Supprimer les fichiers stockés qu'aucun document ne référence."""
+    click.echo(f"{balayer_orphelins()} fichier(s) orphelin(s) supprimé(s)")
+
+
+@stockage_cli.command("migrer")
+def migrer_commande():
+    """Déplacer les fichiers nommés par uuid vers le stockage par contenu."""
+    migres = doublons = 0
+    anciens = Document.query.filter(Document.fichier_sha256.is_(None)).all()
+    for doc in anciens:
+        ancien_chemin = chemin_absolu(doc.fichier_stockage)
+        if not os.path.exists(ancien_chemin):
+            click.echo(f"Fichier manquant pour le document {doc.id}", err=True)
+            continue
+        with open(ancien_chemin, "rb") as flux:
+            chemin_tmp, sha256, taille = recevoir_flux(flux)
+        if db.session.get(Fichier, sha256) is not None:
+            doublons += 1
+        doc.fichier_stockage = enregistrer(chemin_tmp, sha256, taille)
+        doc.fichier_sha256 = sha256
+        db.session.commit()
+        os.remove(ancien_chemin)
+        migres += 1
+    click.echo(f"{migres} fichier(s) migré(s), dont {doublons} doublon(s)")
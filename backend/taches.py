@@ -0,0 +1,430 @@
+"""File de tâches en arrière-plan, stockée dans la base (table `tache`).
+
+Les traitements d'un fichier après son upload (vérification, extraction,
+aperçus…) ne tournent pas dans la requête : la route planifie une tâche
+(`planifier`), validée avec le document, et un worker séparé l'exécute :
+
+    flask taches worker --threads 4 [--processus 2]
+
+Pas de broker : PostgreSQL ou SQLite suffisent. Une tâche est réservée par
+un seul UPDATE … WHERE id IN (SELECT … FOR UPDATE SKIP LOCKED) ; la
+réservation la rend invisible pendant `TASKS_VISIBILITY_TIMEOUT` secondes. Un
+worker arrêté en cours de route ne bloque donc rien : la tâche redevient
+disponible à l'expiration du délai. Un échec est réessayé avec un délai
+exponentiel (`TASKS_RETRY_BASE` · 2^(n-1), plafonné, avec gigue) jusqu'à
+`max_tentatives`, sauf `TacheAbandonnee` (échec définitif).
+
+Chaque worker limite le nombre de tâches simultanées par type
+(`TASKS_CONCURRENCY`, ex. "apercu=1,extraire_texte=2" ; par défaut, le
+nombre de threads). Le statut de traitement du document (`statut_traitement`)
+est déduit de l'état de ses tâches.
+
+Les tâches périodiques (`periodique`) sont planifiées par les workers
+eux-mêmes, à l'intervalle donné par la configuration, si aucune tâche du même
+type n'est déjà en attente.
+"""
+import datetime
+import logging
+import multiprocessing
+import os
+import random
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import click
+from flask import current_app
+from flask.cli import AppGroup, with_appcontext
+
+from models import db, Document, Tache, insert_upsert, maintenant_utc
+
+logger = logging.getLogger(__name__)
+
+A_FAIRE = ("en_attente", "en_cours")
+
+
+class TacheAbandonnee(Exception):
+    """Échec définitif : la tâche n'est pas réessayée."""
+
+
+class Gestionnaire:
+    def __init__(self, fonction, max_tentatives):
+        self.fonction = fonction
+        self.max_tentatives = max_tentatives
+
+
+GESTIONNAIRES = {}  # type -> Gestionnaire
+PERIODIQUES = {}  # type -> clé de configuration de l'intervalle (s)
+
+
+def gestionnaire(type_tache, max_tentatives=5):
+    """Enregistrer la fonction qui exécute les tâches de type `type_tache`.
+
+    Elle reçoit la charge de la tâche en arguments nommés et tourne dans un
+    contexte d'application ; ses écritures sont validées avec la fin de la
+    tâche.
+    """
+    def decorateur(fonction):
+        GESTIONNAIRES[type_tache] = Gestionnaire(fonction, max_tentatives)
+        return fonction
+
+    return decorateur
+
+
+def periodique(type_tache, cle_intervalle):
+    """Faire planifier la tâche `type_tache` (sans charge) par les workers
+    toutes les `config[cle_intervalle]` secondes."""
+    PERIODIQUES[type_tache] = cle_intervalle
+
+
+# ──────────────────────────────────────────────
+#  PLANIFICATION
+# ──────────────────────────────────────────────
+def planifier(type_tache, document=None, delai=0, **charge):
+    """Ajouter une tâche à la session (validée avec la transaction en cours)."""
+    if document is not None:
+        if document.id is None:
+            db.session.flush()
+        charge.setdefault("document_id", document.id)
+        document.statut_traitement = "en_attente"
+    tache = Tache(
+        type=type_tache,
+        charge=charge,
+        document_id=charge.get("document_id"),
+        max_tentatives=GESTIONNAIRES[type_tache].max_tentatives,
+        disponible_a=maintenant_utc() + datetime.timedelta(seconds=delai),
+    )
+    db.session.add(tache)
+    return tache
+
+
+def planifier_si_absente(type_tache, document_id):
+    """Planifier `type_tache` pour un document, sauf si une tâche de ce type
+    l'attend déjà ou est en cours (sans commit) ; renvoie True si ajoutée.
+
+    INSERT … ON CONFLICT DO NOTHING sur l'index unique des tâches à faire :
+    deux requêtes concurrentes n'ajoutent qu'une tâche.
+    """
+    insert = insert_upsert()
+    resultat = db.session.execute(
+        insert(Tache)
+        .values(
+            type=type_tache,
+            charge={"document_id": document_id},
+            document_id=document_id,
+            max_tentatives=GESTIONNAIRES[type_tache].max_tentatives,
+        )
+        .on_conflict_do_nothing(
+            index_elements=[Tache.type, Tache.document_id],
+            index_where=Tache.etat.in_(A_FAIRE),
+        )
+    )
+    return resultat.rowcount == 1
+
+
+def planifier_periodiques(echeances):
+    """Planifier les tâches périodiques échues ; commite.
+
+    `echeances` : {type: prochaine échéance (time.monotonic)}, propre au
+    worker. Une tâche déjà en attente n'est pas dupliquée.
+    """
+    config, maintenant = current_app.config, time.monotonic()
+    for type_tache, cle_intervalle in PERIODIQUES.items():
+        if echeances.get(type_tache, 0) > maintenant:
+            continue
+        echeances[type_tache] = maintenant + config[cle_intervalle]
+        en_attente = db.session.scalar(
+            db.select(db.func.count()).select_from(Tache)
+            .where(Tache.type == type_tache, Tache.etat.in_(A_FAIRE))
+        )
+        if not en_attente:
+            planifier(type_tache)
+        db.session.commit()
+
+
+def actualiser_document(document_id):
+    """Recalculer `statut_traitement` d'après les tâches du document."""
+    if document_id is None:
+        return
+    etats = set(db.session.scalars(
+        db.select(Tache.etat).where(Tache.document_id == document_id).distinct()
+    ))
+    if "echouee" in etats:
+        statut = "echoue"
+    elif "en_cours" in etats:
+        statut = "en_cours"
+    elif "en_attente" in etats:
+        statut = "en_attente"
+    else:
+        statut = "termine"
+    db.session.execute(
+        db.update(Document)
+        .where(Document.id == document_id, Document.statut_traitement != statut)
+        .values(statut_traitement=statut)
+        .execution_options(synchronize_session=False)
+    )
+
+
+# ──────────────────────────────────────────────
+#  RÉSERVATION ET EXÉCUTION
+# ──────────────────────────────────────────────
+def reserver(type_tache, nombre, visibilite):
+    """Réserver jusqu'à `nombre` tâches disponibles ; commite.
+
+    Renvoie [(id, charge, jeton)]. Les tâches en cours dont le délai de
+    visibilité a expiré sont reprises (worker arrêté), sauf si leurs
+    tentatives sont épuisées : elles échouent (une tâche qui fait tomber son
+    worker ne doit pas être reprise indéfiniment).
+    """
+    maintenant = maintenant_utc()
+    jeton = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:12]}"
+    epuisees = db.session.execute(
+        db.update(Tache)
+        .where(
+            Tache.type == type_tache,
+            Tache.etat == "en_cours",
+            Tache.disponible_a <= maintenant,
+            Tache.tentatives >= Tache.max_tentatives,
+        )
+        .values(
+            etat="echouee",
+            jeton=None,
+            erreur="Délai de visibilité expiré, tentatives épuisées",
+            updated_at=maintenant,
+        )
+        .returning(Tache.id, Tache.document_id)
+        .execution_options(synchronize_session=False)
+    ).all()
+    for tache_id, _ in epuisees:
+        logger.error("Tâche %s #%s abandonnée : worker perdu à chaque essai", type_tache, tache_id)
+    disponibles = (
+        db.select(Tache.id)
+        .where(
+            Tache.type == type_tache,
+            Tache.etat.in_(A_FAIRE),
+            Tache.disponible_a <= maintenant,
+        )
+        .order_by(Tache.disponible_a)
+        .limit(nombre)
+        .with_for_update(skip_locked=True)
+    )
+    lignes = db.session.execute(
+        db.update(Tache)
+        .where(Tache.id.in_(disponibles.scalar_subquery()))
+        .values(
+            etat="en_cours",
+            tentatives=Tache.tentatives + 1,
+            jeton=jeton,
+            disponible_a=maintenant + datetime.timedelta(seconds=visibilite),
+            updated_at=maintenant,
+        )
+        .returning(Tache.id, Tache.charge, Tache.document_id)
+        .execution_options(synchronize_session=False)
+    ).all()
+    for document_id in {d for _, _, d in lignes} | {d for _, d in epuisees}:
+        actualiser_document(document_id)
+    db.session.commit()
+    return [(tid, charge, jeton) for tid, charge, _ in lignes]
+
+
+def _delai_nouvel_essai(tentatives):
+    config = current_app.config
+    delai = min(config["TASKS_RETRY_MAX"], config["TASKS_RETRY_BASE"] * 2 ** (tentatives - 1))
+    return delai * random.uniform(0.5, 1.0)
+
+
+def _terminer(tache_id, jeton, **valeurs):
+    """Clore la réservation `jeton` et valider la transaction en cours.
+
+    Si la tâche a été reprise (délai de visibilité expiré) ou supprimée
+    entre-temps, la transaction est annulée : le travail revient au worker
+    qui détient la réservation. Renvoie False dans ce cas.
+    """
+    resultat = db.session.execute(
+        db.update(Tache)
+        .where(Tache.id == tache_id, Tache.jeton == jeton)
+        .values(jeton=None, updated_at=maintenant_utc(), **valeurs)
+        .returning(Tache.document_id)
+        .execution_options(synchronize_session=False)
+    ).first()
+    if resultat is None:
+        db.session.rollback()
+        logger.warning("Tâche #%s reprise ou supprimée pendant son exécution", tache_id)
+        return False
+    actualiser_document(resultat.document_id)
+    db.session.commit()
+    return True
+
+
+def executer(type_tache, tache_id, charge, jeton):
+    """Exécuter une tâche réservée et enregistrer son issue ; renvoie son état
+    (None si la réservation a été perdue entre-temps)."""
+    try:
+        GESTIONNAIRES[type_tache].fonction(**charge)
+    except Exception as exc:
+        db.session.rollback()
+        tache = db.session.get(Tache, tache_id)
+        if tache is None or tache.jeton != jeton:
+            logger.warning(
+                "Tâche %s #%s reprise ou supprimée pendant son exécution", type_tache, tache_id,
+                exc_info=True,
+            )
+            return None
+        definitive = isinstance(exc, TacheAbandonnee) or tache.tentatives >= tache.max_tentatives
+        logger.log(
+            logging.ERROR if definitive else logging.WARNING,
+            "Tâche %s #%s en échec (essai %s/%s)", type_tache, tache_id,
+            tache.tentatives, tache.max_tentatives, exc_info=not isinstance(exc, TacheAbandonnee),
+        )
+        if definitive:
+            etat, valeurs = "echouee", {}
+        else:
+            etat, valeurs = "en_attente", {
+                "disponible_a": maintenant_utc()
+                + datetime.timedelta(seconds=_delai_nouvel_essai(tache.tentatives))
+            }
+        if not _terminer(tache_id, jeton, etat=etat, erreur=str(exc)[:2000], **valeurs):
+            return None
+        return etat
+    if not _terminer(tache_id, jeton, etat="terminee", erreur=None):
+        return None
+    return "terminee"
+
+
+def traiter_disponibles(types=None, nombre=100):
+    """Réserver et exécuter, dans le thread courant, les tâches disponibles
+    (tests, commande `flask taches executer`). Renvoie le nombre exécuté."""
+    visibilite = current_app.config["TASKS_VISIBILITY_TIMEOUT"]
+    total = 0
+    for type_tache in types or list(GESTIONNAIRES):
+        for tache_id, charge, jeton in reserver(type_tache, nombre, visibilite):
+            executer(type_tache, tache_id, charge, jeton)
+            total += 1
+    return total
+
+
+def statistiques():
+    """{type: {etat: nombre}} pour /api/admin/metriques."""
+    resultat = {}
+    lignes = db.session.execute(
+        db.select(Tache.type, Tache.etat, db.func.count()).group_by(Tache.type, Tache.etat)
+    )
+    for type_tache, etat, n in lignes:
+        resultat.setdefault(type_tache, {})[etat] = n
+    return resultat
+
+
+def limites_concurrence(config, threads):
+    """{type: tâches simultanées max par worker} d'après TASKS_CONCURRENCY."""
+    limites = {t: threads for t in GESTIONNAIRES}
+    for element in filter(None, config["TASKS_CONCURRENCY"].split(",")):
+        type_tache, _, valeur = element.partition("=")
+        limites[type_tache.strip()] = int(valeur)
+    return limites
+
+
+class Worker:
+    """Boucle de réservation alimentant un pool de threads."""
+
+    def __init__(self, app, threads):
+        self.app = app
+        self.threads = threads
+        self.limites = limites_concurrence(app.config, threads)
+        self.en_cours = dict.fromkeys(self.limites, 0)
+        self.echeances = {}
+        self.arret = threading.Event()
+        self._verrou = threading.Lock()
+
+    def _executer(self, type_tache, tache_id, charge, jeton):
+        try:
+            with self.app.app_context():
+                executer(type_tache, tache_id, charge, jeton)
+        except Exception:
+            logger.exception("Tâche %s #%s : erreur du worker", type_tache, tache_id)
+        finally:
+            with self._verrou:
+                self.en_cours[type_tache] -= 1
+
+    def tourner(self):
+        config = self.app.config
+        with ThreadPoolExecutor(self.threads, thread_name_prefix="tache") as pool:
+            while not self.arret.is_set():
+                try:
+                    with self.app.app_context():
+                        planifier_periodiques(self.echeances)
+                except Exception:
+                    logger.exception("Planification des tâches périodiques impossible")
+                reservees = 0
+                for type_tache, limite in self.limites.items():
+                    with self._verrou:
+                        libres = min(limite - self.en_cours[type_tache],
+                                     self.threads - sum(self.en_cours.values()))
+                    if libres <= 0:
+                        continue
+                    try:
+                        with self.app.app_context():
+                            lot = reserver(type_tache, libres, config["TASKS_VISIBILITY_TIMEOUT"])
+                    except Exception:
+                        logger.exception("Réservation des tâches %s impossible", type_tache)
+                        lot = []
+                    with self._verrou:
+                        self.en_cours[type_tache] += len(lot)
+                    for tache_id, charge, jeton in lot:
+                        pool.submit(self._executer, type_tache, tache_id, charge, jeton)
+                    reservees += len(lot)
+                if not reservees:
+                    self.arret.wait(config["TASKS_POLL_INTERVAL"])
+
+
+def _processus_worker(threads):
+    from app import create_app
+
+    Worker(create_app(), threads).tourner()
+
+
+# ──────────────────────────────────────────────
+#  COMMANDES
+# ──────────────────────────────────────────────
+taches_cli = AppGroup("taches", help="File de tâches en arrière-plan.")
+
+
+@taches_cli.command("worker")
+@click.option("--threads", default=4, show_default=True, help="Tâches simultanées par processus.")
+@click.option("--processus", default=1, show_default=True, help="Processus workers.")
+@with_appcontext
+def worker_commande(threads, processus):
+    """Exécuter les tâches en continu."""
+    if processus <= 1:
+        click.echo(f"Worker démarré ({threads} threads)")
+        Worker(current_app._get_current_object(), threads).tourner()
+        return
+    contexte = multiprocessing.get_context("spawn")
+    enfants = [
+        contexte.Process(target=_processus_worker, args=(threads,), daemon=True)
+        for _ in range(processus)
+    ]
+    for enfant in enfants:
+        enfant.start()
+    click.echo(f"{processus} processus workers démarrés ({threads} threads chacun)")
+    for enfant in enfants:
+        enfant.join()
+
+
+@taches_cli.command("executer")
+def executer_commande():
+    """Exécuter une fois les tâches disponibles, puis rendre la main."""
+    click.echo(f"{traiter_disponibles()} tâche(s) exécutée(s)")
+
+
+@taches_cli.command("purger")
+@click.option("--jours", default=7, show_default=True, help="Âge minimal des tâches terminées.")
+def purger_commande(jours):
+    """Supprimer les tâches terminées anciennes (les échecs sont conservés)."""
+    limite = maintenant_utc() - datetime.timedelta(days=jours)
+    n = db.session.execute(
+        db.delete(Tache).where(Tache.etat == "terminee", Tache.updated_at < limite)
+    ).rowcount
+    db.session.commit()
+    click.echo(f"{n} tâche(s) supprimée(s)")
@@ -0,0 +1,150 @@
+"""Instantané en mémoire du référentiel Université → Filière → Matière.
+
+Le référentiel change quelques fois par semestre mais est lu à chaque
+requête : chaque processus en garde une copie figée (dictionnaires JSON
+précalculés, index par id) et la remplace d'un bloc quand la
+version de l'une des trois tables change dans `version_donnees`.
+Les lectures ne prennent aucun verrou : un rechargement construit un nouvel
+instantané puis remplace la référence.
+
+La version courante est celle lue par `reponse_versionnee` pour la requête
+en cours quand la route dépend des trois tables (le contenu servi correspond
+alors toujours à l'ETag, quel que soit le worker ou le réplica) ; ailleurs,
+elle est relue au plus toutes les `TAXONOMY_CHECK_INTERVAL` secondes.
+"""
+import threading
+import time
+from types import MappingProxyType
+
+from flask import current_app, g
+
+from models import Filiere, Matiere, Universite
+from versions import lire_versions
+
+TABLES_TAXONOMIE = ("universite", "filiere", "matiere")
+
+
+class Instantane:
+    """Vue immuable du référentiel ; les méthodes renvoient des copies des dicts."""
+
+    def __init__(self, version, universites, filieres, matieres):
+        self.version = version
+        # Listes dans l'ordre de la base (ORDER BY nom), dicts de `to_dict`
+        self._universites = tuple(u.to_dict() for u in universites)
+        self._filieres = tuple(f.to_dict() for f in filieres)
+        self._matieres = tuple(m.to_dict() for m in matieres)
+        self._par_id = {
+            table: MappingProxyType({d["id"]: d for d in donnees})
+            for table, donnees in (
+                ("universite", self._universites),
+                ("filiere", self._filieres),
+                ("matiere", self._matieres),
+            )
+        }
+
+    def _lire(self, table, ident):
+        donnees = self._par_id[table].get(ident)
+        return dict(donnees) if donnees is not None else None
+
+    def universite(self, uid):
+        return self._lire("universite", uid)
+
+    def filiere(self, fid):
+        return self._lire("filiere", fid)
+
+    def matiere(self, mid):
+        return self._lire("matiere", mid)
+
+    def universites(self):
+        return [dict(u) for u in self._universites]
+
+    def filieres(self, universite_id=None, par_id=False):
+        """Filières (d'une université), triées par nom ou par id."""
+        resultat = [
+            dict(f) for f in self._filieres
+            if universite_id is None or f["universite_id"] == universite_id
+        ]
+        return sorted(resultat, key=lambda f: f["id"]) if par_id else resultat
+
+    def matieres(self, filiere_id=None, niveau=None, par_id=False):
+        """Matières (d'une filière, d'un niveau), triées par nom ou par id."""
+        resultat = [
+            dict(m) for m in self._matieres
+            if (filiere_id is None or m["filiere_id"] == filiere_id)
+            and (niveau is None or m["niveau"] == niveau)
+        ]
+        return sorted(resultat, key=lambda m: m["id"]) if par_id else resultat
+
+    def ids_matieres(self, universite_id=None, filiere_id=None, niveau=None):
+        """Ids des matières correspondant aux filtres du catalogue."""
+        filieres = None
+        if universite_id is not None:
+            filieres = {
+                f["id"] for f in self._filieres if f["universite_id"] == universite_id
+            }
+        return [
+            m["id"] for m in self._matieres
+            if (filieres is None or m["filiere_id"] in filieres)
+            and (filiere_id is None or m["filiere_id"] == filiere_id)
+            and (niveau is None or m["niveau"] == niveau)
+        ]
+
+    def nom_matiere(self, mid):
+        matiere = self._par_id["matiere"].get(mid)
+        return matiere["nom"] if matiere is not None else None
+
+
+def _au_moins(version, attendue):
+    """Un instantané plus récent que la version attendue peut la servir."""
+    return all(a >= b for a, b in zip(version, attendue))
+
+
+class Taxonomie:
+    """Instantané courant d'une application et sa politique de rechargement."""
+
+    def __init__(self, intervalle=2.0):
+        self.intervalle = intervalle
+        self.rechargements = 0
+        self._instantane = None
+        self._verifie_a = 0.0
+        self._verrou = threading.Lock()
+
+    def _version_courante(self):
+        versions = g.get("versions_donnees")
+        if versions is None or not all(t in versions for t in TABLES_TAXONOMIE):
+            versions = lire_versions(TABLES_TAXONOMIE)
+        return tuple(versions[t][0] for t in TABLES_TAXONOMIE)
+
+    def instantane(self):
+        actuel = self._instantane
+        recent = time.monotonic() - self._verifie_a < self.intervalle
+        if actuel is not None and recent and "versions_donnees" not in g:
+            return actuel
+        version = self._version_courante()
+        if actuel is not None and _au_moins(actuel.version, version):
+            self._verifie_a = time.monotonic()
+            return actuel
+        with self._verrou:
+            actuel = self._instantane
+            if actuel is None or not _au_moins(actuel.version, version):
+                # Les lignes lues peuvent être plus récentes que `version` :
+                # au pire, un rechargement de plus à la vérification suivante.
+                actuel = Instantane(
+                    version,
+                    Universite.query.order_by(Universite.nom).all(),
+                    Filiere.query.order_by(Filiere.nom).all(),
+                    Matiere.query.order_by(Matiere.nom).all(),
+                )
+                self._instantane = actuel  # remplacement atomique
+                self.rechargements += 1
+            self._verifie_a = time.monotonic()
+        return actuel
+
+
+def init_app(app):
+    app.extensions["taxonomie"] = Taxonomie(app.config["TAXONOMY_CHECK_INTERVAL"])
+
+
+def instantane():
+    """Instantané du référentiel pour l'application courante."""
+    return current_app.extensions["taxonomie"].instantane()
@@ -2,12 +2,17 @@
 import sys
 import os
 import io
+import datetime
+import time
+import re
 import pytest
 
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
 
 from app import create_app
-from models import db, Universite, Filiere, Matiere
+from models import (
+    db, Universite, Filiere, Matiere, Utilisateur, Document, Vote, enregistrer_vote,
+)
 
 
 @pytest.fixture
@@ -18,6 +23,8 @@ def client():
             "SQLALCHEMY_DATABASE_URI": "sqlite:///:memory:",
             "TESTING": True,
             "UPLOAD_FOLDER": "/tmp/test_uploads",
+            "DOWNLOAD_COUNTER_FLUSH_INTERVAL": 0,
+            "PASSWORD_HASH_WORKERS": 0,
         }
     )
     with app.app_context():
@@ -75,6 +82,81 @@ def test_health(client):
     assert resp.get_json()["status"] == "ok"
 
 
+def test_ready_apres_prechauffage(client):
+    resp = client.get("/ready")
+    assert resp.status_code == 200
+    assert client.application.extensions["demarrage"].pret
+    # Le référentiel est déjà en mémoire pour la première vraie requête
+    assert client.application.extensions["taxonomie"].rechargements == 1
+
+
+def test_demarrage_sans_create_all(tmp_path):
+    from sqlalchemy import inspect
+
+    uri = f"sqlite:///{tmp_path / 'migree.db'}"
+    app = create_app({"SQLALCHEMY_DATABASE_URI": uri, "AUTO_CREATE_SCHEMA": False})
+    with app.app_context():
+        assert inspect(db.engine).get_table_names() == []
+    # Sans schéma, le worker ne se déclare pas prêt
+    assert app.test_client().get("/ready").status_code == 503
+
+
+# ──────────────────────────────────────────────
+#  ENCODAGE DES RÉPONSES
+# ──────────────────────────────────────────────
+
+
+@pytest.mark.parametrize("avec_orjson", [True, False])
+def test_json_dates_iso_et_ordre_des_cles(client, monkeypatch, avec_orjson):
+    import reponses
+
+    if not avec_orjson:
+        monkeypatch.setattr(reponses, "orjson", None)
+    elif reponses.orjson is None:
+        pytest.skip("orjson non installé")
+    doc = _ajouter_document("Équations", created_at=datetime.datetime(2024, 3, 1, 8, 30, 0, 250))
+    resp = client.get(f"/api/documents/{doc.id}")
+    assert resp.get_json()["created_at"] == "2024-03-01T08:30:00.000250"
+    # Ordre de `to_dict`, caractères non ASCII non échappés
+    assert re.match(r'\{\s*"id": ?1,\s*"titre": ?"Équations"', resp.get_data(as_text=True))
+    assert client.post("/api/auth/login", data="{", content_type="application/json").status_code == 400
+
+
+def test_compression_negociee(client):
+    import gzip
+    import reponses
+
+    _seed_documents(30, votes_par_document=1)
+    Document.query.update({"description": "Résumé détaillé du chapitre. " * 20})
+    db.session.commit()
+
+    brut = client.get("/api/documents?per_page=30")
+    assert "Content-Encoding" not in brut.headers
+    gz = client.get("/api/documents?per_page=30", headers={"Accept-Encoding": "gzip"})
+    assert gz.headers["Content-Encoding"] == "gzip"
+    assert "Accept-Encoding" in gz.headers["Vary"]
+    assert gzip.decompress(gz.data) == brut.data
+    assert int(gz.headers["Content-Length"]) < len(brut.data) // 5
+
+    resp = client.get("/api/documents?per_page=30", headers={"Accept-Encoding": "gzip, br"})
+    if reponses.brotli is not None:
+        assert resp.headers["Content-Encoding"] == "br"
+        assert reponses.brotli.decompress(resp.data) == brut.data
+    # Refus explicite, ou réponse sous le seuil : pas de compression
+    refus = client.get("/api/documents?per_page=30", headers={"Accept-Encoding": "gzip;q=0"})
+    assert "Content-Encoding" not in refus.headers
+    petite = client.get("/health", headers={"Accept-Encoding": "gzip"})
+    assert "Content-Encoding" not in petite.headers
+
+
+def test_fichiers_telecharges_non_recompresses(client):
+    did = _uploader(client, _auth_header(client), contenu=b"%PDF" + b"0" * 4096)
+    resp = client.get(f"/api/documents/{did}/download", headers={"Accept-Encoding": "gzip"})
+    assert "Content-Encoding" not in resp.headers
+    assert len(resp.data) == 4100
+    resp.close()
+
+
 # ──────────────────────────────────────────────
 #  AUTH
 # ──────────────────────────────────────────────
@@ -107,6 +189,57 @@ def test_login_wrong_password(client):
     assert resp.status_code == 401
 
 
+def test_login_met_a_jour_ancien_hash(client):
+    from werkzeug.security import generate_password_hash
+
+    _register(client)
+    user = Utilisateur.query.filter_by(email="awa@test.com").first()
+    user.mot_de_passe = generate_password_hash("test1234", "pbkdf2:sha256:1000")
+    db.session.commit()
+
+    assert _login(client).status_code == 200
+    db.session.expire_all()
+    hash_stocke = db.session.get(Utilisateur, user.id).mot_de_passe
+    assert hash_stocke.startswith("scrypt:32768:8:1$")
+    assert _login(client).status_code == 200
+
+
+def test_hachage_surcharge_renvoie_503(client):
+    from hachage import pool_hachage
+
+    _register(client)
+    pool_hachage.attente_max = 0.01
+    places = []
+    while pool_hachage._places.acquire(blocking=False):
+        places.append(True)
+    try:
+        resp = _login(client)
+    finally:
+        for _ in places:
+            pool_hachage._places.release()
+    assert resp.status_code == 503
+    assert resp.headers["Retry-After"] == "1"
+    assert _login(client).status_code == 200
+
+
+def test_hachage_dans_un_processus_dedie():
+    from hachage import pool_hachage
+
+    app = create_app(
+        {
+            "SQLALCHEMY_DATABASE_URI": "sqlite:///:memory:",
+            "PASSWORD_HASH_WORKERS": 1,
+            "PASSWORD_HASH_METHOD": "pbkdf2:sha256:1000",
+        }
+    )
+    hash_stocke = pool_hachage.generer("secret123")
+    assert pool_hachage._executor is not None
+    assert pool_hachage.est_a_jour(hash_stocke)
+    assert pool_hachage.verifier(hash_stocke, "secret123")
+    assert not pool_hachage.verifier(hash_stocke, "autre")
+    assert app.extensions["pool_hachage"] is pool_hachage
+
+
 def test_me(client):
     headers = _auth_header(client)
     resp = client.get("/api/auth/me", headers=headers)
@@ -119,6 +252,60 @@ def test_me_no_token(client):
     assert resp.status_code == 401
 
 
+def _admin_header(client):
+    _register(client, email="admin@test.com", role="admin")
+    token = _login(client, email="admin@test.com").get_json()["token"]
+    return {"Authorization": f"Bearer {token}"}
+
+
+def test_cache_principal_evite_lecture_utilisateur(client):
+    headers = _admin_header(client)
+    client.get("/api/admin/metriques", headers=headers)
+
+    resp, n_requetes = _compter_requetes(client, "/api/admin/metriques", headers=headers)
+    assert resp.status_code == 200
+    assert n_requetes == 1  # version de la table utilisateur
+    stats = resp.get_json()["cache_auth"]
+    assert stats["hits"] >= 1 and stats["misses"] == 1
+
+
+def test_cache_principal_invalide_au_changement_de_role(client):
+    headers = _admin_header(client)
+    assert client.get("/api/admin/metriques", headers=headers).status_code == 200
+
+    admin = Utilisateur.query.filter_by(email="admin@test.com").one()
+    admin.role = "etudiant"
+    db.session.commit()
+    assert client.get("/api/admin/metriques", headers=headers).status_code == 403
+
+
+def test_cache_principal_invalide_par_update_en_masse(client):
+    headers = _admin_header(client)
+    assert client.get("/api/admin/metriques", headers=headers).status_code == 200
+
+    # Sans passer par l'unité de travail (ni par ce processus, pour le cache)
+    db.session.execute(
+        db.update(Utilisateur)
+        .where(Utilisateur.email == "admin@test.com")
+        .values(role="etudiant")
+    )
+    db.session.commit()
+    assert client.get("/api/admin/metriques", headers=headers).status_code == 403
+
+
+def test_me_utilisateur_supprime_401(client):
+    headers = _auth_header(client)
+    assert client.get("/api/auth/me", headers=headers).status_code == 200
+
+    # Suppression invisible de version_donnees : principal encore en cache
+    with db.engine.begin() as connexion:
+        connexion.execute(db.text("DELETE FROM utilisateur WHERE email = 'awa@test.com'"))
+    db.session.expire_all()
+    resp = client.get("/api/auth/me", headers=headers)
+    assert resp.status_code == 401
+    assert resp.get_json()["error"] == "Utilisateur introuvable"
+
+
 # ──────────────────────────────────────────────
 #  UNIVERSITÉS
 # ──────────────────────────────────────────────
@@ -137,6 +324,93 @@ def test_get_universite_detail(client):
     assert "filieres" in data
 
 
+def test_universites_304_sans_requete_listing(client):
+    resp = client.get("/api/universites")
+    etag = resp.headers["ETag"]
+    assert etag.startswith('W/"')
+    assert "max-age=300" in resp.headers["Cache-Control"]
+    assert resp.headers["Last-Modified"]
+
+    resp, n_requetes = _compter_requetes(
+        client, "/api/universites", headers={"If-None-Match": etag}
+    )
+    assert resp.status_code == 304
+    assert resp.headers["ETag"] == etag
+    assert n_requetes == 1  # lecture des versions uniquement
+
+    db.session.add(Universite(nom="Université Nouvelle", sigle="UN", ville="Thiès"))
+    db.session.commit()
+    resp = client.get("/api/universites", headers={"If-None-Match": etag})
+    assert resp.status_code == 200
+    assert resp.headers["ETag"] != etag
+
+
+def test_referentiel_en_memoire_sans_requete(client):
+    client.get("/api/universites")
+    taxo = client.application.extensions["taxonomie"]
+    rechargements = taxo.rechargements
+
+    resp, n_requetes = _compter_requetes(client, "/api/filieres/1")
+    assert resp.get_json()["matieres"][0]["filiere"] == "Informatique"
+    assert n_requetes == 1  # versions uniquement
+    assert client.get("/api/universites/999").status_code == 404
+    assert taxo.rechargements == rechargements
+
+    db.session.add(Matiere(nom="Réseaux", filiere_id=1, niveau="L3"))
+    db.session.commit()
+    noms = [m["nom"] for m in client.get("/api/matieres?niveau=L3").get_json()]
+    assert noms == ["Réseaux"]
+    assert taxo.rechargements == rechargements + 1
+
+
+def test_catalogue_arbre_et_comptes(client):
+    _seed_documents(3, votes_par_document=1)
+    db.session.add(Matiere(nom="Compilation", filiere_id=1, niveau="M1"))
+    db.session.add(Filiere(nom="Mathématiques", universite_id=1))
+    doc = Document.query.first()
+    doc.statut = "en_attente"
+    db.session.commit()
+
+    resp = client.get("/api/universites/1/catalogue")
+    assert resp.status_code == 200
+    data = resp.get_json()
+    assert data["nb_documents"] == 2
+    filieres = {f["nom"]: f for f in data["filieres"]}
+    assert filieres["Mathématiques"]["nb_documents"] == 0
+    assert filieres["Mathématiques"]["dernier_ajout"] is None
+    matieres = {m["nom"]: m for m in filieres["Informatique"]["matieres"]}
+    assert matieres["Algorithmique"]["nb_documents"] == 2
+    assert matieres["Algorithmique"]["dernier_ajout"] == data["dernier_ajout"]
+    assert matieres["Compilation"]["nb_documents"] == 0
+
+    data = client.get("/api/universites/1/catalogue?niveau=M1").get_json()
+    assert [f["nom"] for f in data["filieres"]] == ["Informatique"]
+    assert [m["nom"] for m in data["filieres"][0]["matieres"]] == ["Compilation"]
+
+    # Catalogue mémorisé : seule la lecture des versions reste
+    _, n_requetes = _compter_requetes(client, "/api/universites/1/catalogue")
+    assert n_requetes == 1
+    assert client.get("/api/universites/999/catalogue").status_code == 404
+
+
+def test_referentiel_coherent_entre_processus(tmp_path):
+    config = {
+        "SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'partagee.db'}",
+        "PASSWORD_HASH_WORKERS": 0,
+        "TAXONOMY_CHECK_INTERVAL": 3600,
+    }
+    worker_a, worker_b = create_app(config), create_app(config)
+    with worker_a.app_context():
+        _seed_test_data()
+    assert len(worker_b.test_client().get("/api/universites").get_json()) == 1
+
+    with worker_a.app_context():
+        db.session.add(Universite(nom="Université Nouvelle", sigle="UN", ville="Thiès"))
+        db.session.commit()
+    # Le worker B recharge son instantané malgré un intervalle de vérification long
+    assert len(worker_b.test_client().get("/api/universites").get_json()) == 2
+
+
 # ──────────────────────────────────────────────
 #  FILIÈRES / MATIÈRES
 # ──────────────────────────────────────────────
@@ -190,30 +464,1654 @@ def test_upload_no_auth(client):
     assert resp.status_code == 401
 
 
-def test_get_documents(client):
-    resp = client.get("/api/documents")
+def _uploader(client, headers, contenu=b"dummy pdf content", nom="algo.pdf"):
+    data = {
+        "titre": "Cours Algo L1",
+        "matiere_id": "1",
+        "type": "cours",
+        "fichier": (io.BytesIO(contenu), nom),
+    }
+    resp = client.post(
+        "/api/documents",
+        data=data,
+        headers=headers,
+        content_type="multipart/form-data",
+    )
+    return resp.get_json()["id"]
+
+
+def test_download_incremente_compteur(client):
+    did = _uploader(client, _auth_header(client))
+    for _ in range(2):
+        resp = client.get(f"/api/documents/{did}/download")
+        assert resp.status_code == 200
+        assert resp.data == b"dummy pdf content"
+        resp.close()
+    assert client.get(f"/api/documents/{did}").get_json()["nb_telechargements"] == 2
+
+
+def test_download_etag_et_304(client):
+    did = _uploader(client, _auth_header(client))
+    resp = client.get(f"/api/documents/{did}/download")
+    etag = resp.headers["ETag"]
+    assert not etag.startswith("W/")
+    resp.close()
+
+    resp = client.get(f"/api/documents/{did}/download", headers={"If-None-Match": etag})
+    assert resp.status_code == 304
+    assert resp.data == b""
+    assert client.get(f"/api/documents/{did}").get_json()["nb_telechargements"] == 1
+
+
+def test_download_range_reprise_non_comptee(client):
+    did = _uploader(client, _auth_header(client))
+    resp = client.get(f"/api/documents/{did}/download", headers={"Range": "bytes=0-4"})
+    assert resp.status_code == 206
+    assert resp.data == b"dummy"
+    resp.close()
+
+    resp = client.get(f"/api/documents/{did}/download", headers={"Range": "bytes=6-"})
+    assert resp.status_code == 206
+    assert resp.data == b"pdf content"
+    resp.close()
+    assert client.get(f"/api/documents/{did}").get_json()["nb_telechargements"] == 1
+
+
+def test_download_accel_redirect(client):
+    did = _uploader(client, _auth_header(client))
+    client.application.config["DOWNLOAD_ACCEL_REDIRECT"] = "/uploads-internes/"
+    resp = client.get(f"/api/documents/{did}/download")
+    stockage = db.session.get(Document, did).fichier_stockage
     assert resp.status_code == 200
-    assert "documents" in resp.get_json()
+    assert resp.data == b""
+    assert resp.headers["X-Accel-Redirect"] == f"/uploads-internes/{stockage}"
+    assert "algo.pdf" in resp.headers["Content-Disposition"]
+    assert resp.headers["ETag"]
+
+
+def test_download_compteur_tamponne():
+    from compteurs import compteur_telechargements
+
+    app = create_app(
+        {
+            "SQLALCHEMY_DATABASE_URI": "sqlite:///:memory:",
+            "TESTING": True,
+            "UPLOAD_FOLDER": "/tmp/test_uploads",
+            "DOWNLOAD_COUNTER_FLUSH_INTERVAL": 3600,
+            "PASSWORD_HASH_WORKERS": 0,
+        }
+    )
+    with app.app_context():
+        _seed_test_data()
+        client = app.test_client()
+        did = _uploader(client, _auth_header(client))
+        for _ in range(3):
+            client.get(f"/api/documents/{did}/download").close()
+
+        assert db.session.get(Document, did).nb_telechargements == 0
+        assert compteur_telechargements.en_attente() == {did: 3}
+
+        assert compteur_telechargements.vider() == 1
+        db.session.expire_all()
+        assert db.session.get(Document, did).nb_telechargements == 3
+        assert compteur_telechargements.en_attente() == {}
+
+
+def test_upload_deduplication_et_references(client):
+    from models import Fichier
+    import stockage
+
+    headers = _auth_header(client)
+    contenu = b"annales examen 2023 " + os.urandom(8)
+    premier = _uploader(client, headers, contenu=contenu, nom="examen.pdf")
+    second = _uploader(client, headers, contenu=contenu, nom="copie.pdf")
+
+    doc1, doc2 = db.session.get(Document, premier), db.session.get(Document, second)
+    assert doc1.fichier_stockage == doc2.fichier_stockage
+    assert doc1.fichier_stockage == stockage.chemin_relatif(doc1.fichier_sha256)
+    assert doc1.fichier_stockage.split("/")[:2] == [doc1.fichier_sha256[:2], doc1.fichier_sha256[2:4]]
+    assert db.session.get(Fichier, doc1.fichier_sha256).nb_references == 2
+
+    chemin = stockage.chemin_absolu(doc1.fichier_stockage)
+    assert client.delete(f"/api/documents/{premier}", headers=headers).status_code == 200
+    assert os.path.exists(chemin)
+    resp = client.get(f"/api/documents/{second}/download")
+    assert resp.data == contenu
+    resp.close()
+
+    assert client.delete(f"/api/documents/{second}", headers=headers).status_code == 200
+    assert not os.path.exists(chemin)
+    assert db.session.get(Fichier, doc1.fichier_sha256) is None
+
+
+def test_balayage_fichiers_orphelins(client):
+    from models import Fichier
+    import stockage
+
+    headers = _auth_header(client)
+    garde = db.session.get(Document, _uploader(client, headers, contenu=os.urandom(16)))
+
+    # Upload annulé après la pose du fichier : octets sans ligne `fichier`
+    contenu = os.urandom(16)
+    chemin_tmp, sha256, taille = stockage.recevoir_flux(io.BytesIO(contenu))
+    orphelin = stockage.chemin_absolu(stockage.enregistrer(chemin_tmp, sha256, taille))
+    db.session.rollback()
+    assert os.path.exists(orphelin) and db.session.get(Fichier, sha256) is None
+
+    sortie = client.application.test_cli_runner().invoke(args=["stockage", "balayer"]).output
+    assert "orphelin(s) supprimé(s)" in sortie
+    assert not os.path.exists(orphelin)
+    assert db.session.get(Fichier, sha256) is None
+    assert os.path.exists(stockage.chemin_absolu(garde.fichier_stockage))
+    assert db.session.get(Fichier, garde.fichier_sha256).nb_references == 1
+
+    # Le contenu balayé peut être déposé à nouveau
+    _uploader(client, headers, contenu=contenu)
+    assert os.path.exists(orphelin)
+    assert db.session.get(Fichier, sha256).nb_references == 1
+
+
+def test_suppression_derniere_reference_avec_cles_etrangeres(client):
+    from models import Fichier
+    import stockage
+
+    db.session.commit()
+    db.session.execute(db.text("PRAGMA foreign_keys=ON"))
+    try:
+        headers = _auth_header(client)
+        did = _uploader(client, headers, contenu=b"unique " + os.urandom(8))
+        sha256 = db.session.get(Document, did).fichier_sha256
+        chemin = stockage.chemin_absolu(stockage.chemin_relatif(sha256))
+        assert client.delete(f"/api/documents/{did}", headers=headers).status_code == 200
+        assert not os.path.exists(chemin)
+        assert db.session.get(Fichier, sha256) is None
+    finally:
+        db.session.commit()
+        db.session.execute(db.text("PRAGMA foreign_keys=OFF"))
+
+
+def test_fichier_libere_restaure_si_transaction_annulee(client):
+    from models import Fichier
+    import stockage
+
+    headers = _auth_header(client)
+    did = _uploader(client, headers, contenu=b"annulation " + os.urandom(8))
+    doc = db.session.get(Document, did)
+    chemin = stockage.chemin_absolu(doc.fichier_stockage)
+
+    db.session.delete(doc)
+    db.session.flush()
+    stockage.supprimer_fichier_document(doc)
+    assert not os.path.exists(chemin)  # mis de côté jusqu'au commit
+    db.session.rollback()
+    assert os.path.exists(chemin)
+    assert db.session.get(Fichier, doc.fichier_sha256).nb_references == 1
 
 
 # ──────────────────────────────────────────────
-#  RECHERCHE
+#  UPLOAD PAR MORCEAUX
 # ──────────────────────────────────────────────
 
 
-def test_search_no_query(client):
-    resp = client.get("/api/search")
-    assert resp.status_code == 400
+def _init_upload(client, headers, contenu, **kwargs):
+    import hashlib
+
+    data = {
+        "fichier_nom": "slides.pdf",
+        "taille": len(contenu),
+        "titre": "Slides Algo",
+        "matiere_id": 1,
+        "type": "cours",
+        "sha256": hashlib.sha256(contenu).hexdigest(),
+    }
+    data.update(kwargs)
+    return client.post("/api/uploads", json=data, headers=headers)
 
 
-def test_search(client):
-    resp = client.get("/api/search?q=algo")
+def test_upload_morceaux_complet(client):
+    headers = _auth_header(client)
+    contenu = bytes(range(256)) * 1000  # 256 000 octets
+    sid = _init_upload(client, headers, contenu).get_json()["id"]
+
+    morceau = 100_000
+    for offset in range(0, len(contenu), morceau):
+        resp = client.put(
+            f"/api/uploads/{sid}?offset={offset}",
+            data=contenu[offset:offset + morceau],
+            headers=headers,
+        )
+        assert resp.status_code == 200
+    assert resp.get_json()["recu"] == len(contenu)
+
+    resp = client.post(f"/api/uploads/{sid}/finalize", headers=headers)
+    assert resp.status_code == 201
+    doc = resp.get_json()
+    assert doc["taille"] == len(contenu) and doc["fichier_nom"] == "slides.pdf"
+
+    telechargement = client.get(f"/api/documents/{doc['id']}/download")
+    assert telechargement.data == contenu
+    telechargement.close()
+    assert client.get(f"/api/uploads/{sid}", headers=headers).status_code == 404
+
+
+def test_upload_morceaux_reprise_et_offset(client):
+    headers = _auth_header(client)
+    contenu = b"a" * 10 + b"b" * 10
+    sid = _init_upload(client, headers, contenu).get_json()["id"]
+    client.put(f"/api/uploads/{sid}?offset=0", data=contenu[:10], headers=headers)
+
+    # Offset incorrect : refusé, l'état indique où reprendre
+    resp = client.put(f"/api/uploads/{sid}?offset=5", data=b"x", headers=headers)
+    assert resp.status_code == 409 and resp.get_json()["recu"] == 10
+    assert client.get(f"/api/uploads/{sid}", headers=headers).get_json()["recu"] == 10
+
+    # Finalisation prématurée refusée, dépassement de taille refusé
+    assert client.post(f"/api/uploads/{sid}/finalize", headers=headers).status_code == 409
+    resp = client.put(f"/api/uploads/{sid}?offset=10", data=b"b" * 11, headers=headers)
+    assert resp.status_code == 413
+
+    # Reprise depuis un autre processus : le hachage est recalculé
+    import uploads
+    uploads._hachages.clear()
+    client.put(f"/api/uploads/{sid}?offset=10", data=contenu[10:], headers=headers)
+    assert client.post(f"/api/uploads/{sid}/finalize", headers=headers).status_code == 201
+
+
+def test_upload_morceaux_refuse_ne_corrompt_pas_le_hachage(client):
+    import hashlib
+    import uploads
+
+    headers = _auth_header(client)
+    contenu = os.urandom(200_000)
+    sid = _init_upload(client, headers, contenu, sha256=None).get_json()["id"]
+    client.put(f"/api/uploads/{sid}?offset=0", data=contenu[:100_000], headers=headers)
+
+    # Plusieurs blocs acceptés avant le dépassement : rien ne doit en rester
+    trop_long = contenu[100_000:] + b"x" * (2 * uploads.TAILLE_BLOC)
+    resp = client.put(f"/api/uploads/{sid}?offset=100000", data=trop_long, headers=headers)
+    assert resp.status_code == 413
+    resp = client.put(f"/api/uploads/{sid}?offset=100000", data=contenu[100_000:], headers=headers)
+    assert resp.status_code == 200
+
+    resp = client.post(f"/api/uploads/{sid}/finalize", headers=headers)
+    assert resp.status_code == 201
+    sha256 = hashlib.sha256(contenu).hexdigest()
+    assert db.session.get(Document, resp.get_json()["id"]).fichier_sha256 == sha256
+
+
+def test_upload_morceaux_sha256_incorrect(client):
+    headers = _auth_header(client)
+    sid = _init_upload(client, headers, b"abc", sha256="0" * 64).get_json()["id"]
+    client.put(f"/api/uploads/{sid}?offset=0", data=b"abc", headers=headers)
+    assert client.post(f"/api/uploads/{sid}/finalize", headers=headers).status_code == 422
+
+
+def test_upload_morceaux_sessions_expirees(client):
+    import datetime
+    import uploads
+    from models import SessionUpload
+
+    headers = _auth_header(client)
+    sid = _init_upload(client, headers, b"abc").get_json()["id"]
+    session = db.session.get(SessionUpload, sid)
+    session.updated_at -= datetime.timedelta(days=2)
+    db.session.commit()
+
+    assert client.put(f"/api/uploads/{sid}?offset=0", data=b"abc", headers=headers).status_code == 410
+    assert uploads.purger_sessions_expirees() == 0  # déjà supprimée à l'accès
+    assert not os.path.exists(uploads.chemin_partiel(sid))
+
+
+def test_upload_morceaux_init_invalide(client):
+    headers = _auth_header(client)
+    for champs, status in [
+        ({"matiere_id": "1"}, 400),
+        ({"matiere_id": [1]}, 400),
+        ({"matiere_id": True}, 400),
+        ({"matiere_id": 9999}, 404),
+        ({"titre": {"fr": "Slides"}}, 400),
+        ({"type": ["cours"]}, 400),
+        ({"description": 3}, 400),
+        ({"sha256": "abc"}, 400),
+        ({"sha256": "z" * 64}, 400),
+        ({"sha256": 12}, 400),
+    ]:
+        resp = _init_upload(client, headers, b"abc", **champs)
+        assert resp.status_code == status, champs
+        assert "error" in resp.get_json()
+    assert _init_upload(client, headers, b"abc", sha256="A" * 64).status_code == 201
+
+
+def test_upload_morceaux_purge_periodique(client):
+    import datetime
+    import taches
+    import uploads
+    from models import SessionUpload
+
+    headers = _auth_header(client)
+    sid = _init_upload(client, headers, b"abc").get_json()["id"]
+    session = db.session.get(SessionUpload, sid)
+    session.updated_at -= datetime.timedelta(days=2)
+    db.session.commit()
+
+    # L'ouverture d'une autre session ne purge plus rien
+    _init_upload(client, headers, b"def")
+    assert db.session.get(SessionUpload, sid) is not None
+
+    taches.planifier_periodiques({})
+    assert taches.traiter_disponibles(["purger_uploads"]) == 1
+    db.session.expire_all()
+    assert db.session.get(SessionUpload, sid) is None
+    assert not os.path.exists(uploads.chemin_partiel(sid))
+
+
+def test_get_documents(client):
+    resp = client.get("/api/documents")
     assert resp.status_code == 200
     assert "documents" in resp.get_json()
 
 
+def _seed_documents(n, votes_par_document=3):
+    """Insérer `n` documents approuvés, chacun noté par plusieurs utilisateurs."""
+    votants = []
+    for i in range(votes_par_document):
+        u = Utilisateur(nom="Votant", prenom=str(i), email=f"v{i}@test.com")
+        u.mot_de_passe = "x"
+        votants.append(u)
+    db.session.add_all(votants)
+    db.session.flush()
+
+    for i in range(n):
+        doc = Document(
+            titre=f"Document {i}",
+            type="cours",
+            fichier_nom=f"doc{i}.pdf",
+            fichier_stockage=f"doc{i}.pdf",
+            matiere_id=1,
+            auteur_id=votants[0].id,
+            statut="approuve",
+        )
+        db.session.add(doc)
+        db.session.flush()
+        for j, u in enumerate(votants):
+            enregistrer_vote(doc.id, u.id, 1 + (i + j) % 5)
+    db.session.commit()
+
+
+def _compter_requetes(client, url, **kwargs):
+    """Exécuter une requête GET et compter les requêtes SQL émises."""
+    requetes = []
+
+    def _enregistrer(conn, cursor, statement, *args):
+        requetes.append(statement)
+
+    db.event.listen(db.engine, "before_cursor_execute", _enregistrer)
+    try:
+        resp = client.get(url, **kwargs)
+    finally:
+        db.event.remove(db.engine, "before_cursor_execute", _enregistrer)
+    return resp, len(requetes)
+
+
+def test_documents_nombre_requetes_constant(client):
+    _seed_documents(30)
+    db.session.expire_all()
+    client.get("/api/universites")  # chargement du référentiel en mémoire
+
+    resp_petit, n_petit = _compter_requetes(client, "/api/documents?per_page=5")
+    resp_grand, n_grand = _compter_requetes(client, "/api/documents?per_page=30")
+
+    assert resp_grand.status_code == 200
+    assert len(resp_grand.get_json()["documents"]) == 30
+    assert n_grand <= 3
+    assert n_grand == n_petit
+
+
+def test_documents_liste_meme_forme_que_detail(client):
+    _seed_documents(3)
+    liste = client.get("/api/documents").get_json()["documents"]
+    for d in liste:
+        db.session.expire_all()
+        assert client.get(f"/api/documents/{d['id']}").get_json() == d
+
+
+def test_matiere_et_recherche_nombre_requetes_borne(client):
+    _seed_documents(20)
+    db.session.expire_all()
+    client.get("/api/universites")  # chargement du référentiel en mémoire
+    _, n_matiere = _compter_requetes(client, "/api/matieres/1")
+    _, n_search = _compter_requetes(client, "/api/search?q=document&per_page=20")
+    assert n_matiere <= 2  # versions + documents
+    assert n_search <= 4  # versions + documents + total + extraits du contenu
+
+
+def test_fields_projection_colonnes_et_cles(client):
+    _seed_documents(5)
+    requetes = []
+
+    def _enregistrer(conn, cursor, statement, *args):
+        requetes.append(statement)
+
+    db.event.listen(db.engine, "before_cursor_execute", _enregistrer)
+    try:
+        resp = client.get("/api/documents?fields=id,titre,type,note_moyenne,auteur,matiere")
+    finally:
+        db.event.remove(db.engine, "before_cursor_execute", _enregistrer)
+    complets = {d["id"]: d for d in client.get("/api/documents").get_json()["documents"]}
+    documents = resp.get_json()["documents"]
+    assert len(documents) == 5
+    for d in documents:
+        assert list(d) == ["id", "titre", "type", "note_moyenne", "auteur", "matiere"]
+        assert d == {cle: complets[d["id"]][cle] for cle in d}
+    page = next(r for r in requetes if "FROM document" in r and "LIMIT" in r)
+    assert "description" not in page and "fichier_nom" not in page
+
+
+def test_fields_curseur_recherche_et_matiere(client):
+    _seed_documents(5)
+    premiere = client.get("/api/documents?cursor=&per_page=2&fields=titre").get_json()
+    assert [list(d) for d in premiere["documents"]] == [["titre"], ["titre"]]
+    suivante = client.get(
+        f"/api/documents?cursor={premiere['next_cursor']}&per_page=2&fields=titre"
+    ).get_json()
+    titres = [d["titre"] for d in premiere["documents"] + suivante["documents"]]
+    attendus = [d["titre"] for d in client.get("/api/documents?per_page=4").get_json()["documents"]]
+    assert titres == attendus
+
+    resultats = client.get("/api/search?q=document&fields=id,extrait").get_json()["documents"]
+    assert resultats and all(list(d) == ["id", "extrait"] for d in resultats)
+    resultats = client.get("/api/search?q=document&fields=id").get_json()["documents"]
+    assert all(list(d) == ["id"] for d in resultats)
+    matiere = client.get("/api/matieres/1?fields=id,created_at").get_json()
+    assert all(list(d) == ["id", "created_at"] for d in matiere["documents"])
+
+    assert client.get("/api/documents?fields=id,mot_de_passe").status_code == 400
+    assert client.get("/api/documents?fields=extrait").status_code == 400
+    assert client.get("/api/documents?fields=").status_code == 400
+
+
+def test_documents_pagination_curseur(client):
+    _seed_documents(25, votes_par_document=1)
+    par_offset = client.get("/api/documents?per_page=100").get_json()["documents"]
+
+    vus, curseur, pages = [], "", 0
+    while curseur is not None:
+        data = client.get(f"/api/documents?per_page=10&cursor={curseur}").get_json()
+        assert "page" not in data and data["total"] is None
+        vus += [d["id"] for d in data["documents"]]
+        curseur = data["next_cursor"]
+        pages += 1
+
+    assert pages == 3
+    assert vus == [d["id"] for d in par_offset]
+
+
+def test_documents_pagination_total_et_bornes(client):
+    _seed_documents(3, votes_par_document=1)
+    data = client.get("/api/documents?per_page=100000").get_json()
+    assert data["per_page"] == 100
+    assert data["total"] == 3 and data["pages"] == 1
+
+    data = client.get("/api/documents?per_page=2&total=aucun").get_json()
+    assert data["total"] is None and data["pages"] is None
+    assert len(data["documents"]) == 2
+
+    data = client.get("/api/documents?cursor=&total=estimation").get_json()
+    assert data["total"] == 3
+
+
+def _seed_volume(n_documents=5000, n_matieres=20):
+    """Jeu de données volumineux inséré en masse (Core), statistiques à jour."""
+    db.session.add(Filiere(nom="Mathématiques", universite_id=1))
+    db.session.flush()
+    db.session.add_all(
+        Matiere(nom=f"Matière {i}", filiere_id=1 + i % 2, niveau=f"L{1 + i % 3}")
+        for i in range(n_matieres - 1)
+    )
+    auteur = Utilisateur(nom="Auteur", prenom="A", email="volume@test.com")
+    auteur.mot_de_passe = "x"
+    db.session.add(auteur)
+    db.session.flush()
+    types = ("cours", "examen", "td", "tp", "expose")
+    db.session.execute(
+        Document.__table__.insert(),
+        [
+            {
+                "titre": f"Document {i}",
+                "type": types[i % len(types)],
+                "fichier_nom": "f.pdf",
+                "fichier_stockage": "f.pdf",
+                "matiere_id": 1 + i % n_matieres,
+                "auteur_id": auteur.id,
+                "statut": "approuve" if i % 5 else "en_attente",
+                "created_at": datetime.datetime(2025, 1, 1) + datetime.timedelta(minutes=i),
+            }
+            for i in range(n_documents)
+        ],
+    )
+    db.session.commit()
+    db.session.execute(db.text("ANALYZE"))
+
+
+def _balayages_sequentiels(client, urls, table="document"):
+    """Exécuter les URLs et renvoyer les requêtes dont le plan parcourt `table`
+    séquentiellement (EXPLAIN QUERY PLAN sous SQLite, EXPLAIN sous PostgreSQL)."""
+    requetes = []
+
+    def _enregistrer(conn, cursor, statement, parameters, *args):
+        if statement.lstrip().upper().startswith("SELECT") and table in statement:
+            requetes.append((statement, parameters))
+
+    db.event.listen(db.engine, "before_cursor_execute", _enregistrer)
+    try:
+        for url in urls:
+            assert client.get(url).status_code == 200, url
+    finally:
+        db.event.remove(db.engine, "before_cursor_execute", _enregistrer)
+
+    if db.engine.dialect.name == "sqlite":
+        prefixe, motif = "EXPLAIN QUERY PLAN ", re.compile(rf"^SCAN {table}$")
+    else:
+        prefixe, motif = "EXPLAIN ", re.compile(rf"Seq Scan on {table}\b")
+    connexion = db.session.connection()
+    fautives = []
+    for statement, parameters in requetes:
+        plan = [
+            str(ligne[-1])
+            for ligne in connexion.exec_driver_sql(prefixe + statement, parameters)
+        ]
+        if any(motif.search(etape.strip()) for etape in plan):
+            fautives.append((statement, plan))
+    return fautives
+
+
+def test_listes_documents_sans_balayage_sequentiel(client):
+    _seed_volume()
+    # Classements peuplés : sur une table vide, le plan ne prouverait rien
+    db.session.execute(db.text("UPDATE document SET nb_telechargements = id % 7"))
+    db.session.commit()
+    client.application.test_cli_runner().invoke(args=["classements", "reconstruire"])
+    db.session.execute(db.text("ANALYZE"))
+    premiere = client.get("/api/documents?cursor=&per_page=50").get_json()
+    urls = [
+        # Mode par défaut : page, total exact (COUNT)
+        "/api/documents",
+        "/api/documents?page=50",
+        "/api/documents?fields=id,titre",
+        "/api/documents?universite_id=1",
+        "/api/documents?niveau=L2&type=td",
+        "/api/documents?total=aucun",
+        "/api/documents?type=examen&total=aucun",
+        "/api/documents?matiere_id=3&total=aucun",
+        "/api/documents?niveau=L2&total=aucun",
+        "/api/documents?universite_id=1&type=td&total=aucun",
+        f"/api/documents?per_page=50&cursor={premiere['next_cursor']}",
+        "/api/matieres/3",
+        "/api/universites/1/catalogue",
+        "/api/documents/tendances",
+        "/api/documents/tendances?niveau=L2&total=exact",
+        "/api/documents/mieux-notes?type=examen",
+    ]
+    assert _balayages_sequentiels(client, urls) == []
+    assert client.get("/api/documents/tendances").get_json()["documents"]
+
+
+def test_documents_curseur_invalide(client):
+    assert client.get("/api/documents?cursor=pas-un-curseur").status_code == 400
+    assert client.get("/api/documents?total=parfois").status_code == 400
+
+
+def test_search_curseur_requiert_tri_date(client):
+    _seed_documents(5, votes_par_document=1)
+    assert client.get("/api/search?q=document&cursor=").status_code == 400
+    data = client.get("/api/search?q=document&tri=date&per_page=3&cursor=").get_json()
+    assert len(data["documents"]) == 3
+    suite = client.get(
+        f"/api/search?q=document&tri=date&per_page=3&cursor={data['next_cursor']}"
+    ).get_json()
+    assert len(suite["documents"]) == 2 and suite["next_cursor"] is None
+
+
 # ──────────────────────────────────────────────
-#  STATS
+#  TÂCHES EN ARRIÈRE-PLAN
+# ──────────────────────────────────────────────
+
+
+def test_upload_planifie_la_verification_du_fichier(client):
+    import taches
+
+    # Ancien format Word : ni texte extrait ni aperçu, seule la vérification
+    did = _uploader(client, _auth_header(client), nom="notes.doc")
+    assert client.get(f"/api/documents/{did}").get_json()["statut_traitement"] == "en_attente"
+
+    assert taches.traiter_disponibles() == 1
+    assert client.get(f"/api/documents/{did}").get_json()["statut_traitement"] == "termine"
+    assert taches.traiter_disponibles() == 0
+
+
+def test_verification_detecte_un_fichier_altere(client):
+    import uuid
+    import stockage
+    import taches
+
+    did = _uploader(client, _auth_header(client), contenu=uuid.uuid4().bytes, nom="notes.doc")
+    doc = db.session.get(Document, did)
+    with open(stockage.chemin_absolu(doc.fichier_stockage), "ab") as f:
+        f.write(b"!")
+
+    taches.traiter_disponibles()
+    tache = taches.Tache.query.filter_by(document_id=did).one()
+    # Échec définitif dès le premier essai
+    assert (tache.etat, tache.tentatives) == ("echouee", 1)
+    assert "altéré" in tache.erreur
+    assert client.get(f"/api/documents/{did}").get_json()["statut_traitement"] == "echoue"
+    data = client.get("/api/admin/taches", headers=_admin_header(client)).get_json()
+    assert data["files"]["verifier_fichier"] == {"echouee": 1}
+    assert [e["document_id"] for e in data["echecs"]] == [did]
+
+
+def test_tache_reessayee_avec_delai_puis_abandonnee(client, monkeypatch):
+    import taches
+    from models import maintenant_utc
+
+    essais = []
+
+    def instable(document_id):
+        essais.append(document_id)
+        raise OSError("indisponible")
+
+    monkeypatch.setitem(taches.GESTIONNAIRES, "instable", taches.Gestionnaire(instable, 2))
+    doc = _ajouter_document("À traiter")
+    tache = taches.planifier("instable", document=doc)
+    db.session.commit()
+
+    assert taches.traiter_disponibles(["instable"]) == 1
+    db.session.refresh(tache)
+    assert (tache.etat, tache.tentatives) == ("en_attente", 1)
+    assert tache.disponible_a > maintenant_utc()  # délai avant le prochain essai
+    assert taches.traiter_disponibles(["instable"]) == 0
+
+    tache.disponible_a = maintenant_utc()
+    db.session.commit()
+    assert taches.traiter_disponibles(["instable"]) == 1
+    db.session.refresh(tache)
+    assert (tache.etat, tache.tentatives, len(essais)) == ("echouee", 2, 2)
+    assert db.session.get(Document, doc.id).statut_traitement == "echoue"
+
+
+def test_tache_reprise_apres_delai_de_visibilite(client):
+    import taches
+    from models import maintenant_utc
+
+    doc = _ajouter_document("À traiter")
+    tache = taches.planifier("verifier_fichier", document=doc)
+    db.session.commit()
+
+    # Worker arrêté après réservation : tâche invisible jusqu'au délai
+    [(tid, charge, ancien_jeton)] = taches.reserver("verifier_fichier", 10, visibilite=60)
+    assert db.session.get(Document, doc.id).statut_traitement == "en_cours"
+    assert taches.reserver("verifier_fichier", 10, visibilite=60) == []
+
+    tache.disponible_a = maintenant_utc()
+    db.session.commit()
+    [(_, _, jeton)] = taches.reserver("verifier_fichier", 10, visibilite=60)
+    assert jeton != ancien_jeton
+    # L'ancien worker, s'il se réveille, ne peut plus clore la tâche
+    taches.executer("verifier_fichier", tid, charge, ancien_jeton)
+    db.session.refresh(tache)
+    assert tache.etat == "en_cours"
+    taches.executer("verifier_fichier", tid, charge, jeton)
+    db.session.refresh(tache)
+    assert (tache.etat, tache.tentatives) == ("terminee", 2)
+
+
+def test_tache_reprise_travail_de_l_ancien_worker_annule(client, monkeypatch):
+    import taches
+    from models import maintenant_utc
+
+    def renommer(document_id):
+        db.session.get(Document, document_id).titre = "Écrit sans réservation"
+
+    def echouer(document_id):
+        raise OSError("indisponible")
+
+    monkeypatch.setitem(taches.GESTIONNAIRES, "renommer", taches.Gestionnaire(renommer, 3))
+    monkeypatch.setitem(taches.GESTIONNAIRES, "echouer", taches.Gestionnaire(echouer, 3))
+    doc = _ajouter_document("Original")
+    tache = taches.planifier("renommer", document=doc)
+    db.session.commit()
+
+    [(tid, charge, ancien_jeton)] = taches.reserver("renommer", 10, visibilite=60)
+    tache.disponible_a = maintenant_utc()
+    db.session.commit()
+    taches.reserver("renommer", 10, visibilite=60)
+    # Réservation perdue : l'écriture de l'ancien worker n'est pas validée
+    assert taches.executer("renommer", tid, charge, ancien_jeton) is None
+    db.session.expire_all()
+    assert db.session.get(Document, doc.id).titre == "Original"
+
+    # Tâche supprimée pendant l'exécution d'un gestionnaire en échec
+    tache = taches.planifier("echouer", document=doc)
+    db.session.commit()
+    [(tid, charge, jeton)] = taches.reserver("echouer", 10, visibilite=60)
+    db.session.execute(db.delete(taches.Tache).where(taches.Tache.id == tid))
+    db.session.commit()
+    assert taches.executer("echouer", tid, charge, jeton) is None
+
+
+def test_tache_epuisee_non_reprise_apres_delai(client):
+    import taches
+    from models import maintenant_utc
+
+    doc = _ajouter_document("Fichier empoisonné")
+    tache = taches.planifier("verifier_fichier", document=doc)
+    tache.max_tentatives = 2
+    db.session.commit()
+
+    # Le worker meurt à chaque essai (OOM…) : la tâche n'est jamais close
+    for _ in range(2):
+        assert len(taches.reserver("verifier_fichier", 10, visibilite=60)) == 1
+        tache.disponible_a = maintenant_utc()
+        db.session.commit()
+    assert taches.reserver("verifier_fichier", 10, visibilite=60) == []
+    db.session.refresh(tache)
+    assert (tache.etat, tache.tentatives, tache.jeton) == ("echouee", 2, None)
+    assert db.session.get(Document, doc.id).statut_traitement == "echoue"
+
+
+def test_limites_de_concurrence_par_type(client):
+    import taches
+
+    config = dict(client.application.config, TASKS_CONCURRENCY="verifier_fichier=1, autre=3")
+    limites = taches.limites_concurrence(config, threads=4)
+    assert limites["verifier_fichier"] == 1 and limites["autre"] == 3
+
+
+# ──────────────────────────────────────────────
+#  APERÇUS
+# ──────────────────────────────────────────────
+
+
+def _png(largeur, hauteur, couleur=(200, 30, 30, 128)):
+    Image = pytest.importorskip("PIL.Image")
+    tampon = io.BytesIO()
+    Image.new("RGBA", (largeur, hauteur), couleur).save(tampon, "PNG")
+    return tampon.getvalue()
+
+
+def _pdf():
+    pypdfium2 = pytest.importorskip("pypdfium2")
+    pdf = pypdfium2.PdfDocument.new()
+    pdf.new_page(595, 842)  # A4
+    tampon = io.BytesIO()
+    pdf.save(tampon)
+    return tampon.getvalue()
+
+
+def test_apercus_generes_et_servis_sans_compter_de_telechargement(client, tmp_path):
+    from PIL import Image
+    import taches
+
+    client.application.config["PREVIEW_FOLDER"] = str(tmp_path)
+    png = _uploader(client, _auth_header(client), nom="schema.png", contenu=_png(2000, 1000))
+    pdf = _uploader(client, _auth_header(client), nom="cours.pdf", contenu=_pdf())
+    resp = client.get(f"/api/documents/{png}/apercu/miniature")
+    assert resp.status_code == 202 and "no-store" in resp.headers["Cache-Control"]
+    # Pas de seconde génération planifiée tant que la première est en attente
+    assert taches.Tache.query.filter_by(type="generer_apercus").count() == 2
+
+    taches.traiter_disponibles()
+    for did, attendu in ((png, (320, 160)), (pdf, (226, 320))):
+        resp = client.get(f"/api/documents/{did}/apercu/miniature")
+        assert resp.status_code == 200 and resp.mimetype == "image/jpeg"
+        assert Image.open(io.BytesIO(resp.data)).size == attendu
+        assert "immutable" in resp.headers["Cache-Control"]
+        assert "max-age=31536000" in resp.headers["Cache-Control"]
+        revalidation = client.get(
+            f"/api/documents/{did}/apercu/miniature", headers={"If-None-Match": resp.headers["ETag"]}
+        )
+        assert revalidation.status_code == 304
+    grand = client.get(f"/api/documents/{png}/apercu/apercu")
+    assert Image.open(io.BytesIO(grand.data)).size == (1200, 600)
+    assert client.get(f"/api/documents/{png}/apercu/original").status_code == 404
+    assert client.get(f"/api/documents/{png}").get_json()["nb_telechargements"] == 0
+
+
+def test_apercus_evinces_puis_regeneres(client, tmp_path):
+    import apercus
+    import taches
+
+    client.application.config["PREVIEW_FOLDER"] = str(tmp_path)
+    ids = [
+        _uploader(client, _auth_header(client), nom=f"img{i}.png", contenu=_png(400, 400, (i, 0, 0, 255)))
+        for i in range(3)
+    ]
+    taches.traiter_disponibles()
+    docs = [db.session.get(Document, did) for did in ids]
+    # Le premier document vient d'être servi ; le deuxième est le plus ancien
+    for age, doc in zip((10, 3000, 2000), docs):
+        for rendu in apercus.RENDUS:
+            os.utime(apercus.chemin(doc, rendu), (time.time() - age,) * 2)
+    tailles = [
+        sum(os.path.getsize(apercus.chemin(doc, r)) for r in apercus.RENDUS) for doc in docs
+    ]
+    # Cache plein : l'éviction redescend sous 90 % de la limite
+    limite = int(tailles[0] / apercus.MARGE_EVICTION) + 1
+    assert apercus.evincer(apercus.dossier(), sum(tailles)) == (0, sum(tailles))
+    assert apercus.evincer(apercus.dossier(), limite) == (4, tailles[0])
+    assert [apercus.lire(doc, "miniature") is not None for doc in docs] == [True, False, False]
+
+    assert client.get(f"/api/documents/{ids[1]}/apercu/miniature").status_code == 202
+    assert taches.traiter_disponibles() == 1
+    assert client.get(f"/api/documents/{ids[1]}/apercu/miniature").status_code == 200
+
+
+def test_apercu_regenere_une_seule_fois(client, tmp_path):
+    import apercus
+    import taches
+
+    client.application.config["PREVIEW_FOLDER"] = str(tmp_path)
+    did = _uploader(client, _auth_header(client), nom="img.png", contenu=_png(40, 40))
+    taches.traiter_disponibles()
+    doc = db.session.get(Document, did)
+    for rendu in apercus.RENDUS:
+        os.remove(apercus.chemin(doc, rendu))
+
+    # Deux affichages simultanés : le second ne voit pas encore la tâche du
+    # premier, l'index unique empêche le doublon
+    assert taches.planifier_si_absente("generer_apercus", did)
+    assert not taches.planifier_si_absente("generer_apercus", did)
+    db.session.commit()
+    assert client.get(f"/api/documents/{did}/apercu/miniature").status_code == 202
+    a_faire = taches.Tache.query.filter(
+        taches.Tache.type == "generer_apercus", taches.Tache.etat.in_(taches.A_FAIRE)
+    )
+    assert a_faire.count() == 1
+    assert taches.traiter_disponibles() == 1
+    assert client.get(f"/api/documents/{did}/apercu/miniature").status_code == 200
+
+
+def test_apercu_fichier_illisible(client):
+    import taches
+
+    _png(1, 1)  # Pillow requis
+    did = _uploader(client, _auth_header(client), nom="casse.png", contenu=b"pas une image")
+    taches.traiter_disponibles()
+    tache = taches.Tache.query.filter_by(document_id=did, type="generer_apercus").one()
+    assert tache.etat == "echouee"
+    # Échec définitif : pas de nouvelle génération à chaque affichage
+    assert client.get(f"/api/documents/{did}/apercu/miniature").status_code == 404
+    assert taches.Tache.query.filter_by(type="generer_apercus").count() == 1
+
+
+# ──────────────────────────────────────────────
+#  VOTES
+# ──────────────────────────────────────────────
+
+
+def test_vote_agregats_insert_et_mise_a_jour(client):
+    _seed_documents(1, votes_par_document=2)  # notes 1 et 2
+    headers = _auth_header(client)
+
+    resp = client.post("/api/documents/1/vote", json={"note": 5}, headers=headers)
+    assert resp.status_code == 200
+    assert resp.get_json()["note_moyenne"] == round(8 / 3, 1)
+    assert resp.get_json()["vote"]["note"] == 5
+
+    # Re-vote du même utilisateur : mise à jour, pas de nouveau vote
+    resp = client.post("/api/documents/1/vote", json={"note": 3}, headers=headers)
+    assert resp.get_json()["note_moyenne"] == 2.0
+
+    doc = db.session.get(Document, 1)
+    assert (doc.vote_count, doc.vote_sum) == (3, 6)
+    assert Vote.query.filter_by(document_id=1).count() == 3
+
+
+def test_vote_invalide_etag_des_listes(client):
+    _seed_documents(1, votes_par_document=1)
+    headers = _auth_header(client)
+    resp = client.get("/api/documents")
+    etag = resp.headers["ETag"]
+    assert resp.headers["Cache-Control"] == "no-cache"
+    assert client.get("/api/documents", headers={"If-None-Match": etag}).status_code == 304
+
+    client.post("/api/documents/1/vote", json={"note": 5}, headers=headers)
+    resp = client.get("/api/documents", headers={"If-None-Match": etag})
+    assert resp.status_code == 200
+    assert resp.get_json()["documents"][0]["note_moyenne"] == 3.0
+
+
+def test_versions_reparties_en_tranches(client):
+    from versions import lire_versions
+
+    _seed_documents(1)
+    headers = _auth_header(client)
+    etag = client.get("/api/documents").headers["ETag"]
+    avant = lire_versions(("document", "utilisateur"))
+    for note in (1, 2, 3, 4, 5) * 8:
+        client.post("/api/documents/1/vote", json={"note": note}, headers=headers)
+
+    versions = lire_versions(("document", "utilisateur"))
+    assert versions["document"][0] == avant["document"][0] + 40
+    # Les votes ne touchent pas aux utilisateurs
+    assert versions["utilisateur"] == avant["utilisateur"]
+    tranches = db.session.execute(
+        db.text("SELECT COUNT(*) FROM version_donnees WHERE nom_table = 'document'")
+    ).scalar()
+    assert tranches > 1
+    assert client.get("/api/documents", headers={"If-None-Match": etag}).status_code == 200
+
+
+def test_listes_independantes_des_utilisateurs(client):
+    _seed_documents(1)
+    etag = client.get("/api/documents").headers["ETag"]
+    _register(client, email="nouveau@test.com")
+    assert client.get("/api/documents", headers={"If-None-Match": etag}).status_code == 304
+
+
+def test_vote_note_invalide(client):
+    _seed_documents(1)
+    headers = _auth_header(client)
+    resp = client.post("/api/documents/1/vote", json={"note": 7}, headers=headers)
+    assert resp.status_code == 400
+
+
+def test_migration_backfill_agregats(tmp_path):
+    from flask_migrate import upgrade
+
+    app = create_app(
+        {
+            "SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'migr.db'}",
+            "TESTING": True,
+        }
+    )
+    with app.app_context():
+        db.drop_all()
+        upgrade(revision="0001_schema_initial")
+        for sql in (
+            "INSERT INTO universite (id, nom, sigle, ville) VALUES (1, 'U', 'U', 'V')",
+            "INSERT INTO filiere (id, nom, universite_id) VALUES (1, 'F', 1)",
+            "INSERT INTO matiere (id, nom, filiere_id, niveau) VALUES (1, 'M', 1, 'L1')",
+            "INSERT INTO utilisateur (id, nom, prenom, email, mot_de_passe) VALUES (1, 'a', 'b', 'c', 'd')",
+            "INSERT INTO utilisateur (id, nom, prenom, email, mot_de_passe) VALUES (2, 'a', 'b', 'e', 'd')",
+            "INSERT INTO document (id, titre, type, fichier_nom, fichier_stockage, matiere_id, auteur_id) "
+            "VALUES (1, 't', 'cours', 'f', 'f', 1, 1)",
+            "INSERT INTO vote (document_id, utilisateur_id, note) VALUES (1, 1, 4)",
+            "INSERT INTO vote (document_id, utilisateur_id, note) VALUES (1, 2, 5)",
+        ):
+            db.session.execute(db.text(sql))
+        db.session.commit()
+
+        upgrade()
+        row = db.session.execute(
+            db.text("SELECT vote_count, vote_sum FROM document WHERE id = 1")
+        ).one()
+        assert tuple(row) == (2, 9)
+
+
+def test_migrations_downgrade_conserve_les_triggers(tmp_path):
+    from flask_migrate import downgrade, upgrade
+
+    app = create_app(
+        {
+            "SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'retour.db'}",
+            "TESTING": True,
+        }
+    )
+    with app.app_context():
+        db.drop_all()
+        upgrade()
+        downgrade(revision="0004_session_upload")
+        colonnes = {c["name"] for c in db.inspect(db.engine).get_columns("document")}
+        assert not {"fichier_sha256", "statut_traitement"} & colonnes
+        triggers = set(db.session.execute(
+            db.text("SELECT name FROM sqlite_master WHERE type = 'trigger'")
+        ).scalars())
+        assert {"document_fts_ai", "document_fts_au", "document_fts_ad"} <= triggers
+
+
+# ──────────────────────────────────────────────
+#  CLASSEMENTS
+# ──────────────────────────────────────────────
+
+
+def _voter(document_id, notes):
+    """Un vote par note, chacun d'un nouvel utilisateur."""
+    depart = Utilisateur.query.count()
+    for i, note in enumerate(notes):
+        u = Utilisateur(nom="Votant", prenom=str(i), email=f"votant{depart + i}@test.com")
+        u.mot_de_passe = "x"
+        db.session.add(u)
+        db.session.flush()
+        enregistrer_vote(document_id, u.id, note)
+    db.session.commit()
+
+
+def test_telechargements_et_votes_journalises_puis_consommes(client):
+    import classements
+    from models import Activite, Classement
+
+    headers = _auth_header(client)
+    did = _uploader(client, headers)
+    client.get(f"/api/documents/{did}/download").close()
+    client.get(f"/api/documents/{did}/download").close()
+    client.post(f"/api/documents/{did}/vote", json={"note": 4}, headers=headers)
+    activites = sorted((a.type, a.valeur) for a in Activite.query)
+    # Compteur vidé à chaque téléchargement (DOWNLOAD_COUNTER_FLUSH_INTERVAL = 0)
+    assert activites == [("telechargement", 1), ("telechargement", 1), ("vote", 4)]
+
+    assert classements.actualiser() == 3
+    assert Activite.query.count() == 0
+    classement = db.session.get(Classement, did)
+    assert classement.note_bayesienne == 4.0  # moyenne globale = seule note
+    # 2 téléchargements + 1 vote (poids 3), à peine décrus
+    lam = classements.decroissance(client.application.config)
+    score = classements.tendance_a(classement.score_tendance, datetime.datetime.utcnow(), lam)
+    assert score == pytest.approx(5, rel=1e-3)
+
+
+def test_tendances_decroissance_et_filtres(client):
+    import classements
+    from models import Activite
+
+    ancien = _ajouter_document("Ancien succès")
+    recent = _ajouter_document("Nouveauté", type="td")
+    _ajouter_document("Jamais consulté")
+    il_y_a_10_jours = datetime.datetime.utcnow() - datetime.timedelta(days=10)
+    db.session.add_all([
+        Activite(document_id=ancien.id, type="telechargement", valeur=10,
+                 created_at=il_y_a_10_jours),
+        Activite(document_id=recent.id, type="telechargement", valeur=2),
+    ])
+    db.session.commit()
+    classements.actualiser()
+
+    resp = client.get("/api/documents/tendances")
+    documents = resp.get_json()["documents"]
+    # Demi-vie de 72 h : 10 téléchargements vieux de 10 jours pèsent moins que 2 récents
+    assert [d["titre"] for d in documents] == ["Nouveauté", "Ancien succès"]
+    assert documents[0]["score"] == pytest.approx(2, abs=0.01)
+    assert documents[1]["score"] == pytest.approx(10 * 2 ** (-240 / 72), abs=0.01)
+    assert resp.get_json()["total"] is None  # pas de COUNT par défaut
+    assert client.get("/api/documents/tendances?total=exact").get_json()["total"] == 2
+
+    resp = client.get("/api/documents/tendances?type=cours&fields=titre,score")
+    assert resp.get_json()["documents"] == [
+        {"titre": "Ancien succès", "score": documents[1]["score"]}
+    ]
+    assert client.get("/api/documents/tendances?matiere_id=2").get_json()["documents"] == []
+    assert client.get("/api/documents/tendances?cursor=abc").status_code == 400
+
+    # Une nouvelle activité s'ajoute au score existant
+    db.session.add(Activite(document_id=ancien.id, type="telechargement", valeur=3))
+    db.session.commit()
+    classements.actualiser()
+    documents = client.get("/api/documents/tendances").get_json()["documents"]
+    assert documents[0]["titre"] == "Ancien succès"
+    assert documents[0]["score"] == pytest.approx(3 + 10 * 2 ** (-240 / 72), abs=0.01)
+
+
+def test_mieux_notes_moyenne_bayesienne(client):
+    import classements
+
+    unique = _ajouter_document("Une seule note")
+    populaire = _ajouter_document("Bien noté par beaucoup")
+    moyen = _ajouter_document("Moyen")
+    _voter(unique.id, [5])
+    _voter(populaire.id, [5, 4] * 10)
+    _voter(moyen.id, [3] * 10)
+    classements.actualiser()
+
+    documents = client.get("/api/documents/mieux-notes").get_json()["documents"]
+    assert [d["titre"] for d in documents] == ["Bien noté par beaucoup", "Une seule note", "Moyen"]
+    moyenne = (5 + 90 + 30) / 31
+    assert documents[1]["score"] == round((5 * moyenne + 5) / 6, 2)
+
+    # Dérive de la moyenne globale : toutes les notes sont recalculées
+    _voter(moyen.id, [1] * 20)
+    classements.actualiser()
+    moyenne = (5 + 90 + 50) / 51
+    documents = client.get("/api/documents/mieux-notes").get_json()["documents"]
+    assert documents[1]["score"] == round((5 * moyenne + 5) / 6, 2)
+
+
+def test_reconstruire_classements(client):
+    from models import Activite, Classement
+
+    doc = _ajouter_document("Historique", nb_telechargements=7)
+    _ajouter_document("Sans activité")
+    _voter(doc.id, [4, 5])
+    resultat = client.application.test_cli_runner().invoke(args=["classements", "reconstruire"])
+    assert "1 document(s) classé(s)" in resultat.output
+    assert Activite.query.count() == 0
+    assert db.session.get(Classement, doc.id).note_bayesienne == 4.5
+
+    documents = client.get("/api/documents/tendances").get_json()["documents"]
+    assert [d["id"] for d in documents] == [doc.id]
+
+
+def test_actualisation_periodique_sans_doublon(client):
+    import taches
+    from models import Tache
+
+    client.application.config["RANKINGS_REFRESH_INTERVAL"] = 3600
+    echeances = {}
+    taches.planifier_periodiques(echeances)
+    taches.planifier_periodiques(echeances)  # échéance non atteinte
+    echeances.clear()
+    taches.planifier_periodiques(echeances)  # échue, mais déjà en attente
+    assert Tache.query.filter_by(type="actualiser_classements").count() == 1
+    assert taches.traiter_disponibles(["actualiser_classements"]) == 1
+
+
+# ──────────────────────────────────────────────
+#  RECHERCHE
+# ──────────────────────────────────────────────
+
+
+def test_search_no_query(client):
+    resp = client.get("/api/search")
+    assert resp.status_code == 400
+
+
+def test_search(client):
+    resp = client.get("/api/search?q=algo")
+    assert resp.status_code == 200
+    assert "documents" in resp.get_json()
+
+
+def _ajouter_document(titre, description="", matiere_id=1, **kwargs):
+    auteur = Utilisateur.query.first()
+    if auteur is None:
+        auteur = Utilisateur(nom="Auteur", prenom="A", email="auteur@test.com")
+        auteur.mot_de_passe = "x"
+        db.session.add(auteur)
+        db.session.flush()
+    doc = Document(
+        titre=titre,
+        description=description,
+        type=kwargs.pop("type", "cours"),
+        fichier_nom="f.pdf",
+        fichier_stockage="f.pdf",
+        matiere_id=matiere_id,
+        auteur_id=auteur.id,
+        statut=kwargs.pop("statut", "approuve"),
+        **kwargs,
+    )
+    db.session.add(doc)
+    db.session.commit()
+    return doc
+
+
+def test_search_sans_accents(client):
+    _ajouter_document("Algèbre linéaire", "Espaces vectoriels")
+    _ajouter_document("Analyse réelle")
+    resp = client.get("/api/search?q=algebre")
+    titres = [d["titre"] for d in resp.get_json()["documents"]]
+    assert titres == ["Algèbre linéaire"]
+
+
+def test_search_matiere_et_prefixe(client):
+    _ajouter_document("Examen 2023")
+    resp = client.get("/api/search?q=algorithm")  # matière « Algorithmique »
+    assert resp.get_json()["total"] == 1
+
+
+def test_search_tri_pertinence_et_date(client):
+    import datetime
+
+    ancien = datetime.datetime(2020, 1, 1)
+    recent = datetime.datetime(2024, 1, 1)
+    _ajouter_document("Graphes", "Parcours en largeur", created_at=ancien)
+    _ajouter_document("Corrigé TD", "Exercices sur les graphes", created_at=recent)
+
+    par_pertinence = client.get("/api/search?q=graphes").get_json()["documents"]
+    assert [d["titre"] for d in par_pertinence] == ["Graphes", "Corrigé TD"]
+
+    par_date = client.get("/api/search?q=graphes&tri=date").get_json()["documents"]
+    assert [d["titre"] for d in par_date] == ["Corrigé TD", "Graphes"]
+
+
+def test_search_index_suit_modifications(client):
+    doc = _ajouter_document("Topologie")
+    doc.titre = "Probabilités"
+    db.session.commit()
+    assert client.get("/api/search?q=topologie").get_json()["total"] == 0
+    assert client.get("/api/search?q=probabilites").get_json()["total"] == 1
+
+    db.session.delete(doc)
+    db.session.commit()
+    assert client.get("/api/search?q=probabilites").get_json()["total"] == 0
+
+
+def test_search_tri_invalide(client):
+    assert client.get("/api/search?q=algo&tri=hasard").status_code == 400
+
+
+def _office(membres):
+    import zipfile
+
+    tampon = io.BytesIO()
+    with zipfile.ZipFile(tampon, "w") as archive:
+        for nom, xml in membres.items():
+            archive.writestr(nom, xml)
+    return tampon.getvalue()
+
+
+def _docx(*paragraphes):
+    corps = "".join(f"<w:p><w:r><w:t>{p}</w:t></w:r></w:p>" for p in paragraphes)
+    return _office({"word/document.xml": (
+        '<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">'
+        f"<w:body>{corps}</w:body></w:document>"
+    )})
+
+
+def _pptx(*diapositives):
+    return _office({
+        f"ppt/slides/slide{i}.xml": (
+            '<p:sld xmlns:p="http://schemas.openxmlformats.org/presentationml/2006/main" '
+            'xmlns:a="http://schemas.openxmlformats.org/drawingml/2006/main">'
+            f"<a:p><a:r><a:t>{texte}</a:t></a:r></a:p></p:sld>"
+        )
+        for i, texte in enumerate(diapositives, start=1)
+    })
+
+
+def test_search_dans_le_contenu_avec_extrait(client):
+    import taches
+
+    did = _uploader(client, _auth_header(client), nom="cours.docx", contenu=_docx(
+        "Introduction générale.",
+        "Le tri rapide choisit un pivot puis partitionne le tableau.",
+    ))
+    db.session.get(Document, did).statut = "approuve"
+    db.session.commit()
+    assert client.get("/api/search?q=pivot").get_json()["total"] == 0
+
+    assert taches.traiter_disponibles() == 2  # vérification + extraction
+    assert client.get(f"/api/documents/{did}").get_json()["statut_traitement"] == "termine"
+    [resultat] = client.get("/api/search?q=PIVOT partition").get_json()["documents"]
+    extrait = resultat["extrait"]
+    assert "choisit un pivot puis partitionne" in extrait["texte"]
+    assert [extrait["texte"][d:f] for d, f in extrait["surlignages"]] == ["pivot", "partitionne"]
+    # Correspondance sur les métadonnées seules : pas d'extrait
+    [resultat] = client.get("/api/search?q=algo").get_json()["documents"]
+    assert resultat["extrait"] is None
+    # Mots répartis entre titre et contenu : aucun des deux ne les contient tous
+    assert client.get("/api/search?q=cours pivot").get_json()["total"] == 0
+
+
+def _pdf_texte(*pages):
+    """PDF minimal écrit à la main : une ligne de texte (Helvetica) par page."""
+    n = len(pages)
+    objets = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [%s] /Count %d >>"
+        % (b" ".join(b"%d 0 R" % (4 + 2 * i) for i in range(n)), n),
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    for i, texte in enumerate(pages):
+        flux = b"BT /F1 12 Tf 72 720 Td (%s) Tj ET" % texte.encode("latin-1")
+        objets.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % (5 + 2 * i)
+        )
+        objets.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(flux), flux))
+    pdf, positions = bytearray(b"%PDF-1.4\n"), []
+    for numero, objet in enumerate(objets, 1):
+        positions.append(len(pdf))
+        pdf += b"%d 0 obj\n%s\nendobj\n" % (numero, objet)
+    xref = len(pdf)
+    pdf += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objets) + 1)
+    pdf += b"".join(b"%010d 00000 n \n" % p for p in positions)
+    pdf += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (
+        len(objets) + 1, xref
+    )
+    return bytes(pdf)
+
+
+def test_extraction_pdf(client):
+    import extraction
+    import taches
+
+    if extraction.PdfReader is None:
+        pytest.skip("pypdf non installé")
+    contenu = _pdf_texte("Theoreme de Bezout", "Algorithme d'Euclide", "Annexe")
+    chemin = os.path.join(client.application.config["UPLOAD_FOLDER"], "cours.pdf")
+    with open(chemin, "wb") as f:
+        f.write(contenu)
+    texte, tronque = extraction.extraire_fichier(chemin, "pdf", 1000, 2)
+    assert texte == "Theoreme de Bezout\nAlgorithme d'Euclide" and not tronque
+
+    did = _uploader(client, _auth_header(client), contenu=contenu, nom="arith.pdf")
+    taches.traiter_disponibles()
+    resp = client.get("/api/search?q=euclide")
+    assert [d["id"] for d in resp.get_json()["documents"]] == [did]
+
+
+def test_extraction_pptx_et_fichier_corrompu(client):
+    import extraction
+    import taches
+
+    chemin = os.path.join(client.application.config["UPLOAD_FOLDER"], "diapos.pptx")
+    with open(chemin, "wb") as f:
+        f.write(_pptx(*(f"Diapo {i}" for i in range(1, 12))))
+    texte, tronque = extraction.extraire_fichier(chemin, "pptx", 1000, 500)
+    assert texte.split("\n")[:3] == ["Diapo 1", "Diapo 2", "Diapo 3"] and not tronque
+    assert extraction.extraire_fichier(chemin, "pptx", 14, 500) == ("Diapo 1\nDiapo", True)
+    assert extraction.extraire_fichier(chemin, "pptx", 1000, 2)[0] == "Diapo 1\nDiapo 2"
+
+    did = _uploader(client, _auth_header(client), nom="casse.docx", contenu=b"pas un zip")
+    taches.traiter_disponibles()
+    tache = taches.Tache.query.filter_by(document_id=did, type="extraire_texte").one()
+    assert (tache.etat, tache.tentatives) == ("echouee", 1)
+    assert client.get(f"/api/documents/{did}").get_json()["statut_traitement"] == "echoue"
+
+
+def test_indexation_du_corpus_existant(client):
+    from models import DocumentTexte
+
+    ids = [
+        _uploader(client, _auth_header(client), nom=f"td{i}.docx",
+                  contenu=_docx(f"Exercice {i} : arbres binaires de recherche."))
+        for i in range(3)
+    ]
+    Document.query.update({"statut": "approuve"})
+    db.session.commit()
+    resultat = client.application.test_cli_runner().invoke(
+        args=["texte", "indexer", "--processus", "2", "--lot", "2"]
+    )
+    assert resultat.exit_code == 0, resultat.output
+    assert "3 document(s) indexé(s), 0 échec(s) sur 3" in resultat.output
+    assert DocumentTexte.query.count() == 3
+    trouves = client.get("/api/search?q=arbres binaires").get_json()["documents"]
+    assert sorted(d["id"] for d in trouves) == sorted(ids)
+
+    # Documents déjà indexés ignorés, sauf --tous
+    sortie = client.application.test_cli_runner().invoke(args=["texte", "indexer"]).output
+    assert "sur 0" in sortie
+    db.session.delete(db.session.get(Document, ids[0]))
+    db.session.commit()
+    assert DocumentTexte.query.count() == 2
+    assert client.get("/api/search?q=arbres").get_json()["total"] == 2
+
+
+def test_indexation_continue_apres_erreur_inattendue(client, monkeypatch):
+    import extraction
+    import stockage
+    from models import DocumentTexte
+
+    ids = [
+        _uploader(client, _auth_header(client), nom=f"cours{i}.docx",
+                  contenu=_docx(f"Chapitre {i} : graphes orientés."))
+        for i in range(3)
+    ]
+    extraire = extraction.extraire_fichier
+    fichier_casse = stockage.chemin_absolu(db.session.get(Document, ids[1]).fichier_stockage)
+
+    def extraire_fichier(chemin, *args, **kwargs):
+        if chemin == fichier_casse:
+            raise RuntimeError("bogue du lecteur")
+        return extraire(chemin, *args, **kwargs)
+
+    monkeypatch.setattr(extraction, "extraire_fichier", extraire_fichier)
+    resultat = client.application.test_cli_runner().invoke(
+        args=["texte", "indexer", "--processus", "1", "--tous"]
+    )
+    assert resultat.exit_code == 0, resultat.output
+    assert "2 document(s) indexé(s), 1 échec(s) sur 3" in resultat.output
+    assert f"Document {ids[1]} : RuntimeError : bogue du lecteur" in resultat.output
+    assert {t.document_id for t in DocumentTexte.query} >= {ids[0], ids[2]}
+
+
+# ──────────────────────────────────────────────
+#  CONNEXIONS
+# ──────────────────────────────────────────────
+
+
+def test_options_pool_postgresql():
+    from connexions import PoolInstrumente, options_moteur
+
+    config = dict(create_app({"SQLALCHEMY_DATABASE_URI": "sqlite:///:memory:"}).config)
+    assert options_moteur(config) is None
+
+    config["SQLALCHEMY_DATABASE_URI"] = "postgresql://u:p@h/db"
+    options = options_moteur(config)
+    assert issubclass(options["poolclass"], PoolInstrumente)
+    assert options["pool_pre_ping"] is True
+    assert "statement_timeout" in options["connect_args"]["options"]
+
+    config["DB_PGBOUNCER"] = True
+    assert "connect_args" not in options_moteur(config)
+
+
+def test_pool_instrumente_mesure_les_attentes(tmp_path):
+    from sqlalchemy import create_engine
+    from sqlalchemy.exc import TimeoutError as DelaiPoolDepasse
+    from connexions import classe_pool
+
+    engine = create_engine(
+        f"sqlite:///{tmp_path / 'pool.db'}",
+        poolclass=classe_pool("test"), pool_size=1, max_overflow=0, pool_timeout=0.05,
+    )
+    metriques = engine.pool.metriques
+    connexion = engine.connect()
+    with pytest.raises(DelaiPoolDepasse):
+        engine.connect()
+    connexion.close()
+    engine.connect().close()
+
+    stats = metriques.statistiques()
+    assert (stats["obtentions"], stats["delais_depasses"]) == (2, 1)
+    assert stats["attente_max_ms"] >= 50
+    assert sum(stats["histogramme_ms"].values()) == 3
+    engine.dispose()
+
+
+def test_delai_requete_depasse_renvoie_503(client, monkeypatch):
+    import routes
+    from sqlalchemy.exc import OperationalError
+
+    class RequeteAnnulee(Exception):
+        pgcode = "57014"
+
+    def _trop_lent(*args, **kwargs):
+        raise OperationalError("SELECT …", {}, RequeteAnnulee())
+
+    monkeypatch.setattr(routes, "rechercher", _trop_lent)
+    resp = client.get("/api/search?q=algo")
+    assert resp.status_code == 503
+    assert resp.headers["Retry-After"] == "5"
+
+
+# ──────────────────────────────────────────────
+#  RÉPLICA EN LECTURE
+# ──────────────────────────────────────────────
+
+
+def test_lectures_routees_vers_le_replica(tmp_path):
+    import shutil
+
+    principale, replica = tmp_path / "principale.db", tmp_path / "replica.db"
+    app = create_app(
+        {
+            "SQLALCHEMY_DATABASE_URI": f"sqlite:///{principale}",
+            "SQLALCHEMY_REPLICA_URI": f"sqlite:///{replica}",
+            "PASSWORD_HASH_WORKERS": 0,
+        }
+    )
+    with app.app_context():
+        _seed_test_data()
+        _ajouter_document("Commun")
+    shutil.copy(principale, replica)
+    with app.app_context():
+        _ajouter_document("Absent du réplica")
+
+    def nb_documents(client):
+        return len(client.get("/api/documents").get_json()["documents"])
+
+    # Réplica à jour (retard < REPLICA_MAX_LAG_SECONDS) : il sert les lectures
+    lecteur = app.test_client()
+    assert nb_documents(lecteur) == 1
+
+    # Un client qui vient d'écrire lit ses écritures sur la base principale
+    auteur = app.test_client()
+    assert _register(auteur).status_code == 201
+    assert nb_documents(auteur) == 2
+    assert nb_documents(lecteur) == 1
+
+    # Réplica trop en retard : retour sur la base principale pour tous
+    moteur = app.extensions["replica"].engine
+    with moteur.begin() as connexion:
+        connexion.execute(
+            db.text("UPDATE version_donnees SET modifie_a = :date"),
+            {"date": datetime.datetime(2000, 1, 1)},
+        )
+    app.extensions["replica"]._verifie_a = None
+    assert nb_documents(lecteur) == 2
+
+    stats = app.extensions["replica"].statistiques()
+    assert stats["sain"] is False and stats["retard_s"] > 60
+    assert (stats["lectures_replica"], stats["lectures_primaire"]) == (2, 2)
+    moteur.dispose()
+
+
+def test_retard_replica_mesure_par_postgresql(tmp_path):
+    from unittest import mock
+
+    app = create_app(
+        {
+            "SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'p.db'}",
+            "SQLALCHEMY_REPLICA_URI": f"sqlite:///{tmp_path / 'r.db'}",
+        }
+    )
+    replica = app.extensions["replica"]
+    replica.engine.dispose()
+    # Réplica PostgreSQL simulé : le retard vient de la requête de rejeu,
+    # pas de l'âge des dernières modifications dans version_donnees
+    replica.engine = mock.MagicMock()
+    replica.engine.dialect.name = "postgresql"
+    resultat = replica.engine.connect.return_value.__enter__.return_value.execute.return_value
+    with app.app_context():
+        resultat.scalar.return_value = 0
+        assert replica.mesurer_retard() == 0.0
+        resultat.scalar.return_value = 12.5
+        assert replica.mesurer_retard() == 12.5
+        # WAL receiver déconnecté : la requête rend NULL, réplica écarté
+        resultat.scalar.return_value = None
+        assert replica.mesurer_retard() == float("inf")
+    requete = str(replica.engine.connect.return_value.__enter__.return_value.execute.call_args[0][0])
+    assert "pg_stat_wal_receiver" in requete and "'streaming'" in requete
+
+
+# ──────────────────────────────────────────────
+#  IMPORT EN MASSE
+# ──────────────────────────────────────────────
+
+
+def _ecrire(chemin, lignes):
+    chemin.write_text("\n".join(lignes) + "\n", encoding="utf-8")
+    return str(chemin)
+
+
+def _importer(client, entite, chemin, *options):
+    resultat = client.application.test_cli_runner().invoke(
+        args=["importer", entite, chemin, *options]
+    )
+    assert resultat.exit_code == 0, resultat.output
+    return resultat.output
+
+
+def test_import_en_masse_resout_les_cles_naturelles(client, tmp_path):
+    import json
+
+    _importer(client, "universites", _ecrire(tmp_path / "u.csv", [
+        "nom,sigle,ville",
+        "Université Gaston Berger,UGB,Saint-Louis",
+        "Doublon dans le fichier,UGB,Ailleurs",
+        "Déjà en base,UT,Dakar",
+    ]))
+    _importer(client, "filieres", _ecrire(tmp_path / "f.jsonl", [
+        json.dumps({"universite": "UGB", "nom": "Mathématiques"}),
+        json.dumps({"universite": "INCONNUE", "nom": "Physique"}),
+    ]))
+    _importer(client, "matieres", _ecrire(tmp_path / "m.csv", [
+        "universite,filiere,nom,niveau",
+        "UGB,Mathématiques,Analyse,L1",
+        "UT,Informatique,Algorithmique,L1",
+    ]))
+    _importer(client, "utilisateurs", _ecrire(tmp_path / "a.csv", [
+        "nom,prenom,email,universite,filiere,niveau",
+        "Ndiaye,Fatou,fatou@ugb.sn,UGB,Mathématiques,L1",
+    ]))
+    sortie = _importer(client, "documents", _ecrire(tmp_path / "d.jsonl", [
+        json.dumps({"titre": "Suites", "type": "cours", "fichier_nom": "suites.pdf",
+                    "universite": "UGB", "filiere": "Mathématiques", "matiere": "Analyse",
+                    "niveau": "L1", "auteur": "fatou@ugb.sn", "taille": 1200,
+                    "created_at": "2024-03-01T10:00:00+00:00"}),
+        json.dumps({"titre": "Orphelin", "type": "cours", "fichier_nom": "o.pdf",
+                    "universite": "UGB", "filiere": "Mathématiques", "matiere": "Analyse",
+                    "niveau": "L2", "auteur": "fatou@ugb.sn"}),
+        json.dumps({"titre": "Type inconnu", "type": "roman", "fichier_nom": "r.pdf",
+                    "universite": "UGB", "filiere": "Mathématiques", "matiere": "Analyse",
+                    "niveau": "L1", "auteur": "fatou@ugb.sn"}),
+    ]))
+    assert "3 enregistrement(s) lu(s), 1 inséré(s), 2 ignoré(s)" in sortie
+    assert "lignes/s" in sortie
+
+    ugb = Universite.query.filter_by(sigle="UGB").one()
+    assert ugb.nom == "Université Gaston Berger"
+    assert Universite.query.count() == 2 and Filiere.query.count() == 2
+    assert Matiere.query.count() == 2
+    auteur = Utilisateur.query.filter_by(email="fatou@ugb.sn").one()
+    assert auteur.universite_id == ugb.id and not auteur.check_password("")
+    doc = Document.query.filter_by(titre="Suites").one()
+    assert (doc.auteur_id, doc.matiere.nom, doc.taille) == (auteur.id, "Analyse", 1200)
+    assert doc.created_at == datetime.datetime(2024, 3, 1, 10, 0)
+    assert [d["titre"] for d in client.get("/api/documents").get_json()["documents"]] == [
+        "Suites"
+    ]
+
+
+def test_import_reprend_apres_le_dernier_lot_valide(client, tmp_path, monkeypatch):
+    import importation
+
+    _importer(client, "utilisateurs", _ecrire(tmp_path / "a.csv", [
+        "nom,prenom,email", "Sow,Ali,ali@test.com",
+    ]))
+    entete = "titre,type,fichier_nom,universite,filiere,matiere,niveau,auteur"
+    chemin = _ecrire(tmp_path / "d.csv", [entete] + [
+        f"Doc {i},td,d{i}.pdf,UT,Informatique,Algorithmique,L1,ali@test.com"
+        for i in range(10)
+    ])
+
+    lot_reel, appels = importation.importer_lot, []
+
+    def interrompre_au_troisieme_lot(entite, lignes):
+        appels.append(len(lignes))
+        if len(appels) == 3:
+            raise RuntimeError("connexion perdue")
+        return lot_reel(entite, lignes)
+
+    monkeypatch.setattr(importation, "importer_lot", interrompre_au_troisieme_lot)
+    resultat = client.application.test_cli_runner().invoke(
+        args=["importer", "documents", chemin, "--lot", "3"]
+    )
+    assert isinstance(resultat.exception, RuntimeError)
+    db.session.rollback()
+    assert Document.query.count() == 6
+
+    monkeypatch.setattr(importation, "importer_lot", lot_reel)
+    _importer(client, "documents", chemin, "--lot", "3")
+    assert Document.query.count() == 10
+    assert len({d.titre for d in Document.query}) == 10
+    # Fichier déjà importé en entier : rien n'est relu
+    assert "10 inséré(s)" in _importer(client, "documents", chemin)
+    assert Document.query.count() == 10
+
+
+# ──────────────────────────────────────────────
+#  STATS
 # ──────────────────────────────────────────────
 
 
@@ -223,3 +2121,30 @@ def test_stats(client):
     data = resp.get_json()
     assert "universites" in data
     assert "documents" in data
+
+
+def test_stats_instantane_materialise(client):
+    _seed_documents(3, votes_par_document=1)
+    stats = client.application.extensions["statistiques"]
+
+    data = client.get("/api/stats").get_json()
+    assert data["documents"] == 3 and data["universites"] == 1
+    assert data["documents_par_type"] == {"cours": 3}
+    assert data["documents_par_niveau"] == {"L1": 3}
+    assert data["documents_par_universite"] == [{"id": 1, "sigle": "UT", "nb_documents": 3}]
+    assert data["age_secondes"] >= 0 and data["genere_a"]
+
+    resp, n_requetes = _compter_requetes(client, "/api/stats")
+    assert n_requetes == 1  # versions uniquement
+    etag = resp.headers["ETag"]
+
+    # Données modifiées : l'instantané est conservé jusqu'à l'intervalle
+    _ajouter_document("Nouveau")
+    resp = client.get("/api/stats", headers={"If-None-Match": etag})
+    assert resp.status_code == 304
+    assert stats.calculs == 1
+
+    stats.intervalle = 0
+    data = client.get("/api/stats").get_json()
+    assert data["documents"] == 4
+    assert stats.calculs == 2
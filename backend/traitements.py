@@ -0,0 +1,34 @@
+"""Traitements d'un document après son upload, exécutés par le worker (cf. taches)."""
+import hashlib
+import os
+
+import apercus
+import extraction
+import stockage
+from models import db, Document
+from taches import TacheAbandonnee, gestionnaire, planifier
+
+
+def planifier_traitements(doc):
+    """Planifier les traitements d'un nouveau document (sans commit)."""
+    planifier("verifier_fichier", document=doc)
+    if doc.format in extraction.FORMATS:
+        planifier("extraire_texte", document=doc)
+    apercus.planifier_generation(doc)
+
+
+@gestionnaire("verifier_fichier")
+def verifier_fichier(document_id):
+    """Relire le fichier stocké et contrôler sa taille et son SHA-256."""
+    doc = db.session.get(Document, document_id)
+    if doc is None or doc.fichier_sha256 is None:
+        return  # document supprimé entre-temps, ou ancien stockage sans hash
+    chemin = stockage.chemin_absolu(doc.fichier_stockage)
+    if not os.path.exists(chemin):
+        raise TacheAbandonnee(f"Fichier absent : {doc.fichier_stockage}")
+    hachage = hashlib.sha256()
+    with open(chemin, "rb") as flux:
+        for bloc in iter(lambda: flux.read(stockage.TAILLE_BLOC), b""):
+            hachage.update(bloc)
+    if hachage.hexdigest() != doc.fichier_sha256 or os.path.getsize(chemin) != doc.taille:
+        raise TacheAbandonnee("Contenu du fichier stocké altéré")
@@ -0,0 +1,197 @@
+"""Upload par morceaux (reprise possible) — stockage des parties sur disque.
+
+Protocole : création de session (métadonnées + taille), envoi séquentiel
+des morceaux par `PUT …?offset=N`, puis finalisation en `Document`. Chaque
+morceau est recopié du flux de la requête vers le fichier partiel par blocs
+de `TAILLE_BLOC` : la mémoire utilisée ne dépend pas de la taille du fichier.
+
+Le SHA-256 est calculé au fil de l'eau dans le processus qui reçoit les
+morceaux ; si la séquence a été servie par plusieurs workers, il est recalculé
+en relisant le fichier partiel à la finalisation.
+"""
+import datetime
+import errno
+import fcntl
+import hashlib
+import os
+import threading
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+
+from models import db, SessionUpload, maintenant_utc
+from taches import gestionnaire, periodique
+
+TAILLE_BLOC = 64 * 1024
+
+# sid -> (octets hachés, objet hashlib) ; propre au processus
+_hachages = {}
+_verrou_hachages = threading.Lock()
+
+
+class MorceauInvalide(Exception):
+    """Morceau refusé ; `status` est le code HTTP à renvoyer."""
+
+    def __init__(self, message, status):
+        super().__init__(message)
+        self.status = status
+
+
+# ──────────────────────────────────────────────
+#  CHEMINS
+# ──────────────────────────────────────────────
+def dossier_sessions():
+    dossier = os.path.join(current_app.config["UPLOAD_FOLDER"], ".sessions")
+    os.makedirs(dossier, exist_ok=True)
+    return dossier
+
+
+def chemin_partiel(sid):
+    return os.path.join(dossier_sessions(), f"{sid}.part")
+
+
+def expiration(session):
+    ttl = datetime.timedelta(hours=current_app.config["UPLOAD_SESSION_TTL_HOURS"])
+    return session.updated_at + ttl
+
+
+def est_expiree(session):
+    return expiration(session) < maintenant_utc()
+
+
+# ──────────────────────────────────────────────
+#  MORCEAUX
+# ──────────────────────────────────────────────
+def creer_fichier_partiel(sid):
+    open(chemin_partiel(sid), "wb").close()
+    with _verrou_hachages:
+        _hachages[sid] = (0, hashlib.sha256())
+
+
+def ecrire_morceau(session, offset, flux):
+    """Recopier `flux` dans le fichier partiel à partir de `offset`.
+
+    L'offset doit être exactement le nombre d'octets déjà reçus (envoi
+    séquentiel) ; un verrou exclusif sur le fichier partiel refuse deux
+    envois simultanés pour la même session. Renvoie le nouvel offset.
+    """
+    chemin = chemin_partiel(session.id)
+    try:
+        fichier = open(chemin, "r+b")
+    except FileNotFoundError:
+        raise MorceauInvalide("Fichier partiel introuvable", 410)
+
+    with fichier:
+        try:
+            fcntl.flock(fichier, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError as exc:
+            if exc.errno in (errno.EAGAIN, errno.EACCES):
+                raise MorceauInvalide("Un autre morceau est en cours d'envoi", 409)
+            raise
+
+        db.session.refresh(session)
+        if offset != session.recu:
+            raise MorceauInvalide("Offset inattendu", 409)
+
+        with _verrou_hachages:
+            etat = _hachages.get(session.id)
+        # Copie : publiée seulement si le morceau est accepté en entier
+        hachage = etat[1].copy() if etat and etat[0] == offset else None
+
+        fichier.seek(offset)
+        fichier.truncate()
+        position = offset
+        while True:
+            bloc = flux.read(TAILLE_BLOC)
+            if not bloc:
+                break
+            position += len(bloc)
+            if position > session.taille_totale:
+                fichier.truncate(offset)
+                raise MorceauInvalide("Le morceau dépasse la taille annoncée", 413)
+            fichier.write(bloc)
+            if hachage is not None:
+                hachage.update(bloc)
+        fichier.flush()
+        os.fsync(fichier.fileno())
+
+        with _verrou_hachages:
+            if hachage is not None:
+                _hachages[session.id] = (position, hachage)
+            else:
+                _hachages.pop(session.id, None)
+
+        session.recu = position
+        session.updated_at = maintenant_utc()
+        db.session.commit()
+    return position
+
+
+def sha256_final(session):
+    """SHA-256 du fichier complet (incrémental si disponible, sinon relu)."""
+    with _verrou_hachages:
+        etat = _hachages.pop(session.id, None)
+    if etat and etat[0] == session.recu:
+        return etat[1].hexdigest()
+
+    hachage = hashlib.sha256()
+    with open(chemin_partiel(session.id), "rb") as fichier:
+        for bloc in iter(lambda: fichier.read(TAILLE_BLOC), b""):
+            hachage.update(bloc)
+    return hachage.hexdigest()
+
+
+def supprimer_session(session):
+    """Supprimer la session et son fichier partiel (ne commite pas)."""
+    with _verrou_hachages:
+        _hachages.pop(session.id, None)
+    try:
+        os.remove(chemin_partiel(session.id))
+    except FileNotFoundError:
+        pass
+    db.session.delete(session)
+
+
+# ──────────────────────────────────────────────
+#  NETTOYAGE
+# ──────────────────────────────────────────────
+def purger_sessions_expirees():
+    """Supprimer les sessions abandonnées et les fichiers partiels orphelins."""
+    ttl = datetime.timedelta(hours=current_app.config["UPLOAD_SESSION_TTL_HOURS"])
+    limite = maintenant_utc() - ttl
+
+    expirees = SessionUpload.query.filter(SessionUpload.updated_at < limite).all()
+    for session in expirees:
+        supprimer_session(session)
+    db.session.commit()
+
+    # Fichiers partiels sans session (arrêt brutal entre deux écritures)
+    dossier = dossier_sessions()
+    actives = {sid for (sid,) in db.session.query(SessionUpload.id)}
+    seuil = limite.replace(tzinfo=datetime.timezone.utc).timestamp()
+    for nom in os.listdir(dossier):
+        sid = nom.split(".", 1)[0]
+        chemin = os.path.join(dossier, nom)
+        if sid not in actives and os.path.getmtime(chemin) < seuil:
+            os.remove(chemin)
+    return len(expirees)
+
+
+@gestionnaire("purger_uploads", max_tentatives=1)
+def purger_uploads():
+    """Tâche périodique : un échec est rattrapé à la période suivante."""
+    purger_sessions_expirees()
+
+
+periodique("purger_uploads", "UPLOAD_PURGE_INTERVAL")
+
+
+uploads_cli = AppGroup("uploads", help="Gestion des uploads par morceaux.")
+
+
+@uploads_cli.command("purger")
+def purger_commande():
+    """Supprimer les sessions d'upload expirées."""
+    n = purger_sessions_expirees()
+    click.echo(f"{n} session(s) expirée(s) supprimée(s)")
@@ -0,0 +1,160 @@
+"""Versions des données et réponses HTTP conditionnelles.
+
+Toute transaction qui écrit dans une table suivie incrémente, juste avant son
+commit, l'une des `TRANCHES` lignes de cette table dans `version_donnees`,
+tirée au hasard : les écritures concurrentes (votes, dépôts, compteur de
+téléchargements) ne se sérialisent pas sur une ligne unique. La version
+d'une table est la somme de ses tranches. Les écritures sont
+relevées à deux endroits : l'unité de travail (flush des objets) et les
+requêtes DML exécutées directement via la session (votes, compteur de
+téléchargements).
+
+Le décorateur `reponse_versionnee` dérive l'ETag et le Last-Modified d'une
+route GET des versions des tables qu'elle lit (une lecture par clé
+primaire) : si le client possède déjà cette version, la réponse est un 304
+produit sans exécuter la route.
+"""
+import hashlib
+import random
+from functools import wraps
+
+from flask import current_app, g, make_response, request
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from werkzeug.http import is_resource_modified
+
+from models import db, VersionDonnees, insert_upsert, maintenant_utc
+
+TABLES_SUIVIES = frozenset(
+    {"universite", "filiere", "matiere", "document", "document_texte", "utilisateur",
+     "classement"}
+)
+TRANCHES = 16
+
+
+def _modifiees(session):
+    return session.info.setdefault("tables_modifiees", set())
+
+
+@event.listens_for(Session, "after_flush")
+def _noter_flush(session, _contexte):
+    objets = list(session.new) + list(session.deleted)
+    objets += [obj for obj in session.dirty if session.is_modified(obj)]
+    tables = {obj.__table__.name for obj in objets} & TABLES_SUIVIES
+    if tables:
+        _modifiees(session).update(tables)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _noter_dml(etat):
+    if etat.is_insert or etat.is_update or etat.is_delete:
+        nom = etat.statement.table.name
+        if nom in TABLES_SUIVIES:
+            _modifiees(etat.session).add(nom)
+
+
+@event.listens_for(Session, "before_commit")
+def _incrementer_versions(session):
+    session.flush()  # le flush final du commit a lieu après cet évènement
+    tables = sorted(session.info.pop("tables_modifiees", ()))
+    if not tables:
+        return
+    maintenant = maintenant_utc()
+    tranche = random.randrange(TRANCHES)
+    insert = insert_upsert()
+    stmt = insert(VersionDonnees).values(
+        [
+            {"nom_table": t, "tranche": tranche, "version": 1, "modifie_a": maintenant}
+            for t in tables
+        ]
+    )
+    session.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[VersionDonnees.nom_table, VersionDonnees.tranche],
+            set_={
+                "version": VersionDonnees.version + 1,
+                "modifie_a": stmt.excluded.modifie_a,
+            },
+        )
+    )
+
+
+@event.listens_for(Session, "after_rollback")
+def _oublier(session):
+    session.info.pop("tables_modifiees", None)
+
+
+# ──────────────────────────────────────────────
+#  VALIDATEURS
+# ──────────────────────────────────────────────
+def selection_versions():
+    """SELECT nom_table, version, modifie_a, tranches additionnées."""
+    return db.select(
+        VersionDonnees.nom_table,
+        db.cast(db.func.sum(VersionDonnees.version), db.BigInteger),
+        db.func.max(VersionDonnees.modifie_a),
+    ).group_by(VersionDonnees.nom_table)
+
+
+def lire_versions(tables):
+    """{table: (version, modifie_a)} ; une table jamais écrite vaut (0, None)."""
+    lignes = db.session.execute(
+        selection_versions().where(VersionDonnees.nom_table.in_(tables))
+    )
+    versions = {t: (0, None) for t in tables}
+    versions.update({nom: (version, date) for nom, version, date in lignes})
+    return versions
+
+
+def validateurs(tables):
+    """(etag, last_modified) de l'état courant des tables.
+
+    Les versions lues restent disponibles pour la requête dans
+    `g.versions_donnees` (cf. taxonomie).
+    """
+    versions = lire_versions(tables)
+    g.versions_donnees = versions
+    dates = [date for _, date in versions.values()]
+    return (
+        etag_versions({t: v for t, (v, _) in versions.items()}),
+        max(dates) if None not in dates else None,
+    )
+
+
+def etag_versions(versions):
+    """ETag (sans guillemets) d'un contenu dérivé des versions {table: version}."""
+    empreinte = ",".join(f"{t}:{versions[t]}" for t in sorted(versions))
+    return hashlib.sha1(
+        f"{current_app.config['APP_REVISION']}|{empreinte}".encode()
+    ).hexdigest()[:20]
+
+
+def reponse_versionnee(*tables, max_age=0):
+    """Route GET dont le contenu ne dépend que de `tables`.
+
+    `max_age` > 0 : réponse publique réutilisable pendant `max_age` secondes
+    (navigateurs, nginx) ; 0 : revalidation à chaque usage (`no-cache`).
+    """
+    def decorateur(vue):
+        @wraps(vue)
+        def enveloppe(*args, **kwargs):
+            etag, dernier = validateurs(tables)
+            if not is_resource_modified(request.environ, etag=etag, last_modified=dernier):
+                response = current_app.response_class(status=304)
+            else:
+                response = make_response(vue(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag, weak=True)
+            if dernier is not None:
+                response.last_modified = dernier
+            if max_age:
+                response.cache_control.public = True
+                response.cache_control.max_age = max_age
+            else:
+                response.cache_control.no_cache = True
+            return response
+
+        return enveloppe
+
+    return decorateur
@@ -43,6 +43,7 @@ export const authAPI = {
 export const universitesAPI = {
   getAll: () => api.get('/universites'),
   getOne: (id) => api.get(`/universites/${id}`),
+  getCatalogue: (id, params) => api.get(`/universites/${id}/catalogue`, { params }),
 };
 
 // ── Filières ──────────────────────────────────
@@ -61,6 +62,9 @@ export const matieresAPI = {
 export const documentsAPI = {
   getAll: (params) => api.get('/documents', { params }),
   getOne: (id) => api.get(`/documents/${id}`),
+  // Classements précalculés (mêmes filtres que getAll, pagination par page)
+  tendances: (params) => api.get('/documents/tendances', { params }),
+  mieuxNotes: (params) => api.get('/documents/mieux-notes', { params }),
   upload: (formData) =>
     api.post('/documents', formData, {
       headers: { 'Content-Type': 'multipart/form-data' },
@@ -68,6 +72,8 @@ export const documentsAPI = {
   delete: (id) => api.delete(`/documents/${id}`),
   vote: (id, note) => api.post(`/documents/${id}/vote`, { note }),
   downloadUrl: (id) => `${API_URL}/api/documents/${id}/download`,
+  // rendu : 'miniature' (cartes) ou 'apercu' (page du document)
+  apercuUrl: (id, rendu) => `${API_URL}/api/documents/${id}/apercu/${rendu}`,
 };
 
 // ── Recherche ─────────────────────────────────
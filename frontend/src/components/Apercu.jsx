@@ -0,0 +1,47 @@
+import { useEffect, useRef, useState } from 'react';
+import { documentsAPI } from '../api/client';
+
+// Aperçu en cours de génération : l'API répond 202 (JSON) avec Retry-After,
+// que <img> ne sait pas afficher. On réessaie après ce délai (croissant),
+// puis on abandonne ; tout autre statut masque l'aperçu.
+const ESSAIS_MAX = 5;
+const DELAI_DEFAUT_S = 5;
+const DELAI_MAX_S = 60;
+
+export default function Apercu({ documentId, rendu, ...props }) {
+  const url = documentsAPI.apercuUrl(documentId, rendu);
+  const [essai, setEssai] = useState(0);
+  const [visible, setVisible] = useState(true);
+  const minuteur = useRef(null);
+
+  useEffect(() => () => clearTimeout(minuteur.current), []);
+
+  const surErreur = async () => {
+    if (essai >= ESSAIS_MAX) {
+      setVisible(false);
+      return;
+    }
+    try {
+      const res = await fetch(url, { method: 'HEAD', cache: 'no-store' });
+      if (res.status !== 202) {
+        setVisible(false);
+        return;
+      }
+      const attente = Number(res.headers.get('Retry-After')) || DELAI_DEFAUT_S;
+      const delai = Math.min(attente * 2 ** essai, DELAI_MAX_S);
+      minuteur.current = setTimeout(() => setEssai((n) => n + 1), delai * 1000);
+    } catch {
+      setVisible(false);
+    }
+  };
+
+  if (!visible) return null;
+  return (
+    <img
+      // Nouvelle URL à chaque essai : la réponse 202 n'est pas réutilisée
+      src={essai ? `${url}?essai=${essai}` : url}
+      onError={surErreur}
+      {...props}
+    />
+  );
+}
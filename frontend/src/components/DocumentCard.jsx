@@ -1,7 +1,8 @@
 import { Link } from 'react-router-dom';
 import { HiDownload, HiStar, HiEye } from 'react-icons/hi';
+import Apercu from './Apercu';
 import { formatFileSize, formatDate, truncateText } from '../utils/helpers';
-import { DOCUMENT_TYPES } from '../utils/constants';
+import { DOCUMENT_TYPES, PREVIEW_FORMATS } from '../utils/constants';
 
 const TYPE_COLORS = {
   cours: 'bg-blue-100 text-blue-800',
@@ -11,6 +12,23 @@ const TYPE_COLORS = {
   expose: 'bg-amber-100 text-amber-800',
 };
 
+// Passage du contenu renvoyé par /api/search, mots trouvés surlignés
+function Extrait({ extrait }) {
+  const morceaux = [];
+  let position = 0;
+  extrait.surlignages.forEach(([debut, fin]) => {
+    morceaux.push(extrait.texte.slice(position, debut));
+    morceaux.push(
+      <mark key={debut} className="bg-yellow-100 text-gray-700 rounded-sm">
+        {extrait.texte.slice(debut, fin)}
+      </mark>
+    );
+    position = fin;
+  });
+  morceaux.push(extrait.texte.slice(position));
+  return <p className="text-sm text-gray-500 italic mb-3">{morceaux}</p>;
+}
+
 export default function DocumentCard({ document }) {
   const typeLabel =
     DOCUMENT_TYPES.find((t) => t.value === document.type)?.label || document.type;
@@ -19,6 +37,19 @@ export default function DocumentCard({ document }) {
   return (
     <div className="bg-white rounded-lg shadow-sm border border-gray-200 hover:shadow-md transition p-4 flex flex-col justify-between">
       <div>
+        {/* Miniature (première page) */}
+        {PREVIEW_FORMATS.includes(document.format) && (
+          <Link to={`/documents/${document.id}`}>
+            <Apercu
+              documentId={document.id}
+              rendu="miniature"
+              alt=""
+              loading="lazy"
+              className="w-full h-40 object-cover object-top rounded mb-3 bg-gray-50"
+            />
+          </Link>
+        )}
+
         {/* En-tête : type + format */}
         <div className="flex items-center justify-between mb-2">
           <span className={`text-xs font-semibold px-2 py-0.5 rounded-full ${colorClass}`}>
@@ -41,8 +72,11 @@ export default function DocumentCard({ document }) {
           <p className="text-sm text-gray-500 mb-1">{document.matiere}</p>
         )}
 
+        {/* Extrait du contenu (résultats de recherche) */}
+        {document.extrait && <Extrait extrait={document.extrait} />}
+
         {/* Description */}
-        {document.description && (
+        {document.description && !document.extrait && (
           <p className="text-sm text-gray-400 mb-3">
             {truncateText(document.description, 120)}
           </p>
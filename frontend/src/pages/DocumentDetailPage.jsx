@@ -3,8 +3,9 @@ import { useParams, Link } from 'react-router-dom';
 import { HiDownload, HiStar, HiUser, HiCalendar, HiDocument } from 'react-icons/hi';
 import { documentsAPI } from '../api/client';
 import { useAuth } from '../hooks/useAuth';
-import { DOCUMENT_TYPES } from '../utils/constants';
+import { DOCUMENT_TYPES, PREVIEW_FORMATS } from '../utils/constants';
 import { formatFileSize, formatDate } from '../utils/helpers';
+import Apercu from '../components/Apercu';
 import LoadingSpinner from '../components/LoadingSpinner';
 
 export default function DocumentDetailPage() {
@@ -103,6 +104,16 @@ export default function DocumentDetailPage() {
           </p>
         )}
 
+        {/* Aperçu de la première page (ne compte pas de téléchargement) */}
+        {PREVIEW_FORMATS.includes(doc.format) && (
+          <Apercu
+            documentId={doc.id}
+            rendu="apercu"
+            alt={`Aperçu : ${doc.titre}`}
+            className="w-full max-h-[32rem] object-contain border border-gray-100 rounded-lg mb-6 bg-gray-50"
+          />
+        )}
+
         {/* Bouton télécharger */}
         <a
           href={documentsAPI.downloadUrl(doc.id)}
@@ -1,22 +1,36 @@
 import { useState, useEffect } from 'react';
 import { useParams, Link } from 'react-router-dom';
 import { universitesAPI } from '../api/client';
+import { NIVEAUX } from '../utils/constants';
+import { formatDate } from '../utils/helpers';
 import LoadingSpinner from '../components/LoadingSpinner';
 
+function Compteur({ noeud }) {
+  return (
+    <span className="text-xs text-gray-500">
+      {noeud.nb_documents} document{noeud.nb_documents > 1 ? 's' : ''}
+      {noeud.dernier_ajout && ` · dernier ajout le ${formatDate(noeud.dernier_ajout)}`}
+    </span>
+  );
+}
+
 export default function UniversitePage() {
   const { id } = useParams();
   const [universite, setUniversite] = useState(null);
+  const [niveau, setNiveau] = useState('');
   const [loading, setLoading] = useState(true);
 
+  // Arbre filières → matières avec les comptes, en une seule requête
   useEffect(() => {
+    setLoading(true);
     universitesAPI
-      .getOne(id)
+      .getCatalogue(id, { niveau: niveau || undefined })
       .then((res) => setUniversite(res.data))
-      .catch(console.error)
+      .catch(() => setUniversite(null))
       .finally(() => setLoading(false));
-  }, [id]);
+  }, [id, niveau]);
 
-  if (loading) return <LoadingSpinner className="min-h-[60vh]" />;
+  if (loading && !universite) return <LoadingSpinner className="min-h-[60vh]" />;
 
   if (!universite) {
     return (
@@ -38,30 +52,76 @@ export default function UniversitePage() {
         </span>
         <h1 className="text-2xl sm:text-3xl font-bold mt-3">{universite.nom}</h1>
         <p className="text-blue-100 mt-1">📍 {universite.ville}</p>
+        <p className="text-blue-100 mt-1 text-sm">
+          {universite.nb_documents} document{universite.nb_documents > 1 ? 's' : ''} disponible
+          {universite.nb_documents > 1 ? 's' : ''}
+        </p>
       </div>
 
       {/* Filières */}
       <section>
-        <h2 className="text-xl font-bold text-gray-900 mb-4">
-          Filières ({universite.filieres?.length || 0})
-        </h2>
+        <div className="flex flex-wrap items-center justify-between gap-3 mb-4">
+          <h2 className="text-xl font-bold text-gray-900">
+            Filières ({universite.filieres?.length || 0})
+          </h2>
+          <select
+            value={niveau}
+            onChange={(e) => setNiveau(e.target.value)}
+            className="border border-gray-300 rounded-lg px-3 py-2 text-sm focus:ring-2 focus:ring-blue-500 outline-none"
+          >
+            <option value="">Tous les niveaux</option>
+            {NIVEAUX.map((n) => (
+              <option key={n} value={n}>
+                {n}
+              </option>
+            ))}
+          </select>
+        </div>
 
         {universite.filieres?.length > 0 ? (
           <div className="grid grid-cols-1 sm:grid-cols-2 lg:grid-cols-3 gap-4">
             {universite.filieres.map((f) => (
-              <Link
+              <div
                 key={f.id}
-                to={`/search?universite_id=${universite.id}`}
-                className="bg-white rounded-lg shadow-sm border border-gray-200 hover:shadow-md transition p-4 group"
+                className="bg-white rounded-lg shadow-sm border border-gray-200 p-4 space-y-3"
               >
-                <h3 className="font-semibold text-gray-800 group-hover:text-blue-700 transition">
-                  {f.nom}
-                </h3>
-              </Link>
+                <div>
+                  <Link
+                    to={`/search?universite_id=${universite.id}`}
+                    className="font-semibold text-gray-800 hover:text-blue-700 transition"
+                  >
+                    {f.nom}
+                  </Link>
+                  <div>
+                    <Compteur noeud={f} />
+                  </div>
+                </div>
+
+                {f.matieres.length > 0 && (
+                  <ul className="space-y-1 border-t border-gray-100 pt-2">
+                    {f.matieres.map((m) => (
+                      <li key={m.id} className="flex items-baseline justify-between gap-2">
+                        <Link
+                          to={`/search?universite_id=${universite.id}&niveau=${m.niveau}`}
+                          className="text-sm text-gray-700 hover:text-blue-700 transition"
+                        >
+                          <span className="text-xs font-medium text-blue-700 mr-1">{m.niveau}</span>
+                          {m.nom}
+                        </Link>
+                        <span className="text-xs text-gray-500 shrink-0">{m.nb_documents}</span>
+                      </li>
+                    ))}
+                  </ul>
+                )}
+              </div>
             ))}
           </div>
         ) : (
-          <p className="text-gray-400">Aucune filière enregistrée pour cette université.</p>
+          <p className="text-gray-400">
+            {niveau
+              ? `Aucune filière avec des matières de niveau ${niveau}.`
+              : 'Aucune filière enregistrée pour cette université.'}
+          </p>
         )}
       </section>
     </div>
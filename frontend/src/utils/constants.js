@@ -13,6 +13,9 @@ export const NIVEAUX = ['L1', 'L2', 'L3', 'M1', 'M2'];
 /** Extensions de fichier autorisées */
 export const ALLOWED_EXTENSIONS = ['pdf', 'doc', 'docx', 'ppt', 'pptx', 'jpg', 'jpeg', 'png'];
 
+/** Formats dont le serveur génère un aperçu */
+export const PREVIEW_FORMATS = ['pdf', 'jpg', 'jpeg', 'png'];
+
 /** Taille max d'upload en octets (16 Mo) */
 export const MAX_FILE_SIZE = 16 * 1024 * 1024;
 